@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Bond, Budget, Retention
+from .models import Bond, Budget, Retention, Scenario
 
 
 @admin.register(Budget)
@@ -23,3 +23,10 @@ class RetentionAdmin(admin.ModelAdmin):
     list_display = ('retention_type', 'budget', 'amount', 'percentage')
     search_fields = ('budget__name',)
     list_filter = ('retention_type', 'budget')
+
+
+@admin.register(Scenario)
+class ScenarioAdmin(admin.ModelAdmin):
+    list_display = ('name', 'budget', 'administration_percentage', 'utility_percentage')
+    search_fields = ('name', 'budget__name')
+    list_filter = ('budget',)
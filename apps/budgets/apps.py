@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class BudgetsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.budgets'
+
+    def ready(self):
+        # pylint: disable-next=import-outside-toplevel,unused-import
+        from . import signals  # noqa: F401
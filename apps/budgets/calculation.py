@@ -0,0 +1,337 @@
+"""
+Unit price analysis (APU) of every work item of a ``Budget`` in one pass.
+
+A budget's compositions are read with one query per resource type into
+columns of floats, indexed by the position of their work item. Rows are read
+straight from the cursor: converting a hundred thousand ids to ``UUID`` and
+prices to ``Decimal`` would take longer than the whole calculation. The costs are
+summed per work item with ``numpy.bincount`` when NumPy is installed, or with
+one loop over ``array`` columns otherwise. The pricing formulas are then
+evaluated once over whole columns. They are plain arithmetic, so the same
+code runs on NumPy vectors or, without NumPy, once per work item.
+
+Per unit of a work item with yield ``Y`` (units produced per day):
+
+* materials: the sum of their costs, divided by ``Y`` when the work item's
+  ``material_unit_usage`` is ``DIVIDED``;
+* equipment: the sum of ``cost * depreciation`` per day, divided by ``Y``;
+* labor: the sum of hourly costs times ``hours_per_day``, raised by the
+  ``direct_labor_factor`` percentage when ``use_associated_cost_factor`` is
+  set, divided by ``Y``;
+* administration is a percentage of the direct cost. Financing and utility
+  are percentages of the direct cost plus administration.
+
+Compositions and budget links carry no quantities, so every resource counts
+once and every work item once in the budget totals. IVA is added to the
+totals when the budget's ``iva_type`` includes the budget. Unit prices are
+rounded to cents before they are totalled. Amounts are rounded half up, as
+``Decimal`` rounds the stored prices and rollups, and not to the nearest
+binary float: 2.675 is 2.68 rather than 2.67. Only the values whose cents
+end within a rounding error of a half are rounded through ``Decimal``.
+
+Every formula is linear in the direct costs, so the totals under other
+factors only need the per unit material, equipment and labor costs summed
+over the budget. Those three sums are cached per budget, and what-if
+scenarios price them in constant time. Scenario totals are rounded once, not
+per work item, so they may differ from ``calculate_budget`` by a few cents.
+"""
+import math
+import time
+from array import array
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.core.cache import cache
+from django.db import connections
+
+from apps.databases.autocomplete import catalog_versions
+from apps.databases.models import WorkItem
+
+from .models import Budget
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - exercised where NumPy is missing
+    numpy = None
+
+COMPONENTS = ['material', 'equipment', 'labor', 'direct_cost', 'administration', 'financing', 'utility',
+              'unit_price']
+TOTALS = ['direct_cost', 'administration', 'financing', 'utility', 'subtotal', 'iva', 'total']
+COST_SUMS_TIMEOUT = 60 * 60 * 24
+CENT = Decimal('0.01')
+# Distance, in cents, from a half cent below which a float may be a binary approximation of one
+HALF_CENT_TOLERANCE = 1e-6
+
+
+def _raw_rows(queryset):
+    """Rows of ``queryset`` as the database driver returns them, without field converters."""
+    sql, params = queryset.query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _uuid_text(value):
+    """Canonical text of a UUID read raw: a ``UUID`` or, where it is stored as ``char(32)``, its hex digits."""
+    if isinstance(value, str):
+        return f'{value[:8]}-{value[8:12]}-{value[12:16]}-{value[16:20]}-{value[20:]}'
+    return str(value)
+
+
+class Compositions:
+    """Columns of one budget: one row per work item, one per composition line."""
+
+    def __init__(self, budget):
+        rows = _raw_rows(budget.work_item.filter(deleted_at__isnull=True).order_by('code', 'id').values_list(
+            'id', 'code', 'yield_rate', 'material_unit_usage'))
+        self.ids = []
+        self.codes = []
+        self.yields = array('d')
+        self.divided = array('d')
+        self.zero_yield = []
+        positions = {}
+        for work_item_id, code, yield_rate, usage in rows:
+            positions[work_item_id] = len(self.ids)
+            self.ids.append(_uuid_text(work_item_id))
+            self.codes.append(code)
+            if float(yield_rate) > 0:
+                self.yields.append(float(yield_rate))
+            else:
+                # Counted as one unit per day rather than dividing by zero
+                self.zero_yield.append(code)
+                self.yields.append(1.0)
+            self.divided.append(1.0 if usage == 'DIVIDED' else 0.0)
+
+        self.material = self._lines(budget, positions, 'material', 'material__cost')
+        self.labor = self._lines(budget, positions, 'labor', 'labor__hourly_cost')
+        self.equipment = self._lines(budget, positions, 'equipment', 'equipment__cost', 'equipment__depreciation')
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def _lines(budget, positions, relation, *price_fields):
+        """Work item positions and the price of each of their ``relation`` lines."""
+        through = getattr(WorkItem, relation).through
+        rows = _raw_rows(through.objects.filter(**{
+            'workitem__budget': budget,
+            'workitem__deleted_at__isnull': True,
+            f'{relation}__deleted_at__isnull': True,
+        }).values_list('workitem_id', *price_fields))
+        index = array('q')
+        prices = array('d')
+        for work_item_id, *values in rows:
+            index.append(positions[work_item_id])
+            price = 1.0
+            for value in values:
+                price *= float(value)
+            prices.append(price)
+        return index, prices
+
+
+def _segment_sum(lines, size):
+    """Sum of the line prices of each work item."""
+    index, prices = lines
+    if numpy is not None:
+        return numpy.bincount(
+            numpy.frombuffer(index, dtype=numpy.int64) if index else numpy.zeros(0, dtype=numpy.int64),
+            weights=numpy.frombuffer(prices, dtype=numpy.float64) if prices else None,
+            minlength=size,
+        ).astype(numpy.float64)
+    sums = array('d', bytes(8 * size))
+    for position, price in zip(index, prices):
+        sums[position] += price
+    return sums
+
+
+def price_work_items(material, equipment, labor, yields, divided, factors):
+    """
+    Per unit costs of work items from their summed composition costs. The
+    arguments are NumPy vectors or the floats of a single work item.
+    """
+    material = material / (divided * yields + (1 - divided))
+    equipment = equipment / yields
+    labor = labor * factors['labor'] / yields
+    direct_cost = material + equipment + labor
+    administration = direct_cost * factors['administration']
+    financing = (direct_cost + administration) * factors['financing']
+    utility = (direct_cost + administration) * factors['utility']
+    unit_price = direct_cost + administration + financing + utility
+    return material, equipment, labor, direct_cost, administration, financing, utility, unit_price
+
+
+def budget_factors(budget, overrides=None):
+    """Pricing factors of ``budget``, with the field values in ``overrides`` taking precedence."""
+    overrides = overrides or {}
+
+    def value(field):
+        return float(overrides.get(field, getattr(budget, field)))
+
+    labor = value('hours_per_day')
+    if budget.use_associated_cost_factor:
+        labor *= 1 + value('direct_labor_factor') / 100
+    return {
+        'labor': labor,
+        'administration': value('administration_percentage') / 100,
+        'financing': value('financing_percentage') / 100,
+        'utility': value('utility_percentage') / 100,
+        'iva': (value('iva_percentage') / 100
+                if budget.iva_type == Budget.IVAChoices.PRESUPUESTO_VALUACION else 0.0),
+    }
+
+
+def round_cents(value):
+    """``value`` rounded half up to cents, as ``Decimal`` rounds its shortest decimal form."""
+    cents = abs(value) * 100
+    if abs(cents - math.floor(cents) - 0.5) >= HALF_CENT_TOLERANCE:
+        return round(value, 2)
+    return float(Decimal(repr(value)).quantize(CENT, rounding=ROUND_HALF_UP))
+
+
+def _round_column(column):
+    """``round_cents`` of every value of a NumPy vector, as a list."""
+    cents = numpy.abs(column) * 100
+    values = numpy.round(column, 2).tolist()
+    for index in numpy.flatnonzero(numpy.abs(cents - numpy.floor(cents) - 0.5) < HALF_CENT_TOLERANCE).tolist():
+        values[index] = round_cents(float(column[index]))
+    return values
+
+
+def _price_columns(compositions, factors):
+    size = len(compositions)
+    sums = [_segment_sum(getattr(compositions, relation), size) for relation in ('material', 'equipment', 'labor')]
+    if numpy is not None:
+        yields = numpy.frombuffer(compositions.yields, dtype=numpy.float64) if size else numpy.zeros(0)
+        divided = numpy.frombuffer(compositions.divided, dtype=numpy.float64) if size else numpy.zeros(0)
+        columns = price_work_items(*sums, yields, divided, factors)
+        return [_round_column(column) for column in columns]
+    rows = [
+        price_work_items(*values, factors)
+        for values in zip(*sums, compositions.yields, compositions.divided)
+    ]
+    return [[round_cents(value) for value in column] for column in zip(*rows)] or [[] for _ in COMPONENTS]
+
+
+def unit_cost_sums(compositions):
+    """Per unit material, equipment and labor (before the labor factor) costs summed over all work items."""
+    size = len(compositions)
+    material, equipment, labor = (
+        _segment_sum(getattr(compositions, relation), size) for relation in ('material', 'equipment', 'labor'))
+    if numpy is not None and size:
+        yields = numpy.frombuffer(compositions.yields, dtype=numpy.float64)
+        divided = numpy.frombuffer(compositions.divided, dtype=numpy.float64)
+        return {
+            'material': float((material / (divided * yields + (1 - divided))).sum()),
+            'equipment': float((equipment / yields).sum()),
+            'labor': float((labor / yields).sum()),
+        }
+    sums = {'material': 0.0, 'equipment': 0.0, 'labor': 0.0}
+    for index, (yield_rate, divided) in enumerate(zip(compositions.yields, compositions.divided)):
+        sums['material'] += material[index] / (divided * yield_rate + (1 - divided))
+        sums['equipment'] += equipment[index] / yield_rate
+        sums['labor'] += labor[index] / yield_rate
+    return sums
+
+
+def catalog_database_ids(budget):
+    """Ids of the databases holding the work items of ``budget`` or the resources they link, in one query."""
+    work_items = budget.work_item.filter(deleted_at__isnull=True)
+    linked = [
+        getattr(WorkItem, relation).through.objects.filter(workitem__in=work_items).values_list(
+            f'{relation}__database_id', flat=True)
+        for relation in ('material', 'labor', 'equipment')
+    ]
+    return set(work_items.values_list('database_id', flat=True).union(*linked))
+
+
+def _cost_sums_key(budget):
+    # Linking or unlinking work items moves the budget's updated_at
+    return f'budgets.cost_sums:{budget.pk}:{budget.updated_at.isoformat()}'
+
+
+def cached_unit_cost_sums(budget):
+    """
+    ``unit_cost_sums`` of ``budget``, loaded once per change of the budget's
+    work items or of the catalogs holding them or the resources they link,
+    which may come from another database. The sums are kept in
+    each process, keyed by the stored ``updated_at`` of the budget and checked
+    against the catalog stamps every process shares, so a price changed by
+    another process or by ``runworker`` is never served from an older copy.
+    """
+    key = _cost_sums_key(budget)
+    cached = cache.get(key)
+    if cached and catalog_versions(list(cached['databases'])) == cached['databases']:
+        return cached['sums']
+
+    # Versions are read before the rows, so a concurrent change leaves a stale stamp rather than stale sums
+    databases = catalog_versions([str(database_id) for database_id in catalog_database_ids(budget)])
+    sums = unit_cost_sums(Compositions(budget))
+    cache.set(key, {'databases': databases, 'sums': sums}, timeout=COST_SUMS_TIMEOUT)
+    return sums
+
+
+def _totals(direct_cost, administration, financing, utility, subtotal, iva_rate):
+    totals = {
+        'direct_cost': round_cents(direct_cost),
+        'administration': round_cents(administration),
+        'financing': round_cents(financing),
+        'utility': round_cents(utility),
+        'subtotal': round_cents(subtotal),
+    }
+    totals['iva'] = round_cents(totals['subtotal'] * iva_rate)
+    totals['total'] = round_cents(totals['subtotal'] + totals['iva'])
+    return {name: _money(totals[name]) for name in TOTALS}
+
+
+def scenario_totals(budget, sums, overrides=None):
+    """Budget totals from its cached ``sums`` under the factors changed by ``overrides``."""
+    factors = budget_factors(budget, overrides)
+    # Summed costs price like a single work item yielding one unit per day
+    _, _, _, *totals = price_work_items(sums['material'], sums['equipment'], sums['labor'], 1.0, 0.0, factors)
+    return _totals(*totals, iva_rate=factors['iva'])
+
+
+def _money(value):
+    return f'{value:.2f}'
+
+
+def budget_totals(budget):
+    """Totals of ``budget`` as ``calculate_budget`` computes them, without the work item rows."""
+    factors = budget_factors(budget)
+    columns = _price_columns(Compositions(budget), factors)
+    return _column_totals(columns, factors)
+
+
+def _column_totals(columns, factors):
+    by_component = dict(zip(COMPONENTS, columns))
+    return _totals(*(sum(by_component[name]) for name in COMPONENTS[3:]), iva_rate=factors['iva'])
+
+
+def calculate_budget(budget):
+    """Unit price analysis of every work item of ``budget`` and the budget totals."""
+    started = time.perf_counter()
+    compositions = Compositions(budget)
+    loaded = time.perf_counter()
+    factors = budget_factors(budget)
+    columns = _price_columns(compositions, factors)
+    by_component = dict(zip(COMPONENTS, columns))
+    totals = _column_totals(columns, factors)
+
+    work_items = [
+        {
+            'id': work_item_id,
+            'code': code,
+            **{name: _money(column[index]) for name, column in by_component.items()},
+        }
+        for index, (work_item_id, code) in enumerate(zip(compositions.ids, compositions.codes))
+    ]
+    finished = time.perf_counter()
+    return {
+        'work_items': work_items,
+        'totals': totals,
+        'zero_yield': compositions.zero_yield,
+        'engine': 'numpy' if numpy is not None else 'array',
+        'timings': {
+            'load': round(loaded - started, 4),
+            'compute': round(finished - loaded, 4),
+        },
+    }
@@ -0,0 +1,66 @@
+import time
+from array import array
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.budgets import calculation
+from apps.budgets.calculation import Compositions, _price_columns, budget_factors
+from apps.budgets.models import Budget
+
+
+class Command(BaseCommand):
+    help = 'Times the pricing of synthetic work items, without touching the database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--work-items',
+            type=int,
+            default=10000,
+            help='Number of synthetic work items priced per run.',
+        )
+        parser.add_argument(
+            '--lines',
+            type=int,
+            default=8,
+            help='Composition lines per work item and resource type.',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Number of timed runs; the fastest one is reported.',
+        )
+        parser.add_argument(
+            '--max-ms',
+            type=float,
+            help='Fail when the fastest run takes longer than this many milliseconds.',
+        )
+
+    def handle(self, *args, **options):
+        size = options['work_items']
+        if size < 1 or options['lines'] < 1 or options['repeat'] < 1:
+            raise CommandError('--work-items, --lines and --repeat must be positive.')
+
+        compositions = self._compositions(size, options['lines'])
+        factors = budget_factors(Budget())
+        timings = []
+        for _ in range(options['repeat']):
+            started = time.perf_counter()
+            _price_columns(compositions, factors)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        best = min(timings)
+        engine = 'numpy' if calculation.numpy is not None else 'python'
+        self.stdout.write(f'Priced {size} work items in {best:.1f}ms (best of {len(timings)}, {engine}).')
+        if options['max_ms'] is not None and best > options['max_ms']:
+            raise CommandError(f"Pricing took {best:.1f}ms, above the {options['max_ms']}ms limit.")
+
+    def _compositions(self, size, lines):
+        compositions = Compositions.__new__(Compositions)
+        compositions.ids = list(range(size))
+        compositions.yields = array('d', [2.0] * size)
+        compositions.divided = array('d', [index % 2 for index in range(size)])
+        positions = array('q', [index % size for index in range(lines * size)])
+        for relation in ('material', 'labor', 'equipment'):
+            setattr(compositions, relation, (positions, array('d', [1.5] * (lines * size))))
+        return compositions
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.6 on 2026-10-17 19:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgets', '0005_alter_budget_iva_type'),
+        ('companies', '0003_keyset_indexes'),
+        ('databases', '0008_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='budget',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='budgets_bud_user_id_5bfd76_idx'),
+        ),
+    ]
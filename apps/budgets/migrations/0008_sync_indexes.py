@@ -0,0 +1,21 @@
+# Generated by Django 5.1.6 on 2026-10-17 19:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgets', '0007_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bond',
+            index=models.Index(fields=['budget', 'updated_at', 'id'], name='budgets_bon_budget__16ddc8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='retention',
+            index=models.Index(fields=['budget', 'updated_at', 'id'], name='budgets_ret_budget__59b0d2_idx'),
+        ),
+    ]
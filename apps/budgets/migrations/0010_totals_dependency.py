@@ -0,0 +1,32 @@
+# Generated by Django 5.1.6 on 2026-10-17 19:55
+
+import uuid
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgets', '0009_scenario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TotalsDependency',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True)),
+                ('deleted_at', models.DateTimeField(blank=True, null=True)),
+                ('kind', models.CharField(choices=[('WORK_ITEM', 'Work Item'), ('MATERIAL', 'Material'), ('LABOR', 'Labor'), ('EQUIPMENT', 'Equipment')], max_length=20)),
+                ('object_id', models.UUIDField()),
+                ('budget', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='totals_dependencies', to='budgets.budget')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'object_id', 'budget'], name='budgets_tot_kind_13822b_idx')],
+                'unique_together': {('budget', 'kind', 'object_id')},
+            },
+        ),
+    ]
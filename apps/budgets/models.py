@@ -2,11 +2,27 @@ from decimal import Decimal
 
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models.functions import Coalesce
 
 from apps.companies.models import Company
 from apps.databases.models import WorkItem
 from apps.users.models import User
-from utils.models import BaseModel
+from utils.models import BaseModel, SoftDeleteManager
+
+
+class BudgetQuerySet(models.QuerySet):
+    """QuerySet for budgets with set-based summaries"""
+
+    def with_work_item_count(self):
+        """Annotate the number of live work items of every row from a correlated subquery"""
+        links = self.model.work_item.through.objects.filter(
+            budget=models.OuterRef('pk'),
+            workitem__deleted_at__isnull=True,
+        ).order_by().values('budget').annotate(count=models.Count('*')).values('count')
+        return self.annotate(work_item_count=Coalesce(models.Subquery(links), 0))
+
+
+BudgetManager = SoftDeleteManager.from_queryset(BudgetQuerySet)
 
 
 class Budget(BaseModel):
@@ -129,8 +145,14 @@ class Budget(BaseModel):
     work_item = models.ManyToManyField(WorkItem)
     company = models.ForeignKey(Company, on_delete=models.CASCADE, null=True)
 
+    objects = BudgetManager()
+    all_objects = models.Manager.from_queryset(BudgetQuerySet)()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id']),
+        ]
 
     def __str__(self):
         return f"{self.code} - {self.name}"
@@ -161,6 +183,9 @@ class Bond(BaseModel):
 
     class Meta:
         ordering = ['title']
+        indexes = [
+            models.Index(fields=['budget', 'updated_at', 'id']),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.amount}"
@@ -198,6 +223,116 @@ class Retention(BaseModel):
 
     class Meta:
         ordering = ['retention_type']
+        indexes = [
+            models.Index(fields=['budget', 'updated_at', 'id']),
+        ]
 
     def __str__(self):
         return f"{self.retention_type} - {self.percentage}%"
+
+
+class Scenario(BaseModel):
+    """
+    Named what-if values of a budget's indirect cost factors. Factors left
+    empty keep the budget's own value.
+    """
+    FACTORS = [
+        'administration_percentage',
+        'utility_percentage',
+        'financing_percentage',
+        'iva_percentage',
+        'direct_labor_factor',
+    ]
+
+    budget = models.ForeignKey(
+        Budget,
+        on_delete=models.CASCADE,
+        related_name='scenarios'
+    )
+    name = models.CharField(
+        max_length=100
+    )
+    administration_percentage = models.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(Decimal('0.00'))]
+    )
+    utility_percentage = models.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(Decimal('0.00'))]
+    )
+    financing_percentage = models.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(Decimal('0.00'))]
+    )
+    iva_percentage = models.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(Decimal('0.00'))]
+    )
+    direct_labor_factor = models.DecimalField(
+        max_digits=7,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(Decimal('0.01'))]
+    )
+
+    class Meta:
+        ordering = ['name']
+        unique_together = ['budget', 'name']
+
+    def __str__(self):
+        return f"{self.budget.code} - {self.name}"
+
+    @property
+    def overrides(self):
+        """The factors this scenario changes, by field name."""
+        return {
+            factor: getattr(self, factor)
+            for factor in self.FACTORS
+            if getattr(self, factor) is not None
+        }
+
+
+class TotalsDependency(BaseModel):
+    """
+    Edge of the budget totals cache: the cached totals of ``budget`` were
+    computed from the row ``object_id`` of ``kind``.
+    """
+    class Kind(models.TextChoices):
+        WORK_ITEM = 'WORK_ITEM', 'Work Item'
+        MATERIAL = 'MATERIAL', 'Material'
+        LABOR = 'LABOR', 'Labor'
+        EQUIPMENT = 'EQUIPMENT', 'Equipment'
+
+    budget = models.ForeignKey(
+        Budget,
+        on_delete=models.CASCADE,
+        related_name='totals_dependencies'
+    )
+    kind = models.CharField(
+        max_length=20,
+        choices=Kind.choices
+    )
+    object_id = models.UUIDField()
+
+    class Meta:
+        unique_together = ['budget', 'kind', 'object_id']
+        indexes = [
+            # Reverse lookup: the budgets depending on a row
+            models.Index(fields=['kind', 'object_id', 'budget']),
+        ]
+
+    def __str__(self):
+        return f"{self.budget_id} <- {self.kind} {self.object_id}"
@@ -0,0 +1,309 @@
+"""
+Budget reports as CSV or XLSX spreadsheets.
+
+A report holds the work items with their unit price analysis, the priced
+composition lines of every work item, the bonds, the retentions and the
+IVA summary. Each section is read with a few set-based queries: the unit
+prices come from the calculation engine, and the composition lines from one
+query per resource type, iterated server side.
+
+Rows are encoded as they are read and flushed in small blocks. An XLSX file
+is a zip of XML parts: every worksheet is written as a deflated zip entry
+row by row, with inline strings instead of a shared string table, so no
+part of the workbook is ever held in memory.
+
+Large reports are written by a background job into the jobs file storage,
+under a name derived from the budget's ``updated_at``, its totals version and
+the catalog versions of the databases its work items and resources belong
+to, so any later request for an unchanged budget is served from that file.
+The versions are read from the cache shared by every process, so the web
+workers find the files written by ``runworker``, and writing a report records
+the rows it depends on, as computing the totals does.
+
+Edits to rows the report does not show leave a cached report in place: the
+``Unit`` table (work items carry their unit as text), the budget's company
+and users, and resources of its databases that none of its work items link.
+"""
+import csv
+import hashlib
+import heapq
+import io
+import os
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from apps.databases.autocomplete import catalog_versions
+from apps.databases.models import WorkItem
+from apps.jobs.models import job_files_storage
+from utils.versioning import get_version
+
+from .calculation import (
+    COMPONENTS,
+    Compositions,
+    _column_totals,
+    _price_columns,
+    budget_factors,
+    catalog_database_ids,
+    round_cents,
+)
+from .models import Bond, Retention
+from .totals import TOTALS_VERSION_NAMESPACE, record_dependencies
+
+CSV = 'csv'
+XLSX = 'xlsx'
+FORMATS = {
+    CSV: 'text/csv',
+    XLSX: 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+CHUNK_SIZE = 2000
+FLUSH_SIZE = 64 * 1024
+
+WORK_ITEM_COLUMNS = ['code', 'description', 'unit', 'yield_rate', *COMPONENTS]
+LINE_COLUMNS = ['work_item', 'type', 'code', 'description', 'price', 'depreciation', 'per_unit']
+# Order of the composition lines of a work item
+LINE_TYPES = ['material', 'equipment', 'labor']
+
+# Characters XML 1.0 does not allow, even escaped
+INVALID_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _work_item_rows(budget, columns):
+    details = budget.work_item.filter(deleted_at__isnull=True).order_by('code', 'id').values_list(
+        'code', 'description', 'unit', 'yield_rate')
+    for index, (code, description, unit, yield_rate) in enumerate(details.iterator(chunk_size=CHUNK_SIZE)):
+        yield [code, description, unit, float(yield_rate), *(column[index] for column in columns)]
+
+
+def _lines(budget, relation, factors, *price_fields):
+    """Composition lines of one resource type, sorted like the work items, with their cost per unit."""
+    through = getattr(WorkItem, relation).through
+    rows = through.objects.filter(**{
+        'workitem__budget': budget,
+        'workitem__deleted_at__isnull': True,
+        f'{relation}__deleted_at__isnull': True,
+    }).order_by('workitem__code', 'workitem_id', f'{relation}__code').values_list(
+        'workitem__code', 'workitem_id', 'workitem__yield_rate', 'workitem__material_unit_usage',
+        f'{relation}__code', f'{relation}__description', *price_fields)
+    type_order = LINE_TYPES.index(relation)
+    for work_item_code, work_item_id, yield_rate, usage, code, description, *prices in rows.iterator(
+            chunk_size=CHUNK_SIZE):
+        yield_rate = float(yield_rate) if yield_rate > 0 else 1.0
+        cost = 1.0
+        for price in prices:
+            cost *= float(price)
+        if relation == 'material':
+            per_unit = cost / yield_rate if usage == 'DIVIDED' else cost
+        elif relation == 'labor':
+            per_unit = cost * factors['labor'] / yield_rate
+        else:
+            per_unit = cost / yield_rate
+        depreciation = float(prices[1]) if len(prices) > 1 else None
+        sort_key = (work_item_code, str(work_item_id), type_order)
+        yield sort_key, [work_item_code, relation, code, description, float(prices[0]), depreciation,
+                         round_cents(per_unit)]
+
+
+def _line_rows(budget, factors):
+    streams = [
+        _lines(budget, 'material', factors, 'material__cost'),
+        _lines(budget, 'equipment', factors, 'equipment__cost', 'equipment__depreciation'),
+        _lines(budget, 'labor', factors, 'labor__hourly_cost'),
+    ]
+    for _, row in heapq.merge(*streams, key=lambda line: line[0]):
+        yield row
+
+
+def _summary_rows(budget, totals, factors):
+    for name, amount in totals.items():
+        if name == 'iva':
+            yield ['iva_percentage', float(budget.iva_percentage) if factors['iva'] else 0.0]
+        yield [name, float(amount)]
+
+
+def report_sections(budget):
+    """``(title, columns, rows)`` of every section of the report of ``budget``."""
+    factors = budget_factors(budget)
+    columns = _price_columns(Compositions(budget), factors)
+    bonds = Bond.objects.filter(budget=budget).order_by('title').values_list(
+        'title', 'amount', 'salary_limit_per_day')
+    retentions = Retention.objects.filter(budget=budget).order_by('retention_type').values_list(
+        'retention_type', 'amount', 'percentage')
+    return [
+        ('Partidas', WORK_ITEM_COLUMNS, _work_item_rows(budget, columns)),
+        ('APU', LINE_COLUMNS, _line_rows(budget, factors)),
+        ('Fianzas', ['title', 'amount', 'salary_limit_per_day'],
+         ([title, float(amount), float(limit)] for title, amount, limit in bonds.iterator())),
+        ('Retenciones', ['retention_type', 'amount', 'percentage'],
+         ([kind, float(amount), float(percentage)] for kind, amount, percentage in retentions.iterator())),
+        ('Resumen', ['concept', 'amount'], _summary_rows(budget, _column_totals(columns, factors), factors)),
+    ]
+
+
+def _encode_csv(sections):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for index, (title, columns, rows) in enumerate(sections):
+        if index:
+            writer.writerow([])
+        writer.writerow([title])
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(['' if value is None else value for value in row])
+            if buffer.tell() >= FLUSH_SIZE:
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def _cell(value):
+    if value is None:
+        return '<c/>'
+    if isinstance(value, (int, float)):
+        return f'<c><v>{value!r}</v></c>'
+    text = escape(INVALID_XML.sub('', str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _row(values):
+    return '<row>' + ''.join(_cell(value) for value in values) + '</row>'
+
+
+class _Sink(io.RawIOBase):
+    """Write-only stream whose contents are taken out as they are produced."""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+WORKBOOK_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '{sheets}</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/></Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets>{sheets}</sheets></workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '{sheets}</Relationships>'
+    ),
+}
+SHEET_ENTRIES = {
+    '[Content_Types].xml': (
+        '<Override PartName="/xl/worksheets/sheet{number}.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    ),
+    'xl/workbook.xml': '<sheet name="{title}" sheetId="{number}" r:id="rId{number}"/>',
+    'xl/_rels/workbook.xml.rels': (
+        '<Relationship Id="rId{number}" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet{number}.xml"/>'
+    ),
+}
+SHEET_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+SHEET_FOOTER = '</sheetData></worksheet>'
+
+
+def _encode_xlsx(sections):
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as workbook:
+        for name, template in WORKBOOK_PARTS.items():
+            entries = ''.join(
+                SHEET_ENTRIES.get(name, '').format(number=number, title=escape(title, {'"': '&quot;'}))
+                for number, (title, _, _) in enumerate(sections, start=1)
+            )
+            workbook.writestr(name, template.format(sheets=entries))
+        yield sink.take()
+
+        for number, (_, columns, rows) in enumerate(sections, start=1):
+            with workbook.open(f'xl/worksheets/sheet{number}.xml', 'w') as sheet:
+                block = [SHEET_HEADER, _row(columns)]
+                size = 0
+                for row in rows:
+                    encoded = _row(row)
+                    block.append(encoded)
+                    size += len(encoded)
+                    if size >= FLUSH_SIZE:
+                        sheet.write(''.join(block).encode())
+                        block = []
+                        size = 0
+                        yield sink.take()
+                block.append(SHEET_FOOTER)
+                sheet.write(''.join(block).encode())
+            yield sink.take()
+    yield sink.take()
+
+
+def stream_report(budget, file_format=XLSX):
+    """Yields the report of ``budget`` as encoded byte blocks."""
+    encoders = {CSV: _encode_csv, XLSX: _encode_xlsx}
+    return (chunk for chunk in encoders[file_format](report_sections(budget)) if chunk)
+
+
+def report_name(budget, file_format):
+    """
+    Storage name of the cached report of ``budget`` in its current state:
+    budget, bond and retention edits move ``updated_at``, price or
+    composition changes the shared version of its totals, and code or
+    description changes of its work items and resources their catalog version.
+    """
+    version = get_version(TOTALS_VERSION_NAMESPACE, budget.pk)
+    catalogs = catalog_versions(sorted(str(pk) for pk in catalog_database_ids(budget)))
+    digest = hashlib.sha1(repr(sorted(catalogs.items())).encode()).hexdigest()[:12]
+    stamp = budget.updated_at.strftime('%Y%m%dT%H%M%S%f')
+    return f'reports/{budget.pk}/{stamp}-{version}-{digest}.{file_format}'
+
+
+def write_report(budget, file_format):
+    """Writes the report of ``budget`` to the file storage, replacing its outdated reports."""
+    storage = job_files_storage()
+    # The version is read first, so a change during the writing is never lost
+    name = report_name(budget, file_format)
+    record_dependencies(budget)
+    path = storage.path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f'{path}.part'
+    with open(partial, 'wb') as output:
+        for chunk in stream_report(budget, file_format):
+            output.write(chunk)
+    os.replace(partial, path)
+
+    directory = os.path.dirname(name)
+    for filename in storage.listdir(directory)[1]:
+        if filename.endswith(f'.{file_format}') and f'{directory}/{filename}' != name:
+            storage.delete(f'{directory}/{filename}')
+    return name
@@ -1,17 +1,23 @@
 import datetime
 
 from django.contrib.auth import get_user_model
+from django.utils.timezone import now
 from rest_framework import serializers
 
-from apps.budgets.models import Bond, Budget, Retention
+from apps.budgets.models import Bond, Budget, Retention, Scenario
+from apps.budgets.totals import cached_budget_totals, cached_totals_by_budget
 from apps.companies.models import Company
 from apps.companies.serializers.serializers import CompanyPublicSerializer
+from apps.databases.models import Equipment, Labor, Material, WorkItem
 from apps.databases.serializers.serializers import UserSerializer, WorkItemSerializer
 
 User = get_user_model()
 
 
 class BondSerializer(serializers.ModelSerializer):
+    # Sent back on budget updates to keep the bond
+    id = serializers.UUIDField(required=False)
+
     class Meta:
         model = Bond
         fields = [
@@ -23,6 +29,9 @@ class BondSerializer(serializers.ModelSerializer):
 
 
 class RetentionSerializer(serializers.ModelSerializer):
+    # Sent back on budget updates to keep the retention
+    id = serializers.UUIDField(required=False)
+
     class Meta:
         model = Retention
         fields = [
@@ -33,11 +42,21 @@ class RetentionSerializer(serializers.ModelSerializer):
         ]
 
 
+class ScenarioSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Scenario
+        fields = ['id', 'name', *Scenario.FACTORS]
+        # Saving a scenario under an existing name replaces it, factors left out included
+        extra_kwargs = {factor: {'default': None} for factor in Scenario.FACTORS}
+        validators = []
+
+
 class BudgetSerializer(serializers.ModelSerializer):
     bonds = BondSerializer(many=True, required=False)
     retentions = RetentionSerializer(many=True, required=False)
     work_item = WorkItemSerializer(many=True, required=False)
     company = CompanyPublicSerializer(many=False)
+    totals = serializers.SerializerMethodField()
 
     class Meta:
         model = Budget
@@ -66,9 +85,46 @@ class BudgetSerializer(serializers.ModelSerializer):
             'created_at',
             'state',
             'company',
+            'totals',
         ]
         read_only_fields = ['user']
 
+    def get_totals(self, obj):
+        return cached_budget_totals(obj)
+
+    @staticmethod
+    def _save_children(budget, model, items, existing=()):
+        """
+        Saves the bonds or retentions ``items`` of ``budget`` against its
+        ``existing`` rows, matched by id. Changed rows are updated and new
+        ones created in bulk, and the rows left out are soft-deleted with one
+        UPDATE. Unchanged rows are not written. Returns whether any row was.
+        """
+        existing = {row.pk: row for row in existing}
+        stamp = now()
+        created, changed, fields = [], [], set()
+        for item in items:
+            row = existing.pop(item.pop('id', None), None)
+            if row is None:
+                created.append(model(budget=budget, **item))
+                continue
+            dirty = [name for name, value in item.items() if getattr(row, name) != value]
+            if dirty:
+                for name in dirty:
+                    setattr(row, name, item[name])
+                row.updated_at = stamp
+                changed.append(row)
+                fields.update(dirty)
+
+        if created:
+            model.objects.bulk_create(created)
+        if changed:
+            model.objects.bulk_update(changed, [*fields, 'updated_at'])
+        if existing:
+            # Kept as tombstones for the changes feed
+            model.objects.filter(pk__in=existing).update(deleted_at=stamp, updated_at=stamp)
+        return bool(created or changed or existing)
+
     def create(self, validated_data):
         bonds_data = validated_data.pop('bonds', [])
         retentions_data = validated_data.pop('retentions', [])
@@ -77,38 +133,76 @@ class BudgetSerializer(serializers.ModelSerializer):
         validated_data['user'] = self.context['request'].user
         budget = Budget.objects.create(**validated_data)
 
-        # Create bonds
-        for bond_data in bonds_data:
-            Bond.objects.create(budget=budget, **bond_data)
-
-        # Create retentions
-        for retention_data in retentions_data:
-            Retention.objects.create(budget=budget, **retention_data)
-
+        self._save_children(budget, Bond, bonds_data)
+        self._save_children(budget, Retention, retentions_data)
         return budget
 
     def update(self, instance, validated_data):
-        bonds_data = validated_data.pop('bonds', [])
-        retentions_data = validated_data.pop('retentions', [])
+        bonds_data = validated_data.pop('bonds', None)
+        retentions_data = validated_data.pop('retentions', None)
 
-        # Update budget fields
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
+        # Update budget fields, only when one of them changes
+        dirty = [attr for attr, value in validated_data.items() if getattr(instance, attr) != value]
+        if dirty:
+            for attr in dirty:
+                setattr(instance, attr, validated_data[attr])
+            instance.save(update_fields=[*dirty, 'updated_at'])
 
-        # Update bonds
-        instance.bonds.all().delete()
-        for bond_data in bonds_data:
-            Bond.objects.create(budget=instance, **bond_data)
-
-        # Update retentions
-        instance.retentions.all().delete()
-        for retention_data in retentions_data:
-            Retention.objects.create(budget=instance, **retention_data)
+        # Bonds and retentions left out of the request are kept
+        written = False
+        if bonds_data is not None:
+            written |= self._save_children(instance, Bond, bonds_data, instance.bonds.all())
+        if retentions_data is not None:
+            written |= self._save_children(instance, Retention, retentions_data, instance.retentions.all())
+        if written and not dirty:
+            # Cached reports, which list the bonds and retentions, are keyed by the budget's updated_at
+            instance.updated_at = now()
+            Budget.objects.filter(pk=instance.pk).update(updated_at=instance.updated_at)
 
         return instance
 
 
+class BudgetSummaryListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        budgets = list(data.all() if hasattr(data, 'all') else data)
+        totals = cached_totals_by_budget(budgets)
+        for budget in budgets:
+            budget.cached_totals = totals[budget.pk]
+        return super().to_representation(budgets)
+
+
+class BudgetSummarySerializer(serializers.ModelSerializer):
+    """
+    Budget list entries: no work items, bonds or retentions. The work item
+    count is annotated by ``with_work_item_count`` and the total read from the
+    totals cache, so an entry costs the same whatever the size of its budget.
+    """
+    company = CompanyPublicSerializer(many=False, read_only=True)
+    work_item_count = serializers.IntegerField(read_only=True)
+    total = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Budget
+        list_serializer_class = BudgetSummaryListSerializer
+        fields = [
+            'id',
+            'code',
+            'name',
+            'state',
+            'company',
+            'currency',
+            'work_item_count',
+            'total',
+            'created_at',
+        ]
+        # The total changes with the prices of the work items
+        derived_from = [WorkItem, Material, Labor, Equipment]
+
+    def get_total(self, obj):
+        totals = getattr(obj, 'cached_totals', None) or cached_budget_totals(obj)
+        return totals['total']
+
+
 class BudgetCreateSerializer(serializers.ModelSerializer):
     company_id = serializers.UUIDField(write_only=True)
     owner_id = serializers.UUIDField(write_only=True)
@@ -0,0 +1,69 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from apps.databases.models import (
+    Equipment,
+    Labor,
+    Material,
+    WorkItem,
+    rollups_recomputed,
+)
+from utils.conditional import touch_many_to_many_owners
+
+from .models import Budget, TotalsDependency
+from .totals import invalidate_budgets, invalidate_dependents
+
+RESOURCE_DEPENDENCY_KINDS = {
+    Material: TotalsDependency.Kind.MATERIAL,
+    Labor: TotalsDependency.Kind.LABOR,
+    Equipment: TotalsDependency.Kind.EQUIPMENT,
+}
+
+
+@receiver(m2m_changed, sender=Budget.work_item.through)
+def touch_budgets_on_work_item_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Marks budgets whose work item set changed as modified."""
+    touch_many_to_many_owners(Budget, 'work_item', instance, action, reverse, pk_set)
+
+
+@receiver(m2m_changed, sender=Budget.work_item.through)
+def invalidate_totals_on_work_item_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Drops the cached totals of budgets whose work item set changed."""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        invalidate_budgets([instance.pk])
+    elif action == 'post_clear':
+        invalidate_dependents(TotalsDependency.Kind.WORK_ITEM, [instance.pk])
+    else:
+        invalidate_budgets(pk_set)
+
+
+@receiver(post_save, sender=Budget)
+def invalidate_totals_on_budget_change(sender, instance, created, **kwargs):
+    """Factors are read from the budget row, so any save may change its totals."""
+    if not created:
+        invalidate_budgets([instance.pk])
+
+
+@receiver(post_save, sender=WorkItem)
+@receiver(post_delete, sender=WorkItem)
+def invalidate_totals_on_work_item_save(sender, instance, created=False, **kwargs):
+    if not created:
+        invalidate_dependents(TotalsDependency.Kind.WORK_ITEM, [instance.pk])
+
+
+@receiver(rollups_recomputed, sender=WorkItem)
+def invalidate_totals_on_rollup_change(sender, queryset, **kwargs):
+    """
+    Price and composition changes, bulk ones included, all end in a rollup
+    recomputation of the work items they affect.
+    """
+    invalidate_dependents(TotalsDependency.Kind.WORK_ITEM, queryset.values('pk'))
+
+
+@receiver(post_delete, sender=Material)
+@receiver(post_delete, sender=Labor)
+@receiver(post_delete, sender=Equipment)
+def invalidate_totals_on_resource_delete(sender, instance, **kwargs):
+    invalidate_dependents(RESOURCE_DEPENDENCY_KINDS[sender], [instance.pk])
@@ -0,0 +1,20 @@
+"""Background variants of the heavy budget actions, run by ``runworker``."""
+from apps.jobs.queue import register
+
+from .calculation import calculate_budget
+from .models import Budget
+from .reports import write_report
+
+
+@register('budgets.calculate')
+def calculate_task(job, budget_id):
+    budget = Budget.objects.get(pk=budget_id, user=job.user)
+    job.report_progress(0, 'Calculando presupuesto')
+    return calculate_budget(budget)
+
+
+@register('budgets.report')
+def report_task(job, budget_id, file_format):
+    budget = Budget.objects.get(pk=budget_id, user=job.user)
+    job.report_progress(0, 'Generando reporte')
+    return {'name': write_report(budget, file_format)}
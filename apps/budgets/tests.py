@@ -1,2 +1,661 @@
+import csv
+import io
+import tempfile
+import zipfile
+from array import array
+from decimal import Decimal
+from xml.etree import ElementTree
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import now
+from rest_framework import status
+
+from apps.budgets.calculation import (
+    Compositions,
+    _price_columns,
+    budget_factors,
+    round_cents,
+)
+from apps.budgets.models import Bond, Budget, Retention, Scenario, TotalsDependency
+from apps.budgets.totals import invalidate_budgets, reset_cache_stats
+from apps.companies.models import Company
+from apps.databases.models import Database, Equipment, Labor, Material, Unit, WorkItem
+from apps.databases.repricing import reprice_database
+from apps.jobs.models import Job
+from utils.tests import BaseTestCase
+
+
+@override_settings(SYNC_LAG_SECONDS=0)
+class BudgetChangesTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.budget = Budget.objects.create(
+            code='BG001',
+            contract='CT001',
+            budget_date='2025-01-01',
+            name='Test Budget',
+            owner='Owner',
+            calculated_by='Engineer',
+            user=self.user
+        )
+        self.bond = Bond.objects.create(budget=self.budget, title='Bond', amount=Decimal('100.00'))
+        self.url = reverse('budget-changes', kwargs={'pk': self.budget.id})
+
+    def test_budget_changes(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual({change['type'] for change in response.data['changes']}, {'budget', 'bond'})
+
+        database = Database.objects.create(code='DB001', name='Test Database', description='', user=self.user)
+        work_item = WorkItem.objects.create(
+            code='WI001', description='Concrete', unit='m3', yield_rate=Decimal('1.00'), database=database)
+        self.budget.work_item.add(work_item)
+
+        response = self.client.get(self.url, {'since': response.data['cursor']})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        changes = response.data['changes']
+        self.assertEqual([change['type'] for change in changes], ['budget'])
+        self.assertEqual(changes[0]['data']['work_item'], [work_item.id])
+
+    def test_other_users_budgets_are_hidden(self):
+        other = self.get_tokens_for_user(
+            type(self.user).objects.create_user(
+                username='other', email='other@example.com', name='Other', last_name='User', password='pass12345'))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {other["access"]}')
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class PricedBudgetTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.database = Database.objects.create(code='DB001', name='Test Database', description='', user=self.user)
+        unit = Unit.objects.create(name='Kilogramo', symbol='kg')
+        self.budget = Budget.objects.create(
+            code='BG001',
+            contract='CT001',
+            budget_date='2025-01-01',
+            name='Test Budget',
+            owner='Owner',
+            calculated_by='Engineer',
+            user=self.user,
+            hours_per_day=Decimal('8.00'),
+            administration_percentage=Decimal('10.00'),
+            utility_percentage=Decimal('10.00'),
+            financing_percentage=Decimal('0.00'),
+            iva_percentage=Decimal('16.00'),
+        )
+        self.cement = cement = Material.objects.create(
+            code='MT001', description='Cement', unit=unit, cost=Decimal('40.00'), database=self.database)
+        mason = Labor.objects.create(
+            code='LB001', description='Mason', hourly_cost=Decimal('5.00'), database=self.database)
+        mixer = Equipment.objects.create(
+            code='EQ001', description='Mixer', cost=Decimal('1000.00'), depreciation=Decimal('0.02'),
+            database=self.database)
+        self.unitary = WorkItem.objects.create(
+            code='WI001', description='Concrete', unit='m3', yield_rate=Decimal('4.00'), database=self.database)
+        self.unitary.material.add(cement)
+        self.unitary.labor.add(mason)
+        self.unitary.equipment.add(mixer)
+        self.divided = WorkItem.objects.create(
+            code='WI002', description='Mortar', unit='m3', yield_rate=Decimal('2.00'), database=self.database,
+            material_unit_usage='DIVIDED')
+        self.divided.material.add(cement)
+        self.budget.work_item.add(self.unitary, self.divided)
+        self.budget.refresh_from_db()
+
+
+class BudgetCalculationTests(PricedBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('budget-calculate', kwargs={'pk': self.budget.id})
+
+    def test_calculate_unit_prices_and_totals(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        unitary, divided = response.data['work_items']
+        # 40 + 1000 * 0.02 / 4 + 5 * 8 / 4 = 55, plus 10% administration and 10% utility
+        self.assertEqual(unitary['code'], 'WI001')
+        self.assertEqual(unitary['material'], '40.00')
+        self.assertEqual(unitary['equipment'], '5.00')
+        self.assertEqual(unitary['labor'], '10.00')
+        self.assertEqual(unitary['direct_cost'], '55.00')
+        self.assertEqual(unitary['administration'], '5.50')
+        self.assertEqual(unitary['utility'], '6.05')
+        self.assertEqual(unitary['unit_price'], '66.55')
+        # Materials of DIVIDED work items are spread over the yield
+        self.assertEqual(divided['material'], '20.00')
+        self.assertEqual(divided['unit_price'], '24.20')
+        self.assertEqual(response.data['totals']['subtotal'], '90.75')
+        self.assertEqual(response.data['totals']['iva'], '14.52')
+        self.assertEqual(response.data['totals']['total'], '105.27')
+
+    def test_associated_cost_factor_and_no_iva(self):
+        self.budget.use_associated_cost_factor = True
+        self.budget.direct_labor_factor = Decimal('100.00')
+        self.budget.iva_type = Budget.IVAChoices.NO_IVA
+        self.budget.save()
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.data['work_items'][0]['labor'], '20.00')
+        self.assertEqual(response.data['totals']['iva'], '0.00')
+
+    def test_query_count_is_constant(self):
+        # Authentication, the budget, its work items and one query per resource type
+        with self.assertNumQueries(6):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_prices_ten_thousand_synthetic_work_items(self):
+        # Timing lives in the benchmark_calculation command; this only pins the results
+        size = 10000
+        compositions = Compositions.__new__(Compositions)
+        compositions.ids = list(range(size))
+        compositions.yields = array('d', [2.0] * size)
+        compositions.divided = array('d', [index % 2 for index in range(size)])
+        positions = array('q', [index % size for index in range(8 * size)])
+        for relation in ('material', 'labor', 'equipment'):
+            setattr(compositions, relation, (positions, array('d', [1.5] * (8 * size))))
+
+        columns = _price_columns(compositions, budget_factors(self.budget))
+
+        self.assertEqual(len(columns[0]), size)
+        self.assertEqual(columns[0][:2], [12.0, 6.0])
+        self.assertEqual(columns[0][-2:], [12.0, 6.0])
+
+    def test_unit_prices_round_half_cents_up(self):
+        compositions = Compositions.__new__(Compositions)
+        compositions.ids = [0, 1]
+        compositions.yields = array('d', [1.0, 1.0])
+        compositions.divided = array('d', [0.0, 0.0])
+        compositions.material = (array('q', [0, 1]), array('d', [1.005, 2.675]))
+        compositions.labor = compositions.equipment = (array('q'), array('d'))
+        factors = {'labor': 8.0, 'administration': 0.0, 'financing': 0.0, 'utility': 0.0, 'iva': 0.0}
+
+        columns = _price_columns(compositions, factors)
+
+        # round() would give 1.0 and 2.67, a cent off the Decimal rollups
+        self.assertEqual(columns[0], [1.01, 2.68])
+        self.assertEqual(columns[-1], [1.01, 2.68])
+        self.assertEqual(round_cents(-1.005), -1.01)
+
+    def test_benchmark_command_reports_the_timing(self):
+        stdout = io.StringIO()
+        call_command('benchmark_calculation', '--work-items', '100', '--repeat', '1', stdout=stdout)
+        self.assertIn('Priced 100 work items in', stdout.getvalue())
+
+
+class BudgetScenarioTests(PricedBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('budget-scenarios', kwargs={'pk': self.budget.id})
+
+    def _scenario_url(self, name):
+        return reverse('budget-scenario', kwargs={'pk': self.budget.id, 'name': name})
+
+    def test_base_totals_match_the_calculation(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['base']['subtotal'], '90.75')
+        self.assertEqual(response.data['base']['total'], '105.27')
+        self.assertEqual(response.data['scenarios'], [])
+
+    def test_save_and_replace_named_scenarios(self):
+        response = self.client.post(
+            self.url, {'name': 'Agresivo', 'administration_percentage': '20.00', 'utility_percentage': '0.00'})
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        # Direct cost 55 + 20, 20% administration, no utility, 16% IVA
+        self.assertEqual(response.data['totals']['administration'], '15.00')
+        self.assertEqual(response.data['totals']['subtotal'], '90.00')
+        self.assertEqual(response.data['totals']['total'], '104.40')
+
+        response = self.client.post(self.url, {'name': 'Agresivo', 'iva_percentage': '0.00'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['totals']['total'], '90.75')
+        self.assertEqual(Scenario.objects.filter(budget=self.budget).count(), 1)
+        self.assertEqual(self.client.get(self._scenario_url('Agresivo')).data['totals']['iva'], '0.00')
+
+    def test_cached_costs_skip_the_compositions(self):
+        Scenario.objects.create(budget=self.budget, name='Agresivo', utility_percentage=Decimal('0.00'))
+        self.client.get(self.url)
+
+        # Authentication, the budget, the catalog version stamp and the scenarios
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['scenarios'][0]['totals']['subtotal'], '82.50')
+
+    def test_price_changes_invalidate_cached_costs(self):
+        self.client.get(self.url)
+        self.cement.cost = Decimal('50.00')
+        self.cement.save()
+
+        response = self.client.get(self.url)
+
+        # Materials add 10 to the unitary work item and 5 to the divided one
+        self.assertEqual(response.data['base']['direct_cost'], '90.00')
+
+    def test_price_changes_in_other_databases_invalidate_cached_costs(self):
+        other = Database.objects.create(code='DB002', name='Other Database', description='', user=self.user)
+        sand = Material.objects.create(
+            code='MT002', description='Sand', unit=self.cement.unit, cost=Decimal('8.00'), database=other)
+        self.unitary.material.add(sand)
+        self.client.get(self.url)
+
+        reprice_database(other, Decimal('25'), resource_types=['material'])
+
+        # Sand adds 2 more to the unitary work item
+        self.assertEqual(self.client.get(self.url).data['base']['direct_cost'], '85.00')
+
+    def test_delete_scenario(self):
+        Scenario.objects.create(budget=self.budget, name='Agresivo', utility_percentage=Decimal('0.00'))
+
+        response = self.client.delete(self._scenario_url('Agresivo'))
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.get(self._scenario_url('Agresivo')).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertTrue(Budget.objects.filter(pk=self.budget.pk).exists())
+
+
+class BudgetTotalsCacheTests(PricedBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('budget-detail', kwargs={'pk': self.budget.id})
+        self.stats_url = reverse('budget-totals-cache')
+        # A second budget sharing the labor but not the cement
+        self.other = Budget.objects.create(
+            code='BG002',
+            contract='CT002',
+            budget_date='2025-01-01',
+            name='Other Budget',
+            owner='Owner',
+            calculated_by='Engineer',
+            user=self.user,
+        )
+        plastering = WorkItem.objects.create(
+            code='WI003', description='Plastering', unit='m2', yield_rate=Decimal('8.00'), database=self.database)
+        plastering.labor.add(*self.unitary.labor.all())
+        self.other.work_item.add(plastering)
+        self.other_url = reverse('budget-detail', kwargs={'pk': self.other.id})
+        reset_cache_stats()
+
+    def _stats(self):
+        return self.client.get(self.stats_url).data
+
+    def test_detail_reads_totals_from_the_cache(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['totals']['total'], '105.27')
+
+        self.client.get(self.url)
+        self.assertEqual(self._stats(), {'hits': 1, 'misses': 1, 'invalidations': 0})
+
+    def test_dependencies_are_recorded(self):
+        self.client.get(self.url)
+
+        edges = set(TotalsDependency.objects.filter(budget=self.budget).values_list('kind', 'object_id'))
+        self.assertEqual(edges, {
+            (TotalsDependency.Kind.WORK_ITEM, self.unitary.id),
+            (TotalsDependency.Kind.WORK_ITEM, self.divided.id),
+            (TotalsDependency.Kind.MATERIAL, self.cement.id),
+            (TotalsDependency.Kind.LABOR, self.unitary.labor.get().id),
+            (TotalsDependency.Kind.EQUIPMENT, self.unitary.equipment.get().id),
+        })
+
+    def test_misses_on_unchanged_dependencies_do_not_write(self):
+        self.client.get(self.url)
+        invalidate_budgets([self.budget.pk])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+
+        written = [query['sql'] for query in queries if query['sql'].startswith(('INSERT', 'DELETE'))]
+        self.assertFalse([sql for sql in written if 'totalsdependency' in sql])
+        self.assertEqual(response.data['totals']['total'], '105.27')
+        self.assertEqual(self._stats()['misses'], 2)
+
+    def test_price_change_invalidates_only_dependent_budgets(self):
+        self.client.get(self.url)
+        self.client.get(self.other_url)
+
+        self.cement.cost = Decimal('50.00')
+        self.cement.save()
+
+        self.assertEqual(self._stats()['invalidations'], 1)
+        self.assertEqual(self.client.get(self.url).data['totals']['direct_cost'], '90.00')
+        self.client.get(self.other_url)
+        self.assertEqual(self._stats(), {'hits': 1, 'misses': 3, 'invalidations': 1})
+
+    def test_shared_resource_invalidates_every_dependent_budget(self):
+        self.client.get(self.url)
+        self.client.get(self.other_url)
+
+        mason = self.unitary.labor.get()
+        mason.hourly_cost = Decimal('6.00')
+        mason.save()
+
+        self.assertEqual(self._stats()['invalidations'], 2)
+
+    def test_bulk_repricing_invalidates_dependent_budgets(self):
+        self.client.get(self.url)
+        self.client.get(self.other_url)
+
+        reprice_database(self.database, Decimal('25'), resource_types=['material'])
+
+        self.assertEqual(self._stats()['invalidations'], 1)
+        self.assertEqual(self.client.get(self.url).data['totals']['direct_cost'], '90.00')
+
+    def test_work_item_set_change_invalidates_the_budget(self):
+        self.client.get(self.url)
+
+        self.budget.work_item.remove(self.divided)
+
+        self.assertEqual(self.client.get(self.url).data['totals']['subtotal'], '66.55')
+        self.assertFalse(TotalsDependency.objects.filter(object_id=self.divided.id).exists())
+
+
+class BudgetListTests(PricedBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('budget-list')
+
+    def _entry(self, **headers):
+        response = self.client.get(self.url, headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, response.data['results'][0]
+
+    def test_entries_summarize_the_budget(self):
+        _, entry = self._entry()
+
+        self.assertEqual(set(entry), {
+            'id', 'code', 'name', 'state', 'company', 'currency', 'work_item_count', 'total', 'created_at'})
+        self.assertEqual(entry['work_item_count'], 2)
+        self.assertEqual(entry['total'], '105.27')
+
+    def test_deleted_work_items_are_not_counted(self):
+        WorkItem.objects.filter(pk=self.divided.pk).update(deleted_at=now())
+
+        self.assertEqual(self._entry()[1]['work_item_count'], 1)
+
+    def test_totals_are_read_from_the_cache(self):
+        self._entry()
+        reset_cache_stats()
+
+        self._entry()
+
+        self.assertEqual(self.client.get(reverse('budget-totals-cache')).data['hits'], 1)
+
+    def test_price_change_refreshes_the_entry(self):
+        response, _ = self._entry()
+
+        self.cement.cost = Decimal('50.00')
+        self.cement.save()
+
+        response, entry = self._entry(if_none_match=response['ETag'])
+        # Direct cost 90, plus 10% administration, 10% utility and 16% IVA
+        self.assertEqual(entry['total'], '126.32')
+
+
+class BudgetChildrenUpdateTests(PricedBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('budget-detail', kwargs={'pk': self.budget.id})
+        self.kept = Bond.objects.create(budget=self.budget, title='Fiel cumplimiento', amount=Decimal('100.00'))
+        self.dropped = Bond.objects.create(budget=self.budget, title='Anticipo', amount=Decimal('50.00'))
+        self.retention = Retention.objects.create(
+            budget=self.budget, retention_type=Retention.RetentionType.LABOR, amount=Decimal('10.00'),
+            percentage=Decimal('5.00'))
+        self.budget.refresh_from_db()
+
+    def _payload(self, **bonds):
+        return {
+            'bonds': [
+                {'id': str(bond.id), 'title': bond.title, 'amount': bonds.get(bond.title, str(bond.amount))}
+                for bond in (self.kept, self.dropped)
+            ],
+            'retentions': [{
+                'id': str(self.retention.id), 'retention_type': 'LABOR', 'amount': '10.00', 'percentage': '5.00'}],
+        }
+
+    def _stamps(self):
+        return {
+            'budget': Budget.objects.get(pk=self.budget.pk).updated_at,
+            **dict(Bond.all_objects.values_list('title', 'updated_at')),
+            'retention': Retention.objects.get().updated_at,
+        }
+
+    def test_unchanged_children_are_not_written(self):
+        # Computing the totals records their dependencies
+        self.client.get(self.url)
+        stamps = self._stamps()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(self.url, self._payload(), format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._stamps(), stamps)
+        self.assertFalse([query['sql'] for query in queries if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))])
+
+    def test_children_are_updated_created_and_soft_deleted(self):
+        payload = self._payload(**{'Fiel cumplimiento': '120.00'})
+        payload['bonds'] = [payload['bonds'][0], {'title': 'Laboral', 'amount': '30.00'}]
+
+        response = self.client.patch(self.url, payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted((bond['title'], bond['amount']) for bond in response.data['bonds']),
+                         [('Fiel cumplimiento', '120.00'), ('Laboral', '30.00')])
+        self.assertEqual(Bond.objects.get(pk=self.kept.pk).amount, Decimal('120.00'))
+        self.assertIsNotNone(Bond.all_objects.get(pk=self.dropped.pk).deleted_at)
+        self.assertEqual(Bond.all_objects.count(), 3)
+        self.assertEqual(Retention.objects.get().updated_at, self.retention.updated_at)
+
+    def test_omitted_children_are_kept(self):
+        response = self.client.patch(self.url, {'name': 'Renamed'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Budget.objects.get(pk=self.budget.pk).name, 'Renamed')
+        self.assertEqual(Bond.objects.filter(budget=self.budget).count(), 2)
+        self.assertEqual(Retention.objects.filter(budget=self.budget).count(), 1)
+
+
+class BudgetReportTests(PricedBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        files_root = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(files_root.cleanup)
+        settings_override = override_settings(JOBS_FILES_ROOT=files_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        Bond.objects.create(budget=self.budget, title='Bond', amount=Decimal('100.00'))
+        self.url = reverse('budget-report', kwargs={'pk': self.budget.id})
+
+    def _sections(self, content):
+        sections = {}
+        for block in content.decode().replace('\r\n', '\n').strip().split('\n\n'):
+            title, *rows = list(csv.reader(io.StringIO(block)))
+            sections[title[0]] = rows
+        return sections
+
+    def test_csv_report(self):
+        response = self.client.get(self.url, {'output': 'csv'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="BG001.csv"')
+        sections = self._sections(b''.join(response.streaming_content))
+        header, unitary, divided = sections['Partidas']
+        self.assertEqual(header[-1], 'unit_price')
+        self.assertEqual((unitary[0], unitary[-1]), ('WI001', '66.55'))
+        self.assertEqual((divided[0], divided[-1]), ('WI002', '24.2'))
+        self.assertEqual(
+            [(row[0], row[1], row[-1]) for row in sections['APU'][1:]],
+            [('WI001', 'material', '40.0'), ('WI001', 'equipment', '5.0'), ('WI001', 'labor', '10.0'),
+             ('WI002', 'material', '20.0')])
+        self.assertEqual(sections['Fianzas'][1], ['Bond', '100.0', '0.0'])
+        self.assertIn(['total', '105.27'], sections['Resumen'])
+
+    def test_xlsx_report(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        workbook = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        namespace = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        sheets = ElementTree.fromstring(workbook.read('xl/workbook.xml')).findall('s:sheets/s:sheet', namespace)
+        self.assertEqual([sheet.get('name') for sheet in sheets],
+                         ['Partidas', 'APU', 'Fianzas', 'Retenciones', 'Resumen'])
+        rows = ElementTree.fromstring(workbook.read('xl/worksheets/sheet1.xml')).findall('.//s:row', namespace)
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[1].find('s:c/s:is/s:t', namespace).text, 'WI001')
+        self.assertEqual(rows[1].findall('s:c', namespace)[-1].find('s:v', namespace).text, '66.55')
+
+    @override_settings(BUDGET_REPORT_SYNC_LIMIT=1)
+    def test_large_reports_are_written_by_a_job_and_cached(self):
+        response = self.client.get(self.url, {'output': 'csv'})
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        # Asking again while it is queued does not queue another job
+        self.assertEqual(self.client.get(self.url, {'output': 'csv'}).data['id'], response.data['id'])
+
+        call_command('runworker', '--burst', stdout=io.StringIO())
+        self.assertEqual(Job.objects.get().status, Job.Status.SUCCEEDED)
+
+        response = self.client.get(self.url, {'output': 'csv'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(['total', '105.27'], self._sections(b''.join(response.streaming_content))['Resumen'])
+
+        self.budget.iva_percentage = Decimal('0.00')
+        self.budget.save()
+        self.assertEqual(self.client.get(self.url, {'output': 'csv'}).status_code, status.HTTP_202_ACCEPTED)
+
+    @override_settings(BUDGET_REPORT_SYNC_LIMIT=1)
+    def test_bond_edits_replace_the_cached_report(self):
+        self.client.get(self.url, {'output': 'csv'})
+        call_command('runworker', '--burst', stdout=io.StringIO())
+        bond = Bond.objects.get()
+
+        response = self.client.patch(reverse('budget-detail', kwargs={'pk': self.budget.id}), {
+            'bonds': [{'id': str(bond.id), 'title': 'Bond', 'amount': '150.00'}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(self.client.get(self.url, {'output': 'csv'}).status_code, status.HTTP_202_ACCEPTED)
+        call_command('runworker', '--burst', stdout=io.StringIO())
+        response = self.client.get(self.url, {'output': 'csv'})
+        self.assertEqual(self._sections(b''.join(response.streaming_content))['Fianzas'][1][:2], ['Bond', '150.0'])
+
+    @override_settings(BUDGET_REPORT_SYNC_LIMIT=1)
+    def test_resource_descriptions_replace_the_cached_report(self):
+        self.client.get(self.url, {'output': 'csv'})
+        call_command('runworker', '--burst', stdout=io.StringIO())
+
+        self.cement.description = 'Portland cement'
+        self.cement.save()
+
+        self.assertEqual(self.client.get(self.url, {'output': 'csv'}).status_code, status.HTTP_202_ACCEPTED)
+
+    @override_settings(BUDGET_REPORT_SYNC_LIMIT=1)
+    def test_report_files_are_found_by_every_process(self):
+        self.client.get(self.url, {'output': 'csv'})
+        call_command('runworker', '--burst', stdout=io.StringIO())
+        # A web worker that shares nothing with runworker but the versions cache
+        caches['default'].clear()
+
+        response = self.client.get(self.url, {'output': 'csv'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Job.objects.count(), 1)
+
+        self.cement.cost = Decimal('50.00')
+        self.cement.save()
+        self.assertEqual(self.client.get(self.url, {'output': 'csv'}).status_code, status.HTTP_202_ACCEPTED)
+
+    def test_unknown_output(self):
+        response = self.client.get(self.url, {'output': 'pdf'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(SYNC_LAG_SECONDS=0)
+class BudgetQueryCountTests(PricedBudgetTestCase):
+    """Every budget endpoint runs the same number of queries however many rows it reads."""
+
+    def setUp(self):
+        super().setUp()
+        Scenario.objects.create(budget=self.budget, name='Agresivo', utility_percentage=Decimal('0.00'))
+        self.company = Company.objects.create(
+            tax_id='J-12345678-9', name='Constructora', address='Caracas', phone='0212', user=self.user)
+        Budget.objects.filter(pk=self.budget.pk).update(company=self.company)
+
+    def _grow(self):
+        """Adds work items, resources, bonds, retentions and budgets."""
+        unit = Unit.objects.get(symbol='kg')
+        for number in range(3, 9):
+            work_item = WorkItem.objects.create(
+                code=f'WI{number:03}', description='Wall', unit='m2', yield_rate=Decimal('3.00'),
+                database=self.database)
+            work_item.material.add(Material.objects.create(
+                code=f'MT{number:03}', description='Brick', unit=unit, cost=Decimal('2.00'), database=self.database))
+            work_item.labor.add(Labor.objects.create(
+                code=f'LB{number:03}', description='Helper', hourly_cost=Decimal('3.00'), database=self.database))
+            work_item.equipment.add(Equipment.objects.create(
+                code=f'EQ{number:03}', description='Scaffold', cost=Decimal('500.00'),
+                depreciation=Decimal('0.01'), database=self.database))
+            self.budget.work_item.add(work_item)
+        for number in range(3):
+            Bond.objects.create(budget=self.budget, title=f'Fianza {number}', amount=Decimal('100.00'),
+                                salary_limit_per_day=Decimal('10.00'))
+            Retention.objects.create(budget=self.budget, retention_type=Retention.RetentionType.LABOR,
+                                     amount=Decimal('50.00'), percentage=Decimal('5.00'))
+            Scenario.objects.create(budget=self.budget, name=f'Escenario {number}', iva_percentage=Decimal('0.00'))
+            other = Budget.objects.create(
+                code=f'BG{number + 2:03}', contract='CT002', budget_date='2025-01-01', name='Other', owner='Owner',
+                calculated_by='Engineer', user=self.user, hours_per_day=Decimal('8.00'), company=self.company)
+            other.work_item.add(self.unitary, self.divided)
+
+    def _count(self, url, params=None):
+        # A first request warms the unit registry and the totals cache
+        self.client.get(url, params)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries)
+
+    def assertConstantQueries(self, expected, url, params=None):
+        self.assertEqual(self._count(url, params), expected)
+        self._grow()
+        self.assertEqual(self._count(url, params), expected)
+
+    def _url(self, route, **kwargs):
+        return reverse(route, kwargs={'pk': self.budget.id, **kwargs})
+
+    def test_list(self):
+        # Authentication, the ETag validator, the budgets with their company and work item count,
+        # and the totals version stamps
+        self.assertConstantQueries(4, reverse('budget-list'))
+
+    def test_retrieve(self):
+        self.assertConstantQueries(11, self._url('budget-detail'))
+
+    def test_calculate(self):
+        self.assertConstantQueries(6, self._url('budget-calculate'))
+
+    def test_report(self):
+        self.assertConstantQueries(16, self._url('budget-report'), {'output': 'csv'})
+
+    def test_scenarios(self):
+        self.assertConstantQueries(4, self._url('budget-scenarios'))
+
+    def test_scenario(self):
+        self.assertConstantQueries(4, self._url('budget-scenario', name='Agresivo'))
+
+    def test_changes(self):
+        self.assertConstantQueries(6, self._url('budget-changes'))
+
+    def test_totals_cache(self):
+        self.assertConstantQueries(1, reverse('budget-totals-cache'))
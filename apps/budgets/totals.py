@@ -0,0 +1,157 @@
+"""
+Cache of budget totals with dependency tracking.
+
+Totals are cached per budget under the budget's version stamp. When they are
+computed, the work items and the materials, labor and equipment they were
+computed from are written to ``TotalsDependency``, indexed by row. A change
+to one of those rows looks up the budgets depending on it and bumps only
+their versions. Changes to a budget's own factors or work item set bump the
+budget directly, and its next computation records its new dependencies.
+
+The version stamps live in the ``versions`` cache shared by every process,
+so a bump made by one web worker or by ``runworker`` is seen by all of them.
+The totals themselves are kept in each process's default cache, where an
+entry stored under an older stamp is simply never read again.
+
+Hits, misses and invalidated budgets are counted in the default cache too,
+so the counters only cover the process that serves the request.
+"""
+from django.core.cache import cache
+from django.db import transaction
+
+from apps.databases.models import WorkItem
+from utils.versioning import bump_version, get_version, get_versions
+
+from .calculation import budget_totals
+from .models import TotalsDependency
+
+TOTALS_VERSION_NAMESPACE = 'budgets.totals'
+TOTALS_TIMEOUT = 60 * 60 * 24
+COUNTERS = ['hits', 'misses', 'invalidations']
+
+# Relation on WorkItem of each kind of priced resource
+RESOURCE_KINDS = {
+    TotalsDependency.Kind.MATERIAL: 'material',
+    TotalsDependency.Kind.LABOR: 'labor',
+    TotalsDependency.Kind.EQUIPMENT: 'equipment',
+}
+
+
+def _counter_key(name):
+    return f'budgets.totals_cache:{name}'
+
+
+def _count(name, amount=1):
+    key = _counter_key(name)
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        # Evicted between add and incr
+        cache.set(key, amount, timeout=None)
+
+
+def cache_stats():
+    """The hit, miss and invalidation counters of the totals cache."""
+    values = cache.get_many([_counter_key(name) for name in COUNTERS])
+    return {name: values.get(_counter_key(name), 0) for name in COUNTERS}
+
+
+def reset_cache_stats():
+    cache.delete_many([_counter_key(name) for name in COUNTERS])
+
+
+def dependencies(budget):
+    """``(kind, object_id)`` of every row the totals of ``budget`` are computed from."""
+    work_items = budget.work_item.filter(deleted_at__isnull=True)
+    edges = {(TotalsDependency.Kind.WORK_ITEM, pk) for pk in work_items.values_list('id', flat=True)}
+    for kind, relation in RESOURCE_KINDS.items():
+        through = getattr(WorkItem, relation).through
+        ids = through.objects.filter(workitem__in=work_items).values_list(f'{relation}_id', flat=True)
+        edges.update((kind, pk) for pk in ids.distinct())
+    return edges
+
+
+def record_dependencies(budget):
+    """
+    Brings the dependency edges of ``budget`` up to date. Only the edges that
+    changed are written, so a miss on an unchanged budget stays a read, and an
+    edge another request inserted meanwhile is skipped rather than a conflict.
+    """
+    current = dependencies(budget)
+    stored = {
+        (kind, object_id): pk
+        for pk, kind, object_id in TotalsDependency.all_objects.filter(budget=budget).values_list(
+            'id', 'kind', 'object_id')
+    }
+    stale = [pk for edge, pk in stored.items() if edge not in current]
+    if stale:
+        TotalsDependency.all_objects.filter(pk__in=stale).delete()
+    missing = current - stored.keys()
+    if missing:
+        TotalsDependency.objects.bulk_create(
+            [TotalsDependency(budget=budget, kind=kind, object_id=object_id) for kind, object_id in missing],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+
+
+def _totals_key(budget_id, version):
+    return f'budgets.totals:{budget_id}:{version}'
+
+
+def cached_budget_totals(budget):
+    """``budget_totals`` of ``budget``, computed once per version of the budget."""
+    # The version is read first, so an invalidation during the computation is never lost
+    version = get_version(TOTALS_VERSION_NAMESPACE, budget.pk)
+    key = _totals_key(budget.pk, version)
+    totals = cache.get(key)
+    if totals is not None:
+        _count('hits')
+        return totals
+
+    _count('misses')
+    record_dependencies(budget)
+    totals = budget_totals(budget)
+    cache.set(key, totals, timeout=TOTALS_TIMEOUT)
+    return totals
+
+
+def cached_totals_by_budget(budgets):
+    """``cached_budget_totals`` of every budget of ``budgets`` by id, the cached ones read at once."""
+    versions = get_versions(TOTALS_VERSION_NAMESPACE, [budget.pk for budget in budgets])
+    keys = {budget.pk: _totals_key(budget.pk, versions[budget.pk]) for budget in budgets}
+    found = cache.get_many(list(keys.values()))
+    totals = {}
+    for budget in budgets:
+        # A miss is computed, and counted, by cached_budget_totals
+        cached = found.get(keys[budget.pk])
+        totals[budget.pk] = cached if cached is not None else cached_budget_totals(budget)
+    hits = sum(key in found for key in keys.values())
+    if hits:
+        _count('hits', hits)
+    return totals
+
+
+def invalidate_budgets(budget_ids):
+    """Drops the cached totals of ``budget_ids``, now and once the change is visible to other connections."""
+    budget_ids = set(budget_ids)
+    if not budget_ids:
+        return
+
+    def bump():
+        for budget_id in budget_ids:
+            bump_version(TOTALS_VERSION_NAMESPACE, budget_id)
+
+    bump()
+    transaction.on_commit(bump)
+    _count('invalidations', len(budget_ids))
+
+
+def invalidate_dependents(kind, object_ids):
+    """
+    Drops the cached totals of the budgets computed from the ``kind`` rows
+    ``object_ids``, a list of ids or a queryset of them.
+    """
+    invalidate_budgets(TotalsDependency.objects.filter(
+        kind=kind, object_id__in=object_ids).values_list('budget_id', flat=True))
@@ -1,23 +1,70 @@
-from rest_framework import viewsets
+from django.conf import settings
+from django.db.models import Prefetch
+from django.http import FileResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 
-from apps.budgets.models import Budget
+from apps.budgets.calculation import (
+    cached_unit_cost_sums,
+    calculate_budget,
+    scenario_totals,
+)
+from apps.budgets.models import Bond, Budget, Retention
+from apps.budgets.reports import FORMATS, XLSX, report_name, stream_report
 from apps.budgets.serializers.serializers import (
     BudgetCreateSerializer,
     BudgetSerializer,
+    BudgetSummarySerializer,
+    ScenarioSerializer,
+)
+from apps.budgets.totals import cache_stats
+from apps.databases.models import WorkItem
+from apps.jobs.models import Job, job_files_storage
+from apps.jobs.queue import enqueue
+from apps.jobs.responses import job_accepted, prefers_async
+from utils.conditional import ConditionalGetMixin
+from utils.pagination import NewestFirstPagination
+from utils.prefetch import PrefetchPlan, PrefetchPlanMixin
+from utils.sync import SyncSource, collect_changes, sync_limit
+
+# Everything BudgetSerializer walks. The ``objects`` managers leave soft-deleted
+# rows out, and the units of materials come from the unit registry
+BUDGET_PLAN = PrefetchPlan(
+    select_related=['company'],
+    prefetch_related=[
+        Prefetch('bonds', queryset=Bond.objects.all()),
+        Prefetch('retentions', queryset=Retention.objects.all()),
+        Prefetch('work_item', queryset=WorkItem.objects.with_resources()),
+    ],
 )
+# Everything BudgetSummarySerializer walks
+BUDGET_SUMMARY_PLAN = PrefetchPlan(select_related=['company'])
 
 
-class BudgetViewSet(viewsets.ModelViewSet):
+class BudgetViewSet(ConditionalGetMixin, PrefetchPlanMixin, viewsets.ModelViewSet):
     """
     ViewSet for viewing and editing budgets.
     """
+    queryset = Budget.objects.all()
     serializer_class = BudgetSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = NewestFirstPagination
+    prefetch_plans = {
+        'list': BUDGET_SUMMARY_PLAN,
+        'retrieve': BUDGET_PLAN,
+        'update': BUDGET_PLAN,
+        'partial_update': BUDGET_PLAN,
+    }
 
     def get_serializer_class(self):
         if self.action == 'create':
             return BudgetCreateSerializer
+        if self.action == 'list':
+            # The work items, bonds and retentions are only served by retrieve
+            return BudgetSummarySerializer
         return self.serializer_class
 
     def get_queryset(self):
@@ -25,4 +72,99 @@ class BudgetViewSet(viewsets.ModelViewSet):
         This view should return a list of all budgets
         for the currently authenticated user.
         """
-        return Budget.objects.filter(user=self.request.user)
+        queryset = super().get_queryset().filter(user=self.request.user)
+        if self.action == 'list':
+            return queryset.with_work_item_count()
+        return queryset
+
+    @action(detail=False, methods=['get'], url_path='totals-cache')
+    def totals_cache(self, request):
+        """Hit, miss and invalidation counters of the budget totals cache in this process."""
+        return Response(cache_stats())
+
+    @action(detail=True, methods=['get'])
+    def calculate(self, request, pk=None):
+        """Unit price analysis of every work item of this budget, and the budget totals."""
+        budget = self.get_object()
+        if prefers_async(request):
+            return job_accepted(request, enqueue('budgets.calculate', {'budget_id': budget.pk}, user=request.user))
+        return Response(calculate_budget(budget))
+
+    @action(detail=True, methods=['get'])
+    def report(self, request, pk=None):
+        """
+        The budget as a spreadsheet: ``?output=xlsx`` (the default) or ``csv``.
+        Large budgets, or clients preferring it, get 202 and a job writing the
+        report; the same URL serves the file once it is ready.
+        """
+        budget = self.get_object()
+        file_format = request.query_params.get('output', XLSX)
+        if file_format not in FORMATS:
+            return Response({'output': f'Formato no soportado: {file_format}.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        filename = f'{budget.code}.{file_format}'
+
+        storage = job_files_storage()
+        name = report_name(budget, file_format)
+        if storage.exists(name):
+            return FileResponse(storage.open(name, 'rb'), as_attachment=True, filename=filename,
+                                content_type=FORMATS[file_format])
+
+        if prefers_async(request) or budget.work_item.count() > settings.BUDGET_REPORT_SYNC_LIMIT:
+            payload = {'budget_id': str(budget.pk), 'file_format': file_format}
+            job = Job.objects.filter(
+                task='budgets.report', payload=payload, status__in=[Job.Status.QUEUED, Job.Status.RUNNING],
+            ).first() or enqueue('budgets.report', payload, user=request.user)
+            return job_accepted(request, job)
+
+        response = StreamingHttpResponse(stream_report(budget, file_format), content_type=FORMATS[file_format])
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    def _scenario_data(self, budget, sums, scenario):
+        return {**ScenarioSerializer(scenario).data, 'totals': scenario_totals(budget, sums, scenario.overrides)}
+
+    @action(detail=True, methods=['get', 'post'])
+    def scenarios(self, request, pk=None):
+        """
+        The budget totals under its own factors and under each named scenario.
+        Posting a scenario saves it, replacing any other with the same name.
+        """
+        budget = self.get_object()
+        sums = cached_unit_cost_sums(budget)
+        if request.method == 'GET':
+            return Response({
+                'base': scenario_totals(budget, sums),
+                'scenarios': [self._scenario_data(budget, sums, scenario) for scenario in budget.scenarios.all()],
+            })
+
+        existing = budget.scenarios.filter(name=request.data.get('name')).first()
+        serializer = ScenarioSerializer(existing, data=request.data)
+        serializer.is_valid(raise_exception=True)
+        scenario = serializer.save(budget=budget)
+        return Response(
+            self._scenario_data(budget, sums, scenario),
+            status=status.HTTP_201_CREATED if existing is None else status.HTTP_200_OK,
+        )
+
+    @action(detail=True, methods=['get', 'delete'], url_path=r'scenarios/(?P<name>[^/]+)')
+    def scenario(self, request, name, pk=None):
+        """The budget totals under one named scenario."""
+        budget = self.get_object()
+        scenario = get_object_or_404(budget.scenarios, name=name)
+        if request.method == 'DELETE':
+            # Scenarios are not synced, so they leave no tombstone
+            budget.scenarios.filter(pk=scenario.pk).delete()
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response(self._scenario_data(budget, cached_unit_cost_sums(budget), scenario))
+
+    @action(detail=True, methods=['get'])
+    def changes(self, request, pk=None):
+        """This budget, its bonds and its retentions when changed after the ``since`` cursor."""
+        budget = self.get_object()
+        sources = [
+            SyncSource('budget', Budget.all_objects.filter(pk=budget.pk), many_to_many=('work_item',)),
+            SyncSource('bond', Bond.all_objects.filter(budget=budget)),
+            SyncSource('retention', Retention.all_objects.filter(budget=budget)),
+        ]
+        return Response(collect_changes(sources, request.query_params.get('since'), sync_limit(request)))
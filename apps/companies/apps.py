@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CompaniesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.companies'
+
+    def ready(self):
+        # pylint: disable-next=import-outside-toplevel,unused-import
+        from . import signals  # noqa: F401
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.6 on 2026-10-17 19:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0002_company_owners'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='company',
+            index=models.Index(fields=['user', 'name', 'id'], name='companies_c_user_id_018309_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-17 19:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0003_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='company',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
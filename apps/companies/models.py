@@ -52,7 +52,8 @@ class Company(BaseModel):
         ordering = ['name']
         indexes = [
             models.Index(fields=['tax_id']),
-            models.Index(fields=['name'])
+            models.Index(fields=['name']),
+            models.Index(fields=['user', 'name', 'id']),
         ]
 
     def __str__(self):
@@ -0,0 +1,12 @@
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+
+from utils.conditional import touch_many_to_many_owners
+
+from .models import Company
+
+
+@receiver(m2m_changed, sender=Company.owners.through)
+def touch_companies_on_owner_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Marks companies whose owner set changed as modified."""
+    touch_many_to_many_owners(Company, 'owners', instance, action, reverse, pk_set)
@@ -3,12 +3,15 @@ from rest_framework.permissions import IsAuthenticated
 
 from apps.companies.models import Company
 from apps.companies.serializers.serializers import CompanySerializer
+from utils.conditional import ConditionalGetMixin
+from utils.pagination import NamePagination
 
 
-class CompanyViewSet(viewsets.ModelViewSet):
+class CompanyViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """ViewSet for viewing and editing Company instances"""
     serializer_class = CompanySerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = NamePagination
 
     def get_queryset(self):
         """Filter queryset to return only user's companies"""
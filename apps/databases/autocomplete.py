@@ -0,0 +1,142 @@
+"""
+Process-local autocomplete of resource codes per ``Database``.
+
+Each index is a sorted array of lowercased codes (``Material.code``,
+``Labor.code``, ``Equipment.code``, ``WorkItem.code`` and
+``WorkItem.covening_code``) searched with ``bisect``. Indexes are built lazily
+on first use and tagged with the database's catalog version, which writers
+bump through ``bump_catalog_version``; a warm lookup only reads that stamp
+from the cache shared by every process, never the catalog tables. Indexes
+live in an LRU bounded by the total number of entries across databases.
+"""
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+
+from utils.versioning import bump_version, get_version, get_versions
+
+from .models import Equipment, Labor, Material, WorkItem
+
+CATALOG_VERSION_NAMESPACE = 'databases.catalog'
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 200
+DESCRIPTION_LENGTH = 80
+
+CODE_SOURCES = [
+    ('material', Material, 'code'),
+    ('labor', Labor, 'code'),
+    ('equipment', Equipment, 'code'),
+    ('work_item', WorkItem, 'code'),
+    ('work_item', WorkItem, 'covening_code'),
+]
+
+
+def catalog_version(database_id):
+    return get_version(CATALOG_VERSION_NAMESPACE, database_id)
+
+
+def catalog_versions(database_ids):
+    """``catalog_version`` of every database of ``database_ids``, read at once."""
+    return get_versions(CATALOG_VERSION_NAMESPACE, database_ids)
+
+
+def bump_catalog_version(database_id):
+    """
+    Marks every cached view of a database catalog as stale, now and once the
+    change is visible to other connections.
+    """
+    if database_id is None:
+        return
+
+    def bump():
+        bump_version(CATALOG_VERSION_NAMESPACE, database_id)
+
+    bump()
+    # A process rebuilding before the commit would otherwise keep the old rows under the new stamp
+    transaction.on_commit(bump)
+
+
+class CodeIndex:
+    """Sorted prefix index over the codes of one database."""
+
+    def __init__(self, entries):
+        entries.sort(key=lambda entry: entry[0])
+        self.keys = [entry[0] for entry in entries]
+        self.entries = [entry[1] for entry in entries]
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def build(cls, database_id):
+        entries = []
+        for resource_type, model, field in CODE_SOURCES:
+            rows = model.objects.filter(
+                database_id=database_id, **{f'{field}__isnull': False}
+            ).values_list(field, 'id', 'code', 'description')
+            for value, pk, code, description in rows.iterator():
+                entries.append((value.lower(), {
+                    'type': resource_type,
+                    'id': str(pk),
+                    'code': code,
+                    'description': description[:DESCRIPTION_LENGTH],
+                    'match': field,
+                }))
+        return cls(entries)
+
+    def lookup(self, prefix, resource_types=None, limit=DEFAULT_LIMIT):
+        prefix = prefix.lower()
+        results = []
+        position = bisect_left(self.keys, prefix)
+        while position < len(self.keys) and len(results) < limit:
+            if not self.keys[position].startswith(prefix):
+                break
+            entry = self.entries[position]
+            if resource_types is None or entry['type'] in resource_types:
+                results.append(entry)
+            position += 1
+        return results
+
+
+class AutocompleteRegistry:
+    """LRU of code indexes shared by the threads of one worker process."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._indexes = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, database_id):
+        version = catalog_version(database_id)
+        with self._lock:
+            cached = self._indexes.get(database_id)
+            if cached and cached[0] == version:
+                self._indexes.move_to_end(database_id)
+                return cached[1]
+
+        index = CodeIndex.build(database_id)
+        with self._lock:
+            self._discard(database_id)
+            self._indexes[database_id] = (version, index)
+            self._size += len(index)
+            while self._size > self.max_entries and len(self._indexes) > 1:
+                self._discard(next(iter(self._indexes)))
+        return index
+
+    def _discard(self, database_id):
+        cached = self._indexes.pop(database_id, None)
+        if cached:
+            self._size -= len(cached[1])
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+            self._size = 0
+
+
+registry = AutocompleteRegistry(
+    max_entries=getattr(settings, 'AUTOCOMPLETE_MAX_ENTRIES', 1_000_000))
@@ -0,0 +1,88 @@
+"""
+Bulk create-or-update of catalog resources keyed by ``(code, database)``.
+
+A request of any size costs a fixed number of queries: at most one unit registry reload, one
+set query for the submitted codes, the upsert itself through
+``bulk_create(update_conflicts=True)``, and the follow-up rollup, price
+history, search and cache maintenance for the rows that changed.
+"""
+from django.db import transaction
+
+from . import search
+from .autocomplete import bump_catalog_version
+from .importers import RESOURCE_MODELS, RowBuilder, RowError
+from .models import WorkItem, record_prices
+
+BATCH_SIZE = 1000
+
+# Fields overwritten when a code already exists in the database
+UPSERT_FIELDS = {
+    'material': ['description', 'unit', 'cost'],
+    'labor': ['description', 'hourly_cost'],
+    'equipment': ['description', 'cost', 'depreciation'],
+}
+
+
+@transaction.atomic
+def bulk_upsert(row_type, database, items):
+    """
+    Inserts or updates ``items`` of ``row_type`` in ``database``.
+
+    Returns one result per item, in the same order, with its status
+    (``created``, ``updated`` or ``error``), the row id and any errors.
+    """
+    model = RESOURCE_MODELS[row_type]
+    builder = RowBuilder(database)
+    codes = [str(item.get('code', '')).strip() for item in items if isinstance(item, dict)]
+    rows = model.all_objects.filter(database=database, code__in=codes).values_list(
+        'code', 'id', model.price_field)
+    existing = {code: row_id for code, row_id, _ in rows}
+    prices = {code: price for code, _, price in rows}
+
+    results = []
+    instances = []
+    seen = set()
+    for index, item in enumerate(items):
+        try:
+            if not isinstance(item, dict):
+                raise RowError('Each item must be an object.')
+            instance = builder.build(row_type, item)
+            code = instance.code
+            if code in seen:
+                raise RowError(f"Code '{code}' is repeated in the request.")
+        except RowError as exc:
+            results.append({'index': index, 'status': 'error', 'errors': [str(exc)]})
+            continue
+        seen.add(code)
+        instances.append(instance)
+        results.append({
+            'index': index,
+            'status': 'updated' if code in existing else 'created',
+            'id': existing.get(code, instance.id),
+        })
+
+    # Clearing deleted_at revives soft-deleted rows that share a submitted code
+    model.objects.bulk_create(
+        instances,
+        batch_size=BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['code', 'database'],
+        update_fields=[*UPSERT_FIELDS[row_type], 'updated_at', 'deleted_at'],
+    )
+
+    updated_ids = [existing[instance.code] for instance in instances if instance.code in existing]
+    for instance in instances:
+        instance.id = existing.get(instance.code, instance.id)
+    if updated_ids:
+        WorkItem.all_objects.filter(**{f'{row_type}__in': updated_ids}).recompute_rollups()
+    record_prices([
+        instance for instance in instances
+        if instance.code not in prices or prices[instance.code] != instance.price
+    ])
+    search.get_backend().index(instances)
+    bump_catalog_version(database.pk)
+
+    for result in results:
+        if 'id' in result:
+            result['id'] = str(result['id'])
+    return results
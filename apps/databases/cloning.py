@@ -0,0 +1,173 @@
+"""
+Server-side cloning of a ``Database`` with all of its resources.
+
+Each table is copied with a fixed number of statements inside one
+transaction: rows are read in their raw database representation, given
+fresh UUIDs and written back with ``executemany``, skipping model
+instantiation and per-value field preparation. The work item through rows
+and price history rows are then rebuilt with the remapped ids. Stored cost
+rollups are copied as is since prices do not change.
+"""
+import time
+import uuid
+
+from django.db import connection, transaction
+from django.utils.timezone import now
+
+from . import search
+from .models import Database, Equipment, Labor, Material, WorkItem
+
+BATCH_SIZE = 2000
+
+# Copied fields per model, besides the primary key, timestamps and the database
+CLONED_FIELDS = {
+    Material: ['code', 'description', 'unit', 'cost'],
+    Labor: ['code', 'description', 'hourly_cost'],
+    Equipment: ['code', 'description', 'cost', 'depreciation'],
+    WorkItem: [
+        'code', 'description', 'unit', 'yield_rate', 'covening_code', 'material_unit_usage',
+        'labor_cost', 'equipment_cost', 'material_cost', 'total_cost',
+    ],
+}
+RELATIONS = {
+    'material': Material,
+    'labor': Labor,
+    'equipment': Equipment,
+}
+
+
+def _column(model, name):
+    return connection.ops.quote_name(model._meta.get_field(name).column)
+
+
+def _prep(model, name, value):
+    return model._meta.get_field(name).get_db_prep_value(value, connection)
+
+
+def _executemany(cursor, table, columns, rows):
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        connection.ops.quote_name(table),
+        ', '.join(columns),
+        ', '.join(['%s'] * len(columns)),
+    )
+    for start in range(0, len(rows), BATCH_SIZE):
+        cursor.executemany(sql, rows[start:start + BATCH_SIZE])
+
+
+def _copy_rows(cursor, model, source, target, report):
+    started = time.perf_counter()
+    fields = CLONED_FIELDS[model]
+    columns = [_column(model, name) for name in fields]
+    cursor.execute(
+        'SELECT {}, {} FROM {} WHERE {} = %s AND {} IS NULL'.format(
+            _column(model, 'id'),
+            ', '.join(columns),
+            connection.ops.quote_name(model._meta.db_table),
+            _column(model, 'database'),
+            _column(model, 'deleted_at'),
+        ),
+        [_prep(model, 'id', source.pk)],
+    )
+    timestamp = _prep(model, 'created_at', now())
+    database_id = _prep(model, 'id', target.pk)
+
+    id_map = {}
+    rows = []
+    for old_id, *values in cursor.fetchall():
+        new_id = _prep(model, 'id', uuid.uuid4())
+        id_map[old_id] = new_id
+        rows.append((new_id, timestamp, timestamp, database_id, *values))
+
+    _executemany(
+        cursor,
+        model._meta.db_table,
+        [_column(model, name) for name in ('id', 'created_at', 'updated_at', 'database')] + columns,
+        rows,
+    )
+    report[model._meta.model_name] = {
+        'rows': len(rows),
+        'seconds': round(time.perf_counter() - started, 4),
+    }
+    return id_map
+
+
+def _copy_links(cursor, relation, source, work_item_map, resource_map, report):
+    started = time.perf_counter()
+    through = getattr(WorkItem, relation).through
+    # Deleted resources are not copied, so their links are left out too
+    links = through.objects.filter(**{
+        'workitem__database': source,
+        'workitem__deleted_at__isnull': True,
+        f'{relation}__deleted_at__isnull': True,
+    }).values_list('workitem_id', f'{relation}_id')
+    sql, params = links.query.sql_with_params()
+    cursor.execute(sql, params)
+    rows = [
+        # Resources shared from other databases keep pointing at the original
+        (work_item_map[work_item_id], resource_map.get(resource_id, resource_id))
+        for work_item_id, resource_id in cursor.fetchall()
+    ]
+    _executemany(
+        cursor,
+        through._meta.db_table,
+        [_column(through, 'workitem'), _column(through, relation)],
+        rows,
+    )
+    report[f'workitem_{relation}'] = {
+        'rows': len(rows),
+        'seconds': round(time.perf_counter() - started, 4),
+    }
+
+
+def _copy_history(cursor, model, source, resource_map, report):
+    started = time.perf_counter()
+    history = model.price_history_model()
+    entries = history.objects.filter(
+        resource__database=source, resource__deleted_at__isnull=True
+    ).values_list('resource_id', 'price', 'valid_from')
+    sql, params = entries.query.sql_with_params()
+    cursor.execute(sql, params)
+    timestamp = _prep(history, 'created_at', now())
+    rows = [
+        (_prep(history, 'id', uuid.uuid4()), timestamp, timestamp, resource_map[resource_id], price, valid_from)
+        for resource_id, price, valid_from in cursor.fetchall()
+    ]
+    _executemany(
+        cursor,
+        history._meta.db_table,
+        [_column(history, name) for name in ('id', 'created_at', 'updated_at', 'resource', 'price', 'valid_from')],
+        rows,
+    )
+    report[history._meta.model_name] = {
+        'rows': len(rows),
+        'seconds': round(time.perf_counter() - started, 4),
+    }
+
+
+@transaction.atomic
+def clone_database(source, **database_fields):
+    """
+    Creates a new ``Database`` from ``database_fields`` holding a copy of every
+    resource and work item of ``source``. Returns the clone and a timing report.
+    """
+    started = time.perf_counter()
+    report = {}
+    target = Database.objects.create(**database_fields)
+
+    with connection.cursor() as cursor:
+        resource_maps = {
+            relation: _copy_rows(cursor, model, source, target, report)
+            for relation, model in RELATIONS.items()
+        }
+        for relation, model in RELATIONS.items():
+            _copy_history(cursor, model, source, resource_maps[relation], report)
+        work_item_map = _copy_rows(cursor, WorkItem, source, target, report)
+        for relation in RELATIONS:
+            _copy_links(cursor, relation, source, work_item_map, resource_maps[relation], report)
+
+    started_index = time.perf_counter()
+    search.get_backend().reindex_database(target)
+    report['search_index'] = {'seconds': round(time.perf_counter() - started_index, 4)}
+
+    report['total_seconds'] = round(time.perf_counter() - started, 4)
+    return target, report
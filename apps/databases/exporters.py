@@ -0,0 +1,161 @@
+"""
+Streaming export of a full ``Database`` catalog.
+
+Rows are produced with the same columns the importer reads, so an export can
+be loaded back with ``import_catalog``. Every table is read with a server-side
+``iterator()`` and the encoded output is flushed in small blocks, optionally
+gzip-compressed on the fly, so memory stays flat regardless of catalog size.
+"""
+import csv
+import io
+import json
+import zlib
+from collections import defaultdict
+from itertools import islice
+
+from django.db.models import F
+
+from .importers import CODE_SEPARATOR, CSV, NDJSON, RESOURCE_MODELS
+from .models import Equipment, Labor, Material, WorkItem
+
+DEFAULT_CHUNK_SIZE = 2000
+FLUSH_SIZE = 64 * 1024
+
+COLUMNS = [
+    'type', 'code', 'description', 'unit', 'cost', 'hourly_cost', 'depreciation',
+    'yield_rate', 'covening_code', 'material_unit_usage', 'material', 'labor', 'equipment',
+]
+
+
+def _resource_rows(database, chunk_size):
+    materials = Material.objects.filter(database=database).order_by('code').values(
+        'code', 'description', 'cost', unit_symbol=F('unit__symbol'))
+    for row in materials.iterator(chunk_size=chunk_size):
+        yield {
+            'type': 'material',
+            'code': row['code'],
+            'description': row['description'],
+            'unit': row['unit_symbol'],
+            'cost': str(row['cost']),
+        }
+
+    labor = Labor.objects.filter(database=database).order_by('code').values(
+        'code', 'description', 'hourly_cost')
+    for row in labor.iterator(chunk_size=chunk_size):
+        yield {'type': 'labor', **row, 'hourly_cost': str(row['hourly_cost'])}
+
+    equipment = Equipment.objects.filter(database=database).order_by('code').values(
+        'code', 'description', 'cost', 'depreciation')
+    for row in equipment.iterator(chunk_size=chunk_size):
+        yield {
+            'type': 'equipment',
+            **row,
+            'cost': str(row['cost']),
+            'depreciation': str(row['depreciation']),
+        }
+
+
+def _compositions(work_item_ids):
+    """Maps every work item id to the codes of its resources, one query per relation."""
+    compositions = defaultdict(lambda: {relation: [] for relation in RESOURCE_MODELS})
+    for relation, model in RESOURCE_MODELS.items():
+        links = model.objects.filter(workitem__in=work_item_ids).order_by('code').values_list(
+            'workitem', 'code')
+        for work_item_id, code in links:
+            compositions[work_item_id][relation].append(code)
+    return compositions
+
+
+def _work_item_rows(database, chunk_size):
+    work_items = WorkItem.objects.filter(database=database).order_by('code').values(
+        'id', 'code', 'description', 'unit', 'yield_rate', 'covening_code', 'material_unit_usage')
+    rows = work_items.iterator(chunk_size=chunk_size)
+    while True:
+        batch = list(islice(rows, chunk_size))
+        if not batch:
+            return
+        compositions = _compositions([row['id'] for row in batch])
+        for row in batch:
+            work_item_id = row.pop('id')
+            yield {
+                'type': 'work_item',
+                **row,
+                'yield_rate': str(row['yield_rate']),
+                **compositions[work_item_id],
+            }
+
+
+def iter_catalog_rows(database, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yields every resource and work item of ``database`` as an import-compatible dict."""
+    yield from _resource_rows(database, chunk_size)
+    yield from _work_item_rows(database, chunk_size)
+
+
+def _encode_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=COLUMNS, extrasaction='ignore')
+    writer.writeheader()
+    for row in rows:
+        writer.writerow({
+            key: CODE_SEPARATOR.join(value) if isinstance(value, list) else value
+            for key, value in row.items()
+        })
+        if buffer.tell() >= FLUSH_SIZE:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def _encode_ndjson(rows):
+    block = []
+    size = 0
+    for row in rows:
+        line = json.dumps(row, ensure_ascii=False) + '\n'
+        block.append(line)
+        size += len(line)
+        if size >= FLUSH_SIZE:
+            yield ''.join(block).encode()
+            block = []
+            size = 0
+    yield ''.join(block).encode()
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def accepts_gzip(accept_encoding):
+    """
+    Whether an ``Accept-Encoding`` header value allows gzip: named, or covered
+    by ``*``, with a q-value above zero. ``gzip;q=0`` refuses it.
+    """
+    qualities = {}
+    for item in accept_encoding.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            qualities[coding.lower()] = quality
+    for coding in ('gzip', 'x-gzip', '*'):
+        if coding in qualities:
+            return qualities[coding] > 0
+    return False
+
+
+def stream_catalog(database, file_format=CSV, compress=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yields the encoded catalog of ``database`` as byte blocks."""
+    encoders = {CSV: _encode_csv, NDJSON: _encode_ndjson}
+    chunks = encoders[file_format](iter_catalog_rows(database, chunk_size))
+    return _gzip(chunks) if compress else chunks
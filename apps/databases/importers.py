@@ -0,0 +1,327 @@
+"""
+Streaming bulk importer for construction price catalogs.
+
+Rows are read lazily from CSV or JSON-lines files and written in chunks:
+every chunk is validated against in-memory code and unit lookups built once
+per import, then inserted with ``bulk_create`` (including the work item
+through tables) inside its own transaction.
+
+Every row carries a ``type`` column (``material``, ``labor``, ``equipment``
+or ``work_item``) plus the model fields. Materials reference their unit by
+id, symbol or name; work items list the codes of their resources in the
+``material``, ``labor`` and ``equipment`` columns, separated by ``|`` in CSV
+files or as arrays in JSON-lines files. Resources must appear before the
+work items that use them.
+"""
+import csv
+import io
+import json
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+
+from . import search
+from .autocomplete import bump_catalog_version
+from .models import Equipment, Labor, Material, WorkItem, record_prices
+from .units import registry as unit_registry
+
+CSV = 'csv'
+NDJSON = 'ndjson'
+FORMATS = (CSV, NDJSON)
+
+DEFAULT_CHUNK_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+CODE_SEPARATOR = '|'
+
+RESOURCE_MODELS = {
+    'material': Material,
+    'labor': Labor,
+    'equipment': Equipment,
+}
+ROW_TYPES = (*RESOURCE_MODELS, 'work_item')
+
+
+class RowError(ValueError):
+    """Raised when a catalog row cannot be imported."""
+
+
+class ImportResult:
+    """Counters describing the outcome of an import."""
+
+    def __init__(self):
+        self.created = dict.fromkeys(ROW_TYPES, 0)
+        self.links = 0
+        self.rejected = 0
+        self.errors = []
+        self.elapsed = 0.0
+
+    @property
+    def rows(self):
+        return sum(self.created.values()) + self.rejected
+
+    @property
+    def rows_per_second(self):
+        return round(self.rows / self.elapsed) if self.elapsed else 0
+
+    def reject(self, line, reason):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'error': str(reason)})
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'links': self.links,
+            'rows': self.rows,
+            'rejected': self.rejected,
+            'errors': self.errors,
+            'elapsed_seconds': round(self.elapsed, 3),
+            'rows_per_second': self.rows_per_second,
+        }
+
+
+def detect_format(filename, default=CSV):
+    """Guesses the file format from its extension."""
+    name = (filename or '').lower()
+    if name.endswith(('.ndjson', '.jsonl', '.json')):
+        return NDJSON
+    if name.endswith('.csv'):
+        return CSV
+    return default
+
+
+def _text_lines(stream, invalid_lines):
+    """
+    Lines of a binary or text stream as text. Lines of a binary stream that
+    are not UTF-8 are decoded with replacement characters, and their numbers
+    added to ``invalid_lines``.
+    """
+    if not (isinstance(stream, (io.RawIOBase, io.BufferedIOBase)) or 'b' in getattr(stream, 'mode', '')):
+        yield from stream
+        return
+    for line_number, line in enumerate(stream, start=1):
+        try:
+            yield line.decode('utf-8-sig' if line_number == 1 else 'utf-8')
+        except UnicodeDecodeError:
+            invalid_lines.add(line_number)
+            yield line.decode('utf-8', errors='replace')
+
+
+def iter_rows(stream, file_format):
+    """Yields ``(line_number, row)`` pairs from a binary or text stream."""
+    if file_format not in FORMATS:
+        raise ValueError(f'Unsupported format: {file_format}')
+    invalid_lines = set()
+    lines = _text_lines(stream, invalid_lines)
+
+    if file_format == CSV:
+        reader = csv.DictReader(lines)
+        first_line = 1
+        for row in reader:
+            # A quoted field may span several lines
+            if any(first_line <= number <= reader.line_num for number in invalid_lines):
+                row = RowError('Invalid UTF-8 text.')
+            first_line = reader.line_num + 1
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            if line_number in invalid_lines:
+                yield line_number, RowError('Invalid UTF-8 text.')
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as exc:
+                yield line_number, RowError(f'Invalid JSON: {exc.msg}')
+                continue
+            if not isinstance(row, dict):
+                row = RowError('Each line must be a JSON object.')
+            yield line_number, row
+
+
+def _decimal(row, field, positive=True):
+    value = row.get(field)
+    try:
+        number = Decimal(str(value).strip())
+    except (InvalidOperation, TypeError, ValueError) as exc:
+        raise RowError(f"'{field}' must be a number.") from exc
+    if positive and number <= 0:
+        raise RowError(f"'{field}' must be greater than zero.")
+    return number
+
+
+def _text(row, field, required=True):
+    value = row.get(field)
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        raise RowError(f"'{field}' is required.")
+    return value
+
+
+def _codes(row, field):
+    value = row.get(field) or []
+    if isinstance(value, str):
+        value = value.split(CODE_SEPARATOR)
+    return [str(code).strip() for code in value if str(code).strip()]
+
+
+class RowBuilder:
+    """
+    Validates catalog rows and turns them into unsaved model instances.
+
+    Units are resolved by id, symbol or name through the unit registry, so
+    building a row never queries the database.
+    """
+
+    def __init__(self, database):
+        self.database = database
+
+    def build(self, row_type, row):
+        return getattr(self, f'build_{row_type}')(row)
+
+    def build_material(self, row):
+        unit = _text(row, 'unit_id', required=False) or _text(row, 'unit')
+        unit_instance = unit_registry.lookup(unit)
+        if unit_instance is None:
+            raise RowError(f"Unit '{unit}' does not exist.")
+        return Material(
+            code=_text(row, 'code'),
+            description=_text(row, 'description'),
+            unit_id=unit_instance.pk,
+            cost=_decimal(row, 'cost'),
+            database=self.database,
+        )
+
+    def build_labor(self, row):
+        return Labor(
+            code=_text(row, 'code'),
+            description=_text(row, 'description'),
+            hourly_cost=_decimal(row, 'hourly_cost'),
+            database=self.database,
+        )
+
+    def build_equipment(self, row):
+        return Equipment(
+            code=_text(row, 'code'),
+            description=_text(row, 'description'),
+            cost=_decimal(row, 'cost'),
+            depreciation=_decimal(row, 'depreciation'),
+            database=self.database,
+        )
+
+    def build_work_item(self, row):
+        usage = _text(row, 'material_unit_usage', required=False) or 'UNITARY'
+        if usage not in dict(WorkItem.MATERIAL_USAGE_CALCULATION_CHOICES):
+            raise RowError(f"Invalid material_unit_usage '{usage}'.")
+        return WorkItem(
+            code=_text(row, 'code'),
+            description=_text(row, 'description'),
+            unit=_text(row, 'unit'),
+            yield_rate=_decimal(row, 'yield_rate'),
+            covening_code=_text(row, 'covening_code', required=False) or None,
+            material_unit_usage=usage,
+            database=self.database,
+        )
+
+
+class CatalogImporter:
+    """
+    Imports catalog rows into a ``Database``.
+
+    Existing codes and units are loaded once, so validating a row never
+    queries the database; rows reusing a code already present are rejected.
+    """
+
+    def __init__(self, database, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.database = database
+        self.chunk_size = chunk_size
+        self.builder = RowBuilder(database)
+        self.codes = {
+            row_type: dict(model.all_objects.filter(database=database).values_list('code', 'id'))
+            for row_type, model in {**RESOURCE_MODELS, 'work_item': WorkItem}.items()
+        }
+
+    def run(self, rows):
+        """Imports an iterable of ``(line_number, row)`` pairs."""
+        result = ImportResult()
+        started = time.perf_counter()
+        rows = iter(rows)
+        with unit_registry.pinned():
+            while True:
+                chunk = list(islice(rows, self.chunk_size))
+                if not chunk:
+                    break
+                self._import_chunk(chunk, result)
+        result.elapsed = time.perf_counter() - started
+        return result
+
+    def _import_chunk(self, chunk, result):
+        pending = {row_type: [] for row_type in ROW_TYPES}
+        links = []
+        for line, row in chunk:
+            try:
+                if isinstance(row, Exception):
+                    raise row
+                row_type = _text(row, 'type').lower()
+                if row_type not in pending:
+                    raise RowError(f"Unknown type '{row_type}'.")
+                code = _text(row, 'code')
+                if code in self.codes[row_type]:
+                    raise RowError(f"Code '{code}' already exists in the database.")
+                instance = self.builder.build(row_type, row)
+                if row_type == 'work_item':
+                    links.append((instance, self._resolve_links(row)))
+            except RowError as exc:
+                result.reject(line, exc)
+                continue
+            self.codes[row_type][code] = instance.id
+            pending[row_type].append(instance)
+
+        search_backend = search.get_backend()
+        with transaction.atomic():
+            for row_type, instances in pending.items():
+                model = WorkItem if row_type == 'work_item' else RESOURCE_MODELS[row_type]
+                model.objects.bulk_create(instances, batch_size=self.chunk_size)
+                if row_type in RESOURCE_MODELS:
+                    record_prices(instances)
+                search_backend.index(instances)
+                result.created[row_type] += len(instances)
+            result.links += self._create_links(links)
+            if pending['work_item']:
+                WorkItem.objects.filter(
+                    pk__in=[item.pk for item in pending['work_item']]
+                ).recompute_rollups()
+        bump_catalog_version(self.database.pk)
+
+    def _resolve_links(self, row):
+        resolved = {}
+        for relation in RESOURCE_MODELS:
+            codes = self.codes[relation]
+            missing = [code for code in _codes(row, relation) if code not in codes]
+            if missing:
+                raise RowError(f"Unknown {relation} codes: {', '.join(missing)}.")
+            resolved[relation] = {codes[code] for code in _codes(row, relation)}
+        return resolved
+
+    def _create_links(self, links):
+        created = 0
+        for relation in RESOURCE_MODELS:
+            through = getattr(WorkItem, relation).through
+            column = f'{relation}_id'
+            rows = [
+                through(workitem_id=work_item.id, **{column: resource_id})
+                for work_item, resolved in links
+                for resource_id in resolved[relation]
+            ]
+            through.objects.bulk_create(rows, batch_size=self.chunk_size)
+            created += len(rows)
+        return created
+
+
+def import_catalog(database, stream, file_format=CSV, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Imports a CSV or JSON-lines catalog file into ``database``."""
+    importer = CatalogImporter(database, chunk_size=chunk_size)
+    return importer.run(iter_rows(stream, file_format))
@@ -0,0 +1,123 @@
+import json
+import uuid
+from importlib import import_module
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import FieldError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from utils.pagination import KeysetPagination
+from utils.query_plans import audit_queryset
+
+# Fixed stand-ins keep the SQL, and so the report, identical between runs
+PLACEHOLDER_ID = uuid.UUID(int=0)
+PLACEHOLDER_VALUES = {
+    'UUIDField': str(PLACEHOLDER_ID),
+    'DateTimeField': '2000-01-01T00:00:00+00:00',
+    'DateField': '2000-01-01',
+}
+AS_OF_PARAMS = {'as_of': '2000-01-01'}
+
+
+class Command(BaseCommand):
+    help = (
+        'Explains the list, next page and detail querysets of every viewset '
+        'registered in the apps routers, flagging full scans and sorts.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            help='File receiving the JSON report. Defaults to standard output.',
+        )
+        parser.add_argument(
+            '--strict',
+            action='store_true',
+            help='Fail when any queryset has findings.',
+        )
+
+    def handle(self, *args, **options):
+        # Never saved: querysets only need its key to scope rows to a user
+        self.user = get_user_model()(pk=PLACEHOLDER_ID)
+        self.factory = APIRequestFactory()
+
+        entries = []
+        for basename, view_class in self._viewsets():
+            variants = [{}, AS_OF_PARAMS] if hasattr(view_class, 'get_as_of') else [{}]
+            for params in variants:
+                for action in ('list', 'list:next', 'retrieve'):
+                    entry = self._audit(view_class, action, params)
+                    if entry is not None:
+                        entries.append({'basename': basename, 'action': action, 'params': params, **entry})
+
+        report = json.dumps({'vendor': connection.vendor, 'entries': entries}, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                stream.write(report + '\n')
+        else:
+            self.stdout.write(report)
+
+        flagged = [entry for entry in entries if entry.get('findings') or entry.get('error')]
+        for entry in flagged:
+            kinds = ', '.join(sorted({finding['kind'] for finding in entry.get('findings', [])}))
+            self.stderr.write(f"{entry['basename']} {entry['action']} {entry['params']}: "
+                              f"{entry.get('error') or kinds}")
+        if flagged and options['strict']:
+            raise CommandError(f'{len(flagged)} of {len(entries)} querysets have findings.')
+        self.stderr.write(f'Explained {len(entries)} querysets, {len(flagged)} with findings.')
+
+    @staticmethod
+    def _viewsets():
+        for app_config in apps.get_app_configs():
+            if not app_config.name.startswith('apps.'):
+                continue
+            try:
+                urls = import_module(f'{app_config.name}.urls')
+            except ModuleNotFoundError as exc:
+                if exc.name != f'{app_config.name}.urls':
+                    raise
+                continue
+            router = getattr(urls, 'router', None)
+            if router is None:
+                continue
+            for _prefix, view_class, basename in router.registry:
+                yield basename or router.get_default_basename(view_class), view_class
+
+    def _audit(self, view_class, action, params):
+        request = Request(self.factory.get('/', params))
+        request.user = self.user
+        view = view_class(action=action.split(':')[0], request=request, args=(), kwargs={}, format_kwarg=None)
+        try:
+            queryset = view.filter_queryset(view.get_queryset())
+            if action == 'retrieve':
+                queryset = queryset.filter(**{view.lookup_field: PLACEHOLDER_ID})
+            else:
+                queryset = self._page(view, queryset, action == 'list:next')
+                if queryset is None:
+                    return None
+            return audit_queryset(queryset)
+        except (APIException, DatabaseError, FieldError, TypeError, ValueError) as exc:
+            return {'error': f'{type(exc).__name__}: {exc}'}
+
+    @staticmethod
+    def _page(view, queryset, next_page):
+        """The first page of ``queryset``, or the one after a placeholder cursor."""
+        paginator = view.paginator
+        if not isinstance(paginator, KeysetPagination):
+            return None if next_page else queryset
+        ordering = paginator.get_ordering(view.request, queryset, view)
+        queryset = queryset.order_by(*ordering)
+        if next_page:
+            meta = queryset.model._meta
+            position = [
+                PLACEHOLDER_VALUES.get(meta.get_field(order.lstrip('-')).get_internal_type(), '')
+                for order in ordering
+            ]
+            queryset = queryset.filter(paginator._seek(ordering, position))
+        return queryset[:settings.PAGE_SIZE + 1]
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.databases.importers import (
+    DEFAULT_CHUNK_SIZE,
+    FORMATS,
+    detect_format,
+    import_catalog,
+)
+from apps.databases.models import Database
+
+
+class Command(BaseCommand):
+    help = 'Imports a CSV or JSON-lines price catalog into a database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Catalog file to import.')
+        parser.add_argument(
+            '--database',
+            required=True,
+            help='Code of the database receiving the catalog.',
+        )
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='File format. Guessed from the extension when omitted.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help='Rows validated and written per transaction.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            database = Database.objects.get(code=options['database'])
+        except Database.DoesNotExist as exc:
+            raise CommandError(
+                f"Database '{options['database']}' does not exist.") from exc
+
+        file_format = options['format'] or detect_format(options['path'])
+        # Read as bytes, so lines that are not UTF-8 are reported as row errors
+        with open(options['path'], 'rb') as stream:
+            result = import_catalog(
+                database, stream, file_format, chunk_size=options['chunk_size'])
+
+        for error in result.errors:
+            self.stderr.write(f"Line {error['line']}: {error['error']}")
+        created = ', '.join(f'{count} {row_type}' for row_type, count in result.created.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {created} and {result.links} links in {result.elapsed:.2f}s '
+            f'({result.rows_per_second} rows/s); {result.rejected} rows rejected.'
+        ))
@@ -0,0 +1,67 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.databases.models import Database, WorkItem
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds and verifies the stored cost rollups of work items.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database',
+            help='Code of the database to process. Defaults to every database.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Number of work items rewritten per UPDATE statement.',
+        )
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report drifted work items, without rewriting them.',
+        )
+
+    def handle(self, *args, **options):
+        work_items = WorkItem.all_objects.all()
+        if options['database']:
+            try:
+                database = Database.all_objects.get(code=options['database'])
+            except Database.DoesNotExist as exc:
+                raise CommandError(
+                    f"Database '{options['database']}' does not exist.") from exc
+            work_items = work_items.filter(database=database)
+
+        if not options['check']:
+            self._rebuild(work_items, options['batch_size'])
+
+        drifted = self._report_drift(work_items)
+        if drifted:
+            raise CommandError(f'{drifted} work items have drifted rollups.')
+        self.stdout.write(self.style.SUCCESS('All work item rollups are consistent.'))
+
+    def _rebuild(self, work_items, batch_size):
+        started = time.perf_counter()
+        ids = work_items.order_by('pk').values_list('pk', flat=True)
+        updated = 0
+        batch = list(ids[:batch_size])
+        while batch:
+            updated += WorkItem.all_objects.filter(pk__in=batch).recompute_rollups()
+            batch = list(ids.filter(pk__gt=batch[-1])[:batch_size])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'Recomputed {updated} work items in {elapsed:.2f}s.')
+
+    def _report_drift(self, work_items):
+        drifted = 0
+        rows = work_items.with_rollup_drift().values(
+            'id', 'code', 'total_cost', 'cost_total')
+        for row in rows.iterator():
+            drifted += 1
+            self.stderr.write(
+                f"{row['code']} ({row['id']}): stored {row['total_cost']}, "
+                f"computed {row['cost_total']}"
+            )
+        return drifted
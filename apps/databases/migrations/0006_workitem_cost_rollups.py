@@ -0,0 +1,63 @@
+# Generated by Django 5.1.6 on 2026-10-17 19:05
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_rollups(apps, schema_editor):
+    WorkItem = apps.get_model('databases', 'WorkItem')
+
+    def cost(model_name, field):
+        model = apps.get_model('databases', model_name)
+        total = model.objects.filter(
+            workitem=models.OuterRef('pk'), deleted_at__isnull=True
+        ).values('workitem').annotate(total=models.Sum(field)).values('total')
+        return Coalesce(
+            models.Subquery(total),
+            models.Value(Decimal('0.00')),
+            output_field=models.DecimalField(max_digits=12, decimal_places=2)
+        )
+
+    WorkItem.objects.update(
+        labor_cost=cost('Labor', 'hourly_cost'),
+        equipment_cost=cost('Equipment', 'cost'),
+        material_cost=cost('Material', 'cost'),
+        total_cost=(
+            cost('Labor', 'hourly_cost') +
+            cost('Equipment', 'cost') +
+            cost('Material', 'cost')
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('databases', '0005_alter_database_user_alter_material_database'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workitem',
+            name='equipment_cost',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='workitem',
+            name='labor_cost',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='workitem',
+            name='material_cost',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='workitem',
+            name='total_cost',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=12),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,67 @@
+from django.db import migrations
+
+SEARCH_TABLE = 'databases_search'
+
+SEARCH_MODELS = {
+    'material': 'Material',
+    'labor': 'Labor',
+    'equipment': 'Equipment',
+    'work_item': 'WorkItem',
+}
+
+
+def search_rowid(resource_id):
+    return resource_id.int >> 68
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"""
+            CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5(
+                code,
+                description,
+                resource_type UNINDEXED,
+                resource_id UNINDEXED,
+                database_id UNINDEXED,
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3'
+            )
+        """)
+        # Matches on the code weigh ten times more than matches on the description
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}, rank) VALUES ('rank', 'bm25(10.0, 1.0)')")
+        for resource_type, model_name in SEARCH_MODELS.items():
+            model = apps.get_model('databases', model_name)
+            rows = [
+                (search_rowid(pk), code, description, resource_type, pk.hex,
+                 database_id.hex if database_id else None)
+                for pk, code, description, database_id in model.objects.filter(
+                    deleted_at__isnull=True
+                ).values_list('id', 'code', 'description', 'database_id').iterator()
+            ]
+            cursor.executemany(
+                f'INSERT INTO {SEARCH_TABLE} '
+                '(rowid, code, description, resource_type, resource_id, database_id) '
+                'VALUES (%s, %s, %s, %s, %s, %s)',
+                rows,
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('databases', '0006_workitem_cost_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
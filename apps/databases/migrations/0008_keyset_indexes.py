@@ -0,0 +1,39 @@
+# Generated by Django 5.1.6 on 2026-10-17 19:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('databases', '0007_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='database',
+            index=models.Index(fields=['code', 'id'], name='databases_d_code_8e6431_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='equipment',
+            index=models.Index(fields=['code', 'id'], name='databases_e_code_da8c03_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='labor',
+            index=models.Index(fields=['code', 'id'], name='databases_l_code_c219b0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='material',
+            index=models.Index(fields=['code', 'id'], name='databases_m_code_560037_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='unit',
+            index=models.Index(fields=['name', 'id'], name='databases_u_name_ee421c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workitem',
+            index=models.Index(fields=['code', 'id'], name='databases_w_code_9f617e_idx'),
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.1.6 on 2026-10-17 19:23
+
+import uuid
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+# Resource model, its price field and the history model recording it
+PRICED_MODELS = [
+    ('Material', 'cost', 'MaterialPrice'),
+    ('Labor', 'hourly_cost', 'LaborPrice'),
+    ('Equipment', 'cost', 'EquipmentPrice'),
+]
+
+
+def backfill_prices(apps, schema_editor):
+    """Seeds every history with the current price, valid since the last update."""
+    for model_name, price_field, history_name in PRICED_MODELS:
+        model = apps.get_model('databases', model_name)
+        history = apps.get_model('databases', history_name)
+        rows = model.objects.filter(deleted_at__isnull=True).values_list('id', price_field, 'updated_at')
+        history.objects.bulk_create(
+            (
+                history(resource_id=resource_id, price=price, valid_from=updated_at)
+                for resource_id, price, updated_at in rows.iterator(chunk_size=2000)
+            ),
+            batch_size=2000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('databases', '0008_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EquipmentPrice',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('deleted_at', models.DateTimeField(blank=True, null=True)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('valid_from', models.DateTimeField(default=django.utils.timezone.now)),
+                ('resource', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='databases.equipment')),
+            ],
+            options={
+                'ordering': ['-valid_from'],
+                'abstract': False,
+                'indexes': [models.Index(fields=['resource', 'valid_from'], name='equipmentprice_valid_from_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LaborPrice',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('deleted_at', models.DateTimeField(blank=True, null=True)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('valid_from', models.DateTimeField(default=django.utils.timezone.now)),
+                ('resource', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='databases.labor')),
+            ],
+            options={
+                'ordering': ['-valid_from'],
+                'abstract': False,
+                'indexes': [models.Index(fields=['resource', 'valid_from'], name='laborprice_valid_from_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MaterialPrice',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('deleted_at', models.DateTimeField(blank=True, null=True)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('valid_from', models.DateTimeField(default=django.utils.timezone.now)),
+                ('resource', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='databases.material')),
+            ],
+            options={
+                'ordering': ['-valid_from'],
+                'abstract': False,
+                'indexes': [models.Index(fields=['resource', 'valid_from'], name='materialprice_valid_from_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_prices, migrations.RunPython.noop),
+    ]
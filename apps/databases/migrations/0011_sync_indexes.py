@@ -0,0 +1,29 @@
+# Generated by Django 5.1.6 on 2026-10-17 19:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('databases', '0010_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='equipment',
+            index=models.Index(fields=['database', 'updated_at', 'id'], name='databases_e_databas_84786b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='labor',
+            index=models.Index(fields=['database', 'updated_at', 'id'], name='databases_l_databas_e61dd8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='material',
+            index=models.Index(fields=['database', 'updated_at', 'id'], name='databases_m_databas_36c11a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workitem',
+            index=models.Index(fields=['database', 'updated_at', 'id'], name='databases_w_databas_47645c_idx'),
+        ),
+    ]
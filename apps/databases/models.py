@@ -1,8 +1,18 @@
 # Create your models here.
+from collections import defaultdict
+from decimal import Decimal
+
 from django.conf import settings
 from django.db import models
+from django.db.models.functions import Coalesce
+from django.dispatch import Signal
+from django.utils.timezone import now
+
+from utils.models import BaseModel, SoftDeleteManager
 
-from utils.models import BaseModel
+# Sent with the work item queryset whose cost rollups were rewritten, from
+# single saves and bulk writes alike, so it reports every price change
+rollups_recomputed = Signal()
 
 
 class Unit(BaseModel):
@@ -16,6 +26,9 @@ class Unit(BaseModel):
     class Meta:
         verbose_name = "Unit"
         verbose_name_plural = "Units"
+        indexes = [
+            models.Index(fields=['name', 'id']),
+        ]
 
 
 class Database(BaseModel):
@@ -38,9 +51,86 @@ class Database(BaseModel):
         verbose_name = "Database"
         verbose_name_plural = "Databases"
         ordering = ['code']
+        indexes = [
+            models.Index(fields=['code', 'id']),
+        ]
+
+
+class PriceTrackingMixin:
+    """
+    Remembers the price and deletion state a resource was loaded with so
+    signal handlers can tell whether a save changed what work items cost.
+    """
+    price_field = 'cost'
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.snapshot_price()
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.snapshot_price()
+
+    def snapshot_price(self):
+        """Records the current price state as the persisted one."""
+        self._loaded_price_state = self._price_state()
+
+    def _price_state(self):
+        return self.__dict__.get(self.price_field), self.__dict__.get('deleted_at')
+
+    @property
+    def price(self):
+        """Price of the resource regardless of the field that stores it."""
+        return getattr(self, self.price_field)
+
+    @property
+    def price_changed(self):
+        """Whether the price or deletion state differs from the persisted one."""
+        loaded = getattr(self, '_loaded_price_state', None)
+        return loaded is None or loaded != self._price_state()
+
+    @property
+    def price_value_changed(self):
+        """Whether the price itself differs from the persisted one."""
+        loaded = getattr(self, '_loaded_price_state', None)
+        return loaded is None or loaded[0] != self.price
+
+    @classmethod
+    def price_history_model(cls):
+        """Model holding the price history of this resource type."""
+        return cls._meta.get_field('price_history').related_model
+
+
+def price_as_of_subquery(model_class, as_of):
+    """
+    Price a resource had at ``as_of``: the latest history entry valid by then,
+    or the current price when the history starts later.
+    """
+    price = model_class.price_history_model().objects.filter(
+        resource=models.OuterRef('pk'),
+        valid_from__lte=as_of
+    ).order_by('-valid_from').values('price')[:1]
+    return Coalesce(
+        models.Subquery(price),
+        models.F(model_class.price_field),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2)
+    )
 
 
-class Material(BaseModel):
+class PricedQuerySet(models.QuerySet):
+    """QuerySet for priced resources with point-in-time price lookups"""
+
+    def with_price_as_of(self, as_of):
+        """Annotate ``price_as_of`` with the price of every row at ``as_of`` in one query"""
+        return self.annotate(price_as_of=price_as_of_subquery(self.model, as_of))
+
+
+PricedManager = SoftDeleteManager.from_queryset(PricedQuerySet)
+
+
+class Material(PriceTrackingMixin, BaseModel):
     """Model for construction materials"""
     code = models.CharField(max_length=50)
     description = models.TextField()
@@ -58,6 +148,9 @@ class Material(BaseModel):
         null=True
     )
 
+    objects = PricedManager()
+    all_objects = models.Manager.from_queryset(PricedQuerySet)()
+
     def __str__(self):
         return f"{self.code} - {self.description}"
 
@@ -65,9 +158,13 @@ class Material(BaseModel):
         verbose_name = "Material"
         verbose_name_plural = "Materials"
         unique_together = ['code', 'database']
+        indexes = [
+            models.Index(fields=['code', 'id']),
+            models.Index(fields=['database', 'updated_at', 'id']),
+        ]
 
 
-class Equipment(BaseModel):
+class Equipment(PriceTrackingMixin, BaseModel):
     """Model for construction equipment"""
     code = models.CharField(max_length=50)
     description = models.TextField()
@@ -79,6 +176,9 @@ class Equipment(BaseModel):
         related_name='equipment'
     )
 
+    objects = PricedManager()
+    all_objects = models.Manager.from_queryset(PricedQuerySet)()
+
     def __str__(self):
         return f"{self.code} - {self.description}"
 
@@ -86,10 +186,15 @@ class Equipment(BaseModel):
         verbose_name = "Equipment"
         verbose_name_plural = "Equipment"
         unique_together = ['code', 'database']
+        indexes = [
+            models.Index(fields=['code', 'id']),
+            models.Index(fields=['database', 'updated_at', 'id']),
+        ]
 
 
-class Labor(BaseModel):
+class Labor(PriceTrackingMixin, BaseModel):
     """Model for labor resources"""
+    price_field = 'hourly_cost'
     code = models.CharField(max_length=50)
     description = models.TextField()
     hourly_cost = models.DecimalField(max_digits=10, decimal_places=2)
@@ -99,6 +204,9 @@ class Labor(BaseModel):
         related_name='labor'
     )
 
+    objects = PricedManager()
+    all_objects = models.Manager.from_queryset(PricedQuerySet)()
+
     def __str__(self):
         return f"{self.code} - {self.description}"
 
@@ -106,6 +214,152 @@ class Labor(BaseModel):
         verbose_name = "Labor"
         verbose_name_plural = "Labor"
         unique_together = ['code', 'database']
+        indexes = [
+            models.Index(fields=['code', 'id']),
+            models.Index(fields=['database', 'updated_at', 'id']),
+        ]
+
+
+class PriceHistory(BaseModel):
+    """Append-only log of the prices of a resource, written on every price change"""
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    valid_from = models.DateTimeField(default=now)
+
+    class Meta:
+        abstract = True
+        ordering = ['-valid_from']
+        indexes = [
+            models.Index(fields=['resource', 'valid_from'], name='%(class)s_valid_from_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.resource_id} - {self.price} ({self.valid_from})"
+
+
+class MaterialPrice(PriceHistory):
+    """Price history of a material"""
+    resource = models.ForeignKey(
+        Material,
+        on_delete=models.CASCADE,
+        related_name='price_history'
+    )
+
+
+class EquipmentPrice(PriceHistory):
+    """Price history of a piece of equipment"""
+    resource = models.ForeignKey(
+        Equipment,
+        on_delete=models.CASCADE,
+        related_name='price_history'
+    )
+
+
+class LaborPrice(PriceHistory):
+    """Price history of a labor resource"""
+    resource = models.ForeignKey(
+        Labor,
+        on_delete=models.CASCADE,
+        related_name='price_history'
+    )
+
+
+def record_prices(resources, valid_from=None):
+    """Append the current price of every resource to its price history in bulk"""
+    valid_from = valid_from or now()
+    entries = defaultdict(list)
+    for resource in resources:
+        history_model = resource.price_history_model()
+        entries[history_model].append(
+            history_model(resource=resource, price=resource.price, valid_from=valid_from))
+    for history_model, rows in entries.items():
+        history_model.objects.bulk_create(rows, batch_size=1000)
+
+
+def resource_cost_subquery(model_class, cost_field, as_of=None):
+    """
+    Correlated subquery summing ``cost_field`` of the resources linked to a
+    work item, or their prices at ``as_of`` when given.
+    """
+    resources = model_class.objects.filter(workitem=models.OuterRef('pk'))
+    if as_of is not None:
+        resources = resources.with_price_as_of(as_of)
+        cost_field = 'price_as_of'
+    total = resources.values('workitem').annotate(
+        total=models.Sum(cost_field)
+    ).values('total')
+    return Coalesce(
+        models.Subquery(total),
+        models.Value(Decimal('0.00')),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2)
+    )
+
+
+class WorkItemQuerySet(models.QuerySet):
+    """QuerySet for work items with set-based cost calculations"""
+
+    @staticmethod
+    def cost_expressions(as_of=None):
+        """Expressions computing each resource cost of a work item from its compositions"""
+        return {
+            'labor_cost': resource_cost_subquery(Labor, 'hourly_cost', as_of),
+            'equipment_cost': resource_cost_subquery(Equipment, 'cost', as_of),
+            'material_cost': resource_cost_subquery(Material, 'cost', as_of),
+        }
+
+    def with_cost_totals(self, as_of=None):
+        """
+        Annotate the labor, equipment, material and overall cost of every row in
+        one query, priced at ``as_of`` when given.
+        """
+        expressions = self.cost_expressions(as_of)
+        queryset = self.annotate(
+            labor_cost_total=expressions['labor_cost'],
+            equipment_cost_total=expressions['equipment_cost'],
+            material_cost_total=expressions['material_cost'],
+        )
+        return queryset.annotate(
+            cost_total=(
+                models.F('labor_cost_total') +
+                models.F('equipment_cost_total') +
+                models.F('material_cost_total')
+            )
+        )
+
+    def with_resources(self):
+        """Prefetch the resources of every row with the relations they are serialized with"""
+        return self.select_related('database').prefetch_related(
+            models.Prefetch('material', queryset=Material.objects.select_related('database')),
+            models.Prefetch('labor', queryset=Labor.objects.select_related('database')),
+            models.Prefetch('equipment', queryset=Equipment.objects.select_related('database')),
+        )
+
+    def recompute_rollups(self):
+        """Rewrite the stored cost rollups of every row with a single UPDATE"""
+        expressions = self.cost_expressions()
+        updated = self.update(
+            total_cost=(
+                expressions['labor_cost'] +
+                expressions['equipment_cost'] +
+                expressions['material_cost']
+            ),
+            updated_at=now(),
+            **expressions
+        )
+        if updated:
+            rollups_recomputed.send(sender=self.model, queryset=self)
+        return updated
+
+    def with_rollup_drift(self):
+        """Rows whose stored rollups differ from the costs of their compositions"""
+        return self.with_cost_totals().exclude(
+            labor_cost=models.F('labor_cost_total'),
+            equipment_cost=models.F('equipment_cost_total'),
+            material_cost=models.F('material_cost_total'),
+            total_cost=models.F('cost_total'),
+        )
+
+
+WorkItemManager = SoftDeleteManager.from_queryset(WorkItemQuerySet)
 
 
 class WorkItem(BaseModel):
@@ -133,23 +387,47 @@ class WorkItem(BaseModel):
         default='UNITARY'
     )
 
+    # Cost rollups kept in sync by apps.databases.signals
+    labor_cost = models.DecimalField(
+        max_digits=12, decimal_places=2, default=Decimal('0.00'), editable=False)
+    equipment_cost = models.DecimalField(
+        max_digits=12, decimal_places=2, default=Decimal('0.00'), editable=False)
+    material_cost = models.DecimalField(
+        max_digits=12, decimal_places=2, default=Decimal('0.00'), editable=False)
+    total_cost = models.DecimalField(
+        max_digits=12, decimal_places=2, default=Decimal('0.00'), editable=False)
+
+    objects = WorkItemManager()
+    all_objects = models.Manager.from_queryset(WorkItemQuerySet)()
+
     def __str__(self):
         return f"{self.code} - {self.description}"
 
+    # The get_total_* methods prefer the values annotated by
+    # WorkItemQuerySet.with_cost_totals() and only aggregate as a fallback.
+
     def get_total_labor_cost(self):
         """Calculate the sum of hourly costs for all labor in this work item"""
+        if hasattr(self, 'labor_cost_total'):
+            return self.labor_cost_total
         return self.labor.aggregate(total=models.Sum('hourly_cost'))['total'] or 0
 
     def get_total_equipment_cost(self):
         """Calculate the sum of costs for all equipment in this work item"""
+        if hasattr(self, 'equipment_cost_total'):
+            return self.equipment_cost_total
         return self.equipment.aggregate(total=models.Sum('cost'))['total'] or 0
 
     def get_total_material_cost(self):
         """Calculate the sum of costs for all materials in this work item"""
+        if hasattr(self, 'material_cost_total'):
+            return self.material_cost_total
         return self.material.aggregate(total=models.Sum('cost'))['total'] or 0
 
     def get_total_cost(self):
         """Calculate the total cost by summing labor, equipment and material costs"""
+        if hasattr(self, 'cost_total'):
+            return self.cost_total
         return (self.get_total_labor_cost() +
                 self.get_total_equipment_cost() +
                 self.get_total_material_cost())
@@ -158,3 +436,7 @@ class WorkItem(BaseModel):
         verbose_name = "Work Item"
         verbose_name_plural = "Work Items"
         unique_together = ['code', 'database']
+        indexes = [
+            models.Index(fields=['code', 'id']),
+            models.Index(fields=['database', 'updated_at', 'id']),
+        ]
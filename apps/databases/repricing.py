@@ -0,0 +1,77 @@
+"""
+Set-based percentage price adjustments over a ``Database``.
+
+Every resource table is repriced with a single ``UPDATE`` multiplying its
+price column by the adjustment factor, rounded half up to cents by the
+database. The new prices are then appended to the price history, and the
+rollups of every affected work item are rewritten with one more ``UPDATE``.
+"""
+import time
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models.functions import Round
+from django.utils.timezone import now
+
+from .autocomplete import bump_catalog_version
+from .importers import RESOURCE_MODELS
+from .models import WorkItem
+
+HISTORY_BATCH_SIZE = 2000
+
+
+def adjustment_factor(percentage):
+    """Multiplier applying a ``percentage`` increase, or decrease when negative."""
+    return Decimal(1) + Decimal(percentage) / Decimal(100)
+
+
+def _record_history(model, queryset, valid_from):
+    history = model.price_history_model()
+    rows = queryset.values_list('id', model.price_field).iterator(chunk_size=HISTORY_BATCH_SIZE)
+    entries = [
+        history(resource_id=resource_id, price=price, valid_from=valid_from)
+        for resource_id, price in rows
+    ]
+    history.objects.bulk_create(entries, batch_size=HISTORY_BATCH_SIZE)
+
+
+@transaction.atomic
+def reprice_database(database, percentage, resource_types=None, code_prefix=None):
+    """
+    Raises the prices of ``resource_types`` in ``database`` by ``percentage``,
+    limited to codes starting with ``code_prefix`` when given.
+
+    Returns the number of resources updated per type, the number of work
+    items whose totals were refreshed and the elapsed time.
+    """
+    started = time.perf_counter()
+    factor = models.Value(adjustment_factor(percentage), output_field=models.DecimalField())
+    timestamp = now()
+
+    updated = {}
+    affected = models.Q()
+    for row_type in resource_types or RESOURCE_MODELS:
+        model = RESOURCE_MODELS[row_type]
+        queryset = model.objects.filter(database=database)
+        if code_prefix:
+            queryset = queryset.filter(code__startswith=code_prefix)
+
+        updated[row_type] = queryset.update(
+            **{model.price_field: Round(models.F(model.price_field) * factor, 2)},
+            updated_at=timestamp,
+        )
+        if updated[row_type]:
+            _record_history(model, queryset, timestamp)
+            affected |= models.Q(**{f'{row_type}__in': queryset})
+
+    work_items = 0
+    if affected:
+        work_items = WorkItem.all_objects.filter(affected).recompute_rollups()
+    bump_catalog_version(database.pk)
+
+    return {
+        'updated': updated,
+        'work_items': work_items,
+        'factor': str(adjustment_factor(percentage)),
+        'elapsed': round(time.perf_counter() - started, 4),
+    }
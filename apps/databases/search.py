@@ -0,0 +1,155 @@
+"""
+Full-text search over resource codes and descriptions, scoped per ``Database``.
+
+On SQLite the index is an FTS5 shadow table, created by migration
+``0007_search_index``, that holds every active material, labor, equipment
+and work item. Queries use prefix matching and are ordered by the table's
+``rank`` column, a ``bm25()`` that weighs code matches above descriptions.
+Each resource maps to a stable FTS rowid derived from its UUID, so keeping
+the index in sync on save, delete and soft-delete is a keyed delete plus
+insert. Other database backends fall back to ``icontains`` lookups.
+"""
+import re
+import uuid
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Equipment, Labor, Material, WorkItem
+
+SEARCH_TABLE = 'databases_search'
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+INDEX_BATCH_SIZE = 2000
+
+SEARCH_MODELS = {
+    'material': Material,
+    'labor': Labor,
+    'equipment': Equipment,
+    'work_item': WorkItem,
+}
+SEARCH_TYPES = {model: resource_type for resource_type, model in SEARCH_MODELS.items()}
+
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def search_rowid(resource_id):
+    """Stable 60-bit FTS rowid for a resource UUID."""
+    return resource_id.int >> 68
+
+
+class SQLiteSearchBackend:
+    """FTS5-backed index, maintained explicitly by signals and bulk writers."""
+
+    def index(self, instances):
+        """Adds or refreshes ``instances`` in the index, dropping soft-deleted ones."""
+        instances = list(instances)
+        if not instances:
+            return
+        self.remove(instances)
+        rows = [
+            (
+                search_rowid(instance.pk),
+                instance.code,
+                instance.description,
+                SEARCH_TYPES[type(instance)],
+                instance.pk.hex,
+                instance.database_id.hex if instance.database_id else None,
+            )
+            for instance in instances
+            if instance.deleted_at is None
+        ]
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), INDEX_BATCH_SIZE):
+                cursor.executemany(
+                    f'INSERT INTO {SEARCH_TABLE} '
+                    '(rowid, code, description, resource_type, resource_id, database_id) '
+                    'VALUES (%s, %s, %s, %s, %s, %s)',
+                    rows[start:start + INDEX_BATCH_SIZE],
+                )
+
+    def remove(self, instances):
+        rowids = [(search_rowid(instance.pk),) for instance in instances]
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', rowids)
+
+    def reindex_database(self, database):
+        """Rebuilds the entries of every resource of ``database``."""
+        for model in SEARCH_MODELS.values():
+            queryset = model.objects.filter(database=database).only(
+                'id', 'code', 'description', 'database', 'deleted_at')
+            batch = []
+            for instance in queryset.iterator(chunk_size=INDEX_BATCH_SIZE):
+                batch.append(instance)
+                if len(batch) == INDEX_BATCH_SIZE:
+                    self.index(batch)
+                    batch = []
+            self.index(batch)
+
+    @staticmethod
+    def _match_expression(query):
+        tokens = TOKEN_PATTERN.findall(query)
+        return ' '.join(f'"{token}"*' for token in tokens)
+
+    def search(self, database, query, resource_types=None, limit=DEFAULT_LIMIT):
+        expression = self._match_expression(query)
+        if not expression:
+            return []
+        types = list(resource_types or SEARCH_MODELS)
+        sql = (
+            'SELECT resource_type, resource_id, code, description, rank '
+            f'FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s AND database_id = %s '
+            f"AND resource_type IN ({', '.join(['%s'] * len(types))}) "
+            'ORDER BY rank LIMIT %s'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [expression, database.pk.hex, *types, limit])
+            return [
+                {
+                    'type': resource_type,
+                    'id': str(uuid.UUID(resource_id)),
+                    'code': code,
+                    'description': description,
+                    'rank': round(-rank, 6),
+                }
+                for resource_type, resource_id, code, description, rank in cursor.fetchall()
+            ]
+
+
+class ORMSearchBackend:
+    """Fallback for backends without a full-text index: ``icontains`` on every model."""
+
+    def index(self, instances):
+        return None
+
+    def remove(self, instances):
+        return None
+
+    def reindex_database(self, database):
+        return None
+
+    def search(self, database, query, resource_types=None, limit=DEFAULT_LIMIT):
+        tokens = TOKEN_PATTERN.findall(query)
+        if not tokens:
+            return []
+        condition = Q()
+        for token in tokens:
+            condition &= Q(code__icontains=token) | Q(description__icontains=token)
+
+        results = []
+        for resource_type in resource_types or SEARCH_MODELS:
+            rows = SEARCH_MODELS[resource_type].objects.filter(
+                condition, database=database
+            ).values('id', 'code', 'description')[:limit]
+            for row in rows:
+                # Codes starting with the first token rank above plain matches
+                rank = 2 if row['code'].lower().startswith(tokens[0].lower()) else 1
+                results.append({'type': resource_type, **row, 'id': str(row['id']), 'rank': rank})
+        results.sort(key=lambda result: (-result['rank'], result['code']))
+        return results[:limit]
+
+
+def get_backend():
+    """Search backend matching the vendor of the default database connection."""
+    vendor = connection.vendor
+    return SQLiteSearchBackend() if vendor == 'sqlite' else ORMSearchBackend()
@@ -1,10 +1,32 @@
+from collections import Counter, defaultdict
+
 from django.contrib.auth import get_user_model
-from django.core.exceptions import ObjectDoesNotExist
+from django.db import models, transaction
+from django.utils.timezone import now
 from rest_framework import serializers
 
 from apps.budgets.models import Budget
 
-from ..models import Database, Equipment, Labor, Material, Unit, WorkItem
+from .. import search
+from ..autocomplete import bump_catalog_version
+from ..models import Database, Equipment, Labor, Material, Unit, WorkItem, record_prices
+from ..units import registry as unit_registry
+
+# Stored cost columns refreshed after nested writes so responses are current
+ROLLUP_FIELDS = ['labor_cost', 'equipment_cost', 'material_cost', 'total_cost']
+# Nested resource fields of a work item: model and name used in error messages
+NESTED_RESOURCES = {
+    'material': (Material, 'material'),
+    'equipment': (Equipment, 'equipo'),
+    'labor': (Labor, 'mano de obra'),
+}
+# Totals annotated by WorkItemQuerySet.with_cost_totals(as_of) replacing the stored rollups
+AS_OF_TOTALS = {
+    'total_labor_cost': 'labor_cost_total',
+    'total_equipment_cost': 'equipment_cost_total',
+    'total_material_cost': 'material_cost_total',
+    'total_cost': 'cost_total',
+}
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -19,6 +41,13 @@ class UnitSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'symbol']
 
 
+class RegisteredUnitSerializer(UnitSerializer):
+    """Nested unit read from the unit registry instead of the material's relation."""
+
+    def get_attribute(self, instance):
+        return unit_registry.get(instance.unit_id)
+
+
 class DatabaseSerializer(serializers.ModelSerializer):
     user = serializers.HiddenField(default=serializers.CurrentUserDefault())
 
@@ -27,20 +56,86 @@ class DatabaseSerializer(serializers.ModelSerializer):
         fields = ['id', 'code', 'name', 'description', 'user']
 
 
+class RepriceSerializer(serializers.Serializer):
+    percentage = serializers.DecimalField(max_digits=7, decimal_places=3)
+    resource_types = serializers.MultipleChoiceField(
+        choices=['material', 'labor', 'equipment'], required=False)
+    code_prefix = serializers.CharField(max_length=50, required=False, allow_blank=True)
+
+    def validate_percentage(self, value):
+        if value <= -100:
+            raise serializers.ValidationError(
+                'El porcentaje debe ser mayor que -100.'
+            )
+        return value
+
+
+class ResourceListSerializer(serializers.ListSerializer):
+    """
+    Validates a list of new resources as a set: one query for the codes
+    already taken in the database and one for the units, instead of the
+    per-item lookups of the child serializer.
+    """
+
+    def validate(self, attrs):
+        request = self.context.get('request')
+        model_class = self.child.Meta.model
+        new_items = [item for item in attrs if 'id' not in item]
+
+        codes = [item['code'] for item in new_items if 'code' in item]
+        repeated = sorted(code for code, count in Counter(codes).items() if count > 1)
+        if repeated:
+            raise serializers.ValidationError(
+                f'Estos códigos se repiten en la lista: {repeated}'
+            )
+        if codes and not (request and request.method == 'PUT'):
+            taken = model_class.objects.filter(
+                code__in=codes, database=self.child._get_database()
+            ).values_list('code', flat=True)
+            if taken:
+                raise serializers.ValidationError(
+                    f'Ya existen recursos con estos códigos en la base de datos: {sorted(taken)}'
+                )
+
+        unit_ids = {item['unit_id'] for item in attrs if 'unit_id' in item}
+        if unit_ids:
+            missing = {unit_id for unit_id in unit_ids if unit_registry.get(unit_id) is None}
+            if missing:
+                raise serializers.ValidationError(
+                    f'Las siguientes unidades no existen: {sorted(map(str, missing))}'
+                )
+        return attrs
+
+
 class BaseResourceSerializer(serializers.ModelSerializer):
     id = serializers.UUIDField(required=False)
     database = DatabaseSerializer(many=False, read_only=True)
+    # Field -> annotation holding its value at the ``as_of`` date, when present
+    as_of_fields = {}
 
     class Meta:
         abstract = True  # Indicamos que es una clase abstracta
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        for field_name, annotation in self.as_of_fields.items():
+            if hasattr(instance, annotation):
+                data[field_name] = self.fields[field_name].to_representation(getattr(instance, annotation))
+        return data
+
     def _get_database(self):
-        return self.context.get('database') or Database.objects.first()
+        # Cached in the shared context so nested serializers look it up once
+        if not self.context.get('database'):
+            self.context['database'] = Database.objects.first()
+        return self.context['database']
+
+    def _in_resource_list(self):
+        """Whether the list serializer validates this item together with its siblings."""
+        return isinstance(self.parent, ResourceListSerializer)
 
     def validate_code(self, value):
         request = self.context.get('request')
-        if request and request.method == 'PUT' or self.instance:
-            print('oooooooooooooooooooooooooooooooooooooooooooooooooooo')
+        if request and request.method == 'PUT' or self.instance or self._in_resource_list():
             return value
         database = self._get_database()
         # Suponiendo que cada serializer derive de un modelo distinto
@@ -53,11 +148,13 @@ class BaseResourceSerializer(serializers.ModelSerializer):
 
 
 class MaterialSerializer(BaseResourceSerializer):
-    unit = UnitSerializer(many=False, read_only=True)
+    unit = RegisteredUnitSerializer(many=False, read_only=True)
     unit_id = serializers.UUIDField(write_only=True)
+    as_of_fields = {'cost': 'price_as_of'}
 
     class Meta:
         model = Material
+        list_serializer_class = ResourceListSerializer
         fields = [
             'id',
             'code',
@@ -78,16 +175,16 @@ class MaterialSerializer(BaseResourceSerializer):
         return value
 
     def validate_unit_id(self, value):
-        try:
-            Unit.objects.get(id=value)
+        if self._in_resource_list():
             return value
-        except ObjectDoesNotExist as exc:
+        if unit_registry.get(value) is None:
             raise serializers.ValidationError(
-                "La unidad especificada no existe.") from exc
+                "La unidad especificada no existe.")
+        return value
 
     def create(self, validated_data):
         unit_id = validated_data.pop('unit_id', None)
-        unit = Unit.objects.get(id=unit_id)
+        unit = unit_registry.get(unit_id)
         database_instance = self._get_database()
         material = Material.objects.create(
             database=database_instance,
@@ -99,7 +196,7 @@ class MaterialSerializer(BaseResourceSerializer):
     def update(self, instance, validated_data):
         unit_id = validated_data.pop('unit_id', None)
         if unit_id:
-            instance.unit = Unit.objects.get(id=unit_id)
+            instance.unit = unit_registry.get(unit_id)
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
@@ -108,9 +205,11 @@ class MaterialSerializer(BaseResourceSerializer):
 
 
 class EquipmentSerializer(BaseResourceSerializer):
+    as_of_fields = {'cost': 'price_as_of'}
 
     class Meta:
         model = Equipment
+        list_serializer_class = ResourceListSerializer
         fields = [
             'id',
             'code',
@@ -151,9 +250,11 @@ class EquipmentSerializer(BaseResourceSerializer):
 
 
 class LaborSerializer(BaseResourceSerializer):
+    as_of_fields = {'hourly_cost': 'price_as_of'}
 
     class Meta:
         model = Labor
+        list_serializer_class = ResourceListSerializer
         fields = [
             'id',
             'code',
@@ -195,13 +296,14 @@ class WorkItemSerializer(BaseResourceSerializer):
     budget_id = serializers.UUIDField(
         format='hex_verbose', write_only=True, required=True)
     total_labor_cost = serializers.DecimalField(
-        max_digits=10, decimal_places=2, read_only=True, source='get_total_labor_cost')
+        max_digits=12, decimal_places=2, read_only=True, source='labor_cost')
     total_equipment_cost = serializers.DecimalField(
-        max_digits=10, decimal_places=2, read_only=True, source='get_total_equipment_cost')
+        max_digits=12, decimal_places=2, read_only=True, source='equipment_cost')
     total_material_cost = serializers.DecimalField(
-        max_digits=10, decimal_places=2, read_only=True, source='get_total_material_cost')
+        max_digits=12, decimal_places=2, read_only=True, source='material_cost')
     total_cost = serializers.DecimalField(
-        max_digits=10, decimal_places=2, read_only=True, source='get_total_cost')
+        max_digits=12, decimal_places=2, read_only=True)
+    as_of_fields = AS_OF_TOTALS
 
     class Meta:
         model = WorkItem
@@ -244,29 +346,6 @@ class WorkItemSerializer(BaseResourceSerializer):
             )
         return value
 
-    def _validate_resource_exists(self, resource_id, model_class, resource_name):
-        if self.instance:
-            return
-        try:
-            return model_class.objects.get(id=resource_id)
-        except ObjectDoesNotExist:
-            raise serializers.ValidationError({
-                resource_name: f'El {resource_name} con id {resource_id} no existe.'
-            })
-
-    def _save_resources(self, serializer_class, data, model_class, existing_ids):
-        resources = []
-
-        if data:
-            serializer = serializer_class(many=True, data=data)
-            if serializer.is_valid(raise_exception=True):
-                resources.extend(serializer.save())
-
-        if existing_ids:
-            resources.extend(model_class.objects.filter(id__in=existing_ids))
-
-        return resources
-
     def validate(self, attrs):
         # Si estamos actualizando (instance existe), verificar que los recursos pertenezcan al workitem
         if self.instance:
@@ -291,69 +370,51 @@ class WorkItemSerializer(BaseResourceSerializer):
 
             return super().validate(attrs)
 
-        resource_validations = [
-            (attrs.get('material', []), Material, 'material'),
-            (attrs.get('equipment', []), Equipment, 'equipo'),
-            (attrs.get('labor', []), Labor, 'mano de obra')
-        ]
-
-        for resource_data, model_class, resource_name in resource_validations:
-            for item in resource_data:
-                if 'id' in item:
-                    self._validate_resource_exists(
-                        item['id'],
-                        model_class,
-                        resource_name
-                    )
+        # Referenced resources are fetched with one id__in query per model
+        self._existing_resources = {}
+        for field_name, (model_class, resource_name) in NESTED_RESOURCES.items():
+            ids = {item['id'] for item in attrs.get(field_name, []) if 'id' in item}
+            found = model_class.objects.in_bulk(ids) if ids else {}
+            missing = ids - set(found)
+            if missing:
+                raise serializers.ValidationError({
+                    resource_name: f'Los siguientes IDs de {resource_name} no existen: {missing}'
+                })
+            self._existing_resources[field_name] = list(found.values())
 
         return attrs
 
-    def _process_resource_data(self, resource_data, model_class, resource_name):
-        existing_ids = []
-        to_create = []
-
-        for item in resource_data:
-            if 'id' in item:
-                existing_ids.append(item['id'])
-            else:
-                to_create.append(item)
-
-        return existing_ids, to_create
-
+    @transaction.atomic
     def create(self, validated_data):
-        # TODO: use transactions
-        materials_data = validated_data.pop('material', [])
-        equipment_data = validated_data.pop('equipment', [])
-        labor_data = validated_data.pop('labor', [])
-        budget_id = validated_data.pop('budget_id', [])
-
-        print('xxxxxxxxxxxxxxxxxxxx', self._get_database())
-
-        work_item = WorkItem.objects.create(
-            database=self._get_database(),
-            **validated_data
-        )
-
-        resource_mappings = [
-            (materials_data, MaterialSerializer, Material, 'material'),
-            (equipment_data, EquipmentSerializer, Equipment, 'equipo'),
-            (labor_data, LaborSerializer, Labor, 'mano de obra')
-        ]
-
-        for resource_data, serializer_class, model_class, resource_name in resource_mappings:
-            existing_ids, to_create = self._process_resource_data(
-                resource_data,
-                model_class,
-                resource_name
-            )
-            resources = self._save_resources(
-                serializer_class, to_create, model_class, existing_ids)
-
-            getattr(work_item, model_class.__name__.lower()).add(*resources)
+        nested_data = {field_name: validated_data.pop(field_name, []) for field_name in NESTED_RESOURCES}
+        budget_id = validated_data.pop('budget_id')
+        database = self._get_database()
 
-        Budget.objects.get(id=budget_id).work_item.add(work_item)
+        work_item = WorkItem.objects.create(database=database, **validated_data)
 
-        return work_item
+        # New nested resources are inserted in bulk and linked with the referenced ones
+        created = []
+        for field_name, (model_class, _) in NESTED_RESOURCES.items():
+            new_resources = [
+                model_class(database=database, **item)
+                for item in nested_data[field_name] if 'id' not in item
+            ]
+            model_class.objects.bulk_create(new_resources)
+            created.extend(new_resources)
+
+            through = getattr(WorkItem, field_name).through
+            through.objects.bulk_create([
+                through(workitem=work_item, **{field_name: resource})
+                for resource in self._existing_resources[field_name] + new_resources
+            ])
+        if created:
+            record_prices(created)
+            search.get_backend().index(created)
+            bump_catalog_version(database.pk)
+
+        work_item.budget_set.add(budget_id)
+        WorkItem.objects.filter(pk=work_item.pk).recompute_rollups()
+        return WorkItem.objects.with_resources().get(pk=work_item.pk)
 
     def _update_existing_resources(self, data, serializer_class, model_class):
         updated_resources = []
@@ -407,6 +468,7 @@ class WorkItemSerializer(BaseResourceSerializer):
                     # Solo añadimos los nuevos recursos a la relación
                     relation.add(*new_resources)
 
+        instance.refresh_from_db(fields=ROLLUP_FIELDS)
         return instance
 
 
@@ -416,13 +478,16 @@ class WorkItemUpdateSerializer(BaseResourceSerializer):
     equipment = EquipmentSerializer(many=True, required=False)
     labor = LaborSerializer(many=True, required=False)
     total_labor_cost = serializers.DecimalField(
-        max_digits=10, decimal_places=2, read_only=True, source='get_total_labor_cost')
+        max_digits=12, decimal_places=2, read_only=True, source='labor_cost')
     total_equipment_cost = serializers.DecimalField(
-        max_digits=10, decimal_places=2, read_only=True, source='get_total_equipment_cost')
+        max_digits=12, decimal_places=2, read_only=True, source='equipment_cost')
     total_material_cost = serializers.DecimalField(
-        max_digits=10, decimal_places=2, read_only=True, source='get_total_material_cost')
+        max_digits=12, decimal_places=2, read_only=True, source='material_cost')
     total_cost = serializers.DecimalField(
-        max_digits=10, decimal_places=2, read_only=True, source='get_total_cost')
+        max_digits=12, decimal_places=2, read_only=True)
+    # Per-relation counts of created, updated, removed and unchanged resources
+    changes = serializers.SerializerMethodField()
+    as_of_fields = AS_OF_TOTALS
 
     class Meta:
         model = WorkItem
@@ -442,7 +507,7 @@ class WorkItemUpdateSerializer(BaseResourceSerializer):
             'total_cost',
             'covening_code',
             'material_unit_usage',
-
+            'changes',
         ]
         read_only_fields = [
             'id',
@@ -454,115 +519,129 @@ class WorkItemUpdateSerializer(BaseResourceSerializer):
             'material_unit_usage',
         ]
 
-    def _validate_resource_exists(self, resource_id, model_class, resource_name):
-        if self.instance:
-            return
-        try:
-            return model_class.objects.get(id=resource_id)
-        except ObjectDoesNotExist:
-            raise serializers.ValidationError({
-                resource_name: f'El {resource_name} con id {resource_id} no existe.'
-            })
-
-    def _save_resources(self, serializer_class, data, model_class, existing_ids):
-        resources = []
-
-        if data:
-            serializer = serializer_class(many=True, data=data)
-            if serializer.is_valid(raise_exception=True):
-                resources.extend(serializer.save())
-
-        if existing_ids:
-            resources.extend(model_class.objects.filter(id__in=existing_ids))
-
-        return resources
+    def get_changes(self, instance):
+        return getattr(instance, 'nested_changes', None)
 
     def validate(self, attrs):
-        # Si estamos actualizando (instance existe), verificar que los recursos pertenezcan al workitem
-        if self.instance:
-            resource_validations = [
-                (attrs.get('material', []), self.instance.material, 'material'),
-                (attrs.get('equipment', []), self.instance.equipment, 'equipo'),
-                (attrs.get('labor', []), self.instance.labor, 'mano de obra')
-            ]
-
-            for resource_data, resource_queryset, resource_name in resource_validations:
-                existing_ids = [item['id']
-                                for item in resource_data if 'id' in item]
-                if existing_ids:
-                    valid_ids = set(
-                        resource_queryset.values_list('id', flat=True))
-                    invalid_ids = set(existing_ids) - valid_ids
-                    if invalid_ids:
-                        raise serializers.ValidationError({
-                            resource_name: f'Los siguientes IDs de {resource_name} no están relacionados con este item: {invalid_ids}'
-                        })
+        # Linked resources are loaded once per relation and reused by update()
+        self._linked_resources = {}
+        for field_name, (_, resource_name) in NESTED_RESOURCES.items():
+            if field_name not in attrs:
+                continue
+            linked = {resource.pk: resource for resource in getattr(self.instance, field_name).all()}
+            invalid_ids = {item['id'] for item in attrs[field_name] if 'id' in item} - set(linked)
+            if invalid_ids:
+                raise serializers.ValidationError({
+                    resource_name: (
+                        f'Los siguientes IDs de {resource_name} no están relacionados con este item: {invalid_ids}')
+                })
+            self._linked_resources[field_name] = linked
         return attrs
 
-    def _process_resource_data(self, resource_data, model_class, resource_name):
-        existing_ids = []
-        to_create = []
-
-        for item in resource_data:
-            if 'id' in item:
-                existing_ids.append(item['id'])
-            else:
-                to_create.append(item)
-
-        return existing_ids, to_create
-
-    def _update_existing_resources(self, data, serializer_class, model_class):
-        updated_resources = []
-        for item in data:
-
-            if 'id' in item:
-                resource = model_class.objects.get(id=item['id'])
-                serializer = serializer_class(
-                    instance=resource, data=item, partial=True)
-                if serializer.is_valid(raise_exception=True):
-                    updated_resources.append(serializer.save())
-        return updated_resources
+    def _check_codes(self, model_class, resource_name, database_id, codes, renamed_ids):
+        """Rejects new or renamed codes used by other resources or repeated in the request."""
+        if not codes:
+            return
+        taken = set(model_class.objects.filter(
+            database_id=database_id, code__in=codes
+        ).exclude(pk__in=renamed_ids).values_list('code', flat=True))
+        taken.update(code for code, count in Counter(codes).items() if count > 1)
+        if taken:
+            raise serializers.ValidationError({
+                resource_name: f'Ya existen recursos con estos códigos en la base de datos: {sorted(taken)}'
+            })
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        materials_data = validated_data.pop('material', [])
-        equipment_data = validated_data.pop('equipment', [])
-        labor_data = validated_data.pop('labor', [])
+        nested_data = {
+            field_name: validated_data.pop(field_name)
+            for field_name in NESTED_RESOURCES if field_name in validated_data
+        }
 
         # Update basic fields
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
         instance.save()
 
-        # # Process each resource type
-        resource_mappings = [
-            (materials_data, MaterialSerializer, Material, instance.material),
-            (equipment_data, EquipmentSerializer, Equipment, instance.equipment),
-            (labor_data, LaborSerializer, Labor, instance.labor)
-        ]
-
-        for data, serializer_class, model_class, relation in resource_mappings:
-            if not data:
-                continue
-
-        #     # Update existing resources using serializers
-            self._update_existing_resources(
-                data,
-                serializer_class,
-                model_class
-            )
-
-        #     # Handle new resources
-            to_create = [item for item in data if 'id' not in item]
-            if to_create:
-
-                create_serializer = serializer_class(
-                    data=to_create,
-                    many=True,
-                    context=self.context
+        timestamp = now()
+        changes = {}
+        created, repriced, reindexed = [], [], []
+        unlinked = False
+        affected = models.Q(pk=instance.pk)
+        for field_name, items in nested_data.items():
+            model_class, resource_name = NESTED_RESOURCES[field_name]
+            linked = self._linked_resources[field_name]
+
+            # Apply the submitted values in memory, grouping rows by the fields that changed
+            kept = set()
+            new_resources = []
+            updates = defaultdict(list)
+            for item in items:
+                if 'id' not in item:
+                    new_resources.append(model_class(database_id=instance.database_id, **item))
+                    continue
+                resource = linked[item['id']]
+                kept.add(resource.pk)
+                changed = sorted(
+                    name for name, value in item.items()
+                    if name != 'id' and getattr(resource, name) != value
                 )
-                if create_serializer.is_valid(raise_exception=True):
-                    new_resources = create_serializer.save()
-                    # Solo añadimos los nuevos recursos a la relación
-                    relation.add(*new_resources)
-
+                for name in changed:
+                    setattr(resource, name, item[name])
+                if changed:
+                    resource.updated_at = timestamp
+                    updates[tuple(changed)].append(resource)
+
+            updated = [resource for resources in updates.values() for resource in resources]
+            renamed = [resource for fields, resources in updates.items() if 'code' in fields for resource in resources]
+            self._check_codes(
+                model_class, resource_name, instance.database_id,
+                [resource.code for resource in new_resources + renamed],
+                [resource.pk for resource in renamed],
+            )
+            for fields, resources in updates.items():
+                model_class.objects.bulk_update(resources, [*fields, 'updated_at'])
+            model_class.objects.bulk_create(new_resources)
+
+            through = getattr(WorkItem, field_name).through
+            removed = [pk for pk in linked if pk not in kept]
+            if removed:
+                through.objects.filter(workitem=instance, **{f'{field_name}__in': removed}).delete()
+                unlinked = True
+            through.objects.bulk_create([
+                through(workitem=instance, **{field_name: resource}) for resource in new_resources
+            ])
+
+            changed_prices = [
+                resource for fields, resources in updates.items()
+                if model_class.price_field in fields for resource in resources
+            ]
+            if changed_prices:
+                # Prices are shared, so every work item using them is refreshed
+                affected |= models.Q(**{f'{field_name}__in': [resource.pk for resource in changed_prices]})
+            created.extend(new_resources)
+            repriced.extend(changed_prices)
+            reindexed.extend(
+                resource for fields, resources in updates.items()
+                if {'code', 'description'} & set(fields) for resource in resources
+            )
+            changes[field_name] = {
+                'created': len(new_resources),
+                'updated': len(updated),
+                'removed': len(removed),
+                'unchanged': len(kept) - len(updated),
+            }
+
+        if created or repriced:
+            record_prices(created + repriced, valid_from=timestamp)
+        if created or reindexed:
+            search.get_backend().index(created + reindexed)
+        if created or repriced or reindexed or unlinked:
+            # Prices and compositions feed the cached unit costs as much as codes feed autocomplete
+            for database_id in {instance.database_id, *(resource.database_id for resource in repriced)}:
+                bump_catalog_version(database_id)
+        WorkItem.all_objects.filter(affected).recompute_rollups()
+
+        instance = WorkItem.objects.with_resources().get(pk=instance.pk)
+        instance.nested_changes = changes
         return instance
@@ -0,0 +1,124 @@
+from django.core.signals import request_finished, request_started
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from . import search
+from .autocomplete import bump_catalog_version
+from .models import Equipment, Labor, Material, Unit, WorkItem, record_prices
+from .units import bump_units_version
+from .units import registry as unit_registry
+
+SEARCHED_FIELDS = {'code', 'description', 'deleted_at'}
+
+# Relation on WorkItem that links each priced resource model
+RESOURCE_RELATIONS = {
+    Material: 'material',
+    Labor: 'labor',
+    Equipment: 'equipment',
+}
+
+
+@receiver(post_save, sender=Material)
+@receiver(post_save, sender=Labor)
+@receiver(post_save, sender=Equipment)
+def refresh_rollups_on_price_change(sender, instance, created, **kwargs):
+    """Recomputes the work items using a resource whose price or state changed."""
+    if created or not instance.price_changed:
+        return
+    relation = RESOURCE_RELATIONS[sender]
+    WorkItem.all_objects.filter(**{relation: instance}).recompute_rollups()
+
+
+@receiver(post_save, sender=Material)
+@receiver(post_save, sender=Labor)
+@receiver(post_save, sender=Equipment)
+def record_price_history(sender, instance, created, **kwargs):
+    """Appends the price of a new resource, or a changed one, to its history."""
+    if created or instance.price_value_changed:
+        record_prices([instance], valid_from=instance.updated_at)
+
+
+@receiver(m2m_changed, sender=WorkItem.material.through)
+@receiver(m2m_changed, sender=WorkItem.labor.through)
+@receiver(m2m_changed, sender=WorkItem.equipment.through)
+def refresh_rollups_on_composition_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Recomputes the work items whose material, labor or equipment set changed."""
+    if reverse and action == 'pre_clear':
+        # Reverse clears do not report the affected work items afterwards
+        relation = RESOURCE_RELATIONS[type(instance)]
+        instance._cleared_work_item_ids = list(
+            WorkItem.all_objects.filter(**{relation: instance}).values_list('id', flat=True)
+        )
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        work_items = WorkItem.all_objects.filter(pk=instance.pk)
+    elif action == 'post_clear':
+        work_items = WorkItem.all_objects.filter(
+            pk__in=instance.__dict__.pop('_cleared_work_item_ids', []))
+    else:
+        work_items = WorkItem.all_objects.filter(pk__in=pk_set)
+    work_items.recompute_rollups()
+
+
+@receiver(m2m_changed, sender=WorkItem.material.through)
+@receiver(m2m_changed, sender=WorkItem.labor.through)
+@receiver(m2m_changed, sender=WorkItem.equipment.through)
+def invalidate_catalog_on_composition_change(sender, instance, action, **kwargs):
+    """Compositions only link rows of one database, so either side names it."""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_catalog_version(instance.database_id)
+
+
+@receiver(post_save, sender=Material)
+@receiver(post_save, sender=Labor)
+@receiver(post_save, sender=Equipment)
+@receiver(post_save, sender=WorkItem)
+def update_search_index(sender, instance, update_fields=None, **kwargs):
+    """Reindexes a saved resource; soft-deleted ones leave the index."""
+    if update_fields and not SEARCHED_FIELDS.intersection(update_fields):
+        return
+    search.get_backend().index([instance])
+
+
+@receiver(post_delete, sender=Material)
+@receiver(post_delete, sender=Labor)
+@receiver(post_delete, sender=Equipment)
+@receiver(post_delete, sender=WorkItem)
+def remove_from_search_index(sender, instance, **kwargs):
+    search.get_backend().remove([instance])
+
+
+@receiver(post_save, sender=Material)
+@receiver(post_save, sender=Labor)
+@receiver(post_save, sender=Equipment)
+@receiver(post_save, sender=WorkItem)
+@receiver(post_delete, sender=Material)
+@receiver(post_delete, sender=Labor)
+@receiver(post_delete, sender=Equipment)
+@receiver(post_delete, sender=WorkItem)
+def invalidate_catalog(sender, instance, **kwargs):
+    """Bumps the catalog version of the database a resource belongs to."""
+    bump_catalog_version(instance.database_id)
+
+
+@receiver(post_save, sender=Unit)
+@receiver(post_delete, sender=Unit)
+def invalidate_units(sender, instance, **kwargs):
+    """Reloads the unit registries now and once the change is visible to other connections."""
+    bump_units_version()
+    transaction.on_commit(bump_units_version)
+
+
+@receiver(request_started)
+def pin_units(sender, **kwargs):
+    """Serves the units of a request from one registry check."""
+    unit_registry.pin()
+
+
+@receiver(request_finished)
+def unpin_units(sender, **kwargs):
+    unit_registry.unpin()
@@ -0,0 +1,33 @@
+"""Background variants of the heavy database actions, run by ``runworker``."""
+from decimal import Decimal
+
+from apps.jobs.queue import register
+
+from .cloning import clone_database
+from .importers import import_catalog
+from .models import Database
+from .repricing import reprice_database
+from .serializers.serializers import DatabaseSerializer
+
+
+@register('databases.import_catalog')
+def import_catalog_task(job, database_id, file_format):
+    database = Database.objects.get(pk=database_id)
+    job.report_progress(0, 'Importando catálogo')
+    with job.attachment.open('rb') as attachment:
+        return import_catalog(database, attachment.file, file_format).as_dict()
+
+
+@register('databases.clone')
+def clone_task(job, database_id, fields):
+    source = Database.objects.get(pk=database_id)
+    job.report_progress(0, 'Copiando base de datos')
+    database, timings = clone_database(source, user=job.user, **fields)
+    return {**DatabaseSerializer(database).data, 'timings': timings}
+
+
+@register('databases.reprice')
+def reprice_task(job, database_id, percentage, resource_types, code_prefix=None):
+    database = Database.objects.get(pk=database_id)
+    job.report_progress(0, 'Actualizando precios')
+    return reprice_database(database, Decimal(percentage), resource_types=resource_types, code_prefix=code_prefix)
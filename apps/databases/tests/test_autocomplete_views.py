@@ -0,0 +1,86 @@
+from decimal import Decimal
+
+from django.core.cache import caches
+from django.urls import reverse
+from rest_framework import status
+
+from apps.databases.autocomplete import (
+    CATALOG_VERSION_NAMESPACE,
+    bump_catalog_version,
+    catalog_version,
+    registry,
+)
+from apps.databases.models import Database, Labor, Material, Unit, WorkItem
+from utils.tests import BaseTestCase
+from utils.versioning import VERSIONS_CACHE
+
+
+class AutocompleteViewTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        registry.clear()
+        self.database = Database.objects.create(
+            code='DB001',
+            name='Test Database',
+            description='Test Description',
+            user=self.user
+        )
+        unit = Unit.objects.create(name='Kilogramo', symbol='kg')
+        for code in ('MT001', 'MT002', 'MT100'):
+            Material.objects.create(
+                code=code, description=f'Material {code}', unit=unit,
+                cost=Decimal('10.00'), database=self.database
+            )
+        Labor.objects.create(
+            code='LB001', description='Mason',
+            hourly_cost=Decimal('20.00'), database=self.database
+        )
+        WorkItem.objects.create(
+            code='WI001', description='Wall', unit='m2', covening_code='E.331.110',
+            yield_rate=Decimal('1.00'), database=self.database
+        )
+        self.url = reverse('database-autocomplete', kwargs={'pk': self.database.id})
+
+    def test_autocomplete_prefix(self):
+        response = self.client.get(self.url, {'prefix': 'mt00'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([entry['code'] for entry in response.data], ['MT001', 'MT002'])
+
+        response = self.client.get(self.url, {'prefix': 'e.331'})
+        self.assertEqual(response.data[0]['match'], 'covening_code')
+        self.assertEqual(response.data[0]['code'], 'WI001')
+
+    def test_warm_cache_skips_catalog_queries(self):
+        self.client.get(self.url, {'prefix': 'mt'})
+        # Only the JWT user lookup and the catalog version stamp remain
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {'prefix': 'lb'})
+        self.assertEqual(response.data[0]['code'], 'LB001')
+
+    def test_writes_invalidate_index(self):
+        self.client.get(self.url, {'prefix': 'mt'})
+        Labor.objects.create(
+            code='MT-LABOR', description='Odd code',
+            hourly_cost=Decimal('5.00'), database=self.database
+        )
+        response = self.client.get(self.url, {'prefix': 'mt-'})
+        self.assertEqual([entry['type'] for entry in response.data], ['labor'])
+
+    def test_evicted_version_stamp_is_never_reused(self):
+        seen = {catalog_version(self.database.pk)}
+        for _ in range(3):
+            bump_catalog_version(self.database.pk)
+            seen.add(catalog_version(self.database.pk))
+
+        caches[VERSIONS_CACHE].delete(f'version:{CATALOG_VERSION_NAMESPACE}:{self.database.pk}')
+
+        self.assertEqual(len(seen), 4)
+        self.assertNotIn(catalog_version(self.database.pk), seen)
+
+    def test_catalog_version_is_bumped_again_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_catalog_version(self.database.pk)
+            # What another process may have built from the uncommitted rows
+            version = catalog_version(self.database.pk)
+
+        self.assertNotEqual(catalog_version(self.database.pk), version)
@@ -0,0 +1,83 @@
+from decimal import Decimal
+
+from django.urls import reverse
+from rest_framework import status
+
+from apps.databases.models import Database, Labor, Material, Unit, WorkItem
+from utils.tests import BaseTestCase
+
+
+class BulkUpsertTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.database = Database.objects.create(
+            code='DB001',
+            name='Test Database',
+            description='Test Description',
+            user=self.user
+        )
+        self.unit = Unit.objects.create(name='Kilogramo', symbol='kg')
+        self.material = Material.objects.create(
+            code='MT001',
+            description='Cement',
+            unit=self.unit,
+            cost=Decimal('10.00'),
+            database=self.database
+        )
+        self.work_item = WorkItem.objects.create(
+            code='WI001',
+            description='Concrete',
+            unit='m3',
+            yield_rate=Decimal('1.00'),
+            database=self.database
+        )
+        self.work_item.material.add(self.material)
+        self.url = reverse('material-bulk')
+
+    def test_bulk_create_and_update(self):
+        data = {
+            'database_id': str(self.database.id),
+            'items': [
+                {'code': 'MT002', 'description': 'Sand', 'unit': 'kg', 'cost': '5.00'},
+                {'code': 'MT001', 'description': 'Cement II', 'unit_id': str(self.unit.id), 'cost': '12.00'},
+                {'code': 'MT003', 'description': 'Gravel', 'unit': 'ton', 'cost': '1.00'},
+                {'code': 'MT002', 'description': 'Sand again', 'unit': 'kg', 'cost': '6.00'},
+            ]
+        }
+        response = self.client.post(self.url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['index'] for row in response.data], [0, 1, 2, 3])
+        self.assertEqual(
+            [row['status'] for row in response.data], ['created', 'updated', 'error', 'error'])
+        self.assertEqual(response.data[1]['id'], str(self.material.id))
+
+        self.material.refresh_from_db()
+        self.assertEqual(self.material.description, 'Cement II')
+        self.assertEqual(self.material.cost, Decimal('12.00'))
+        created = Material.objects.get(code='MT002', database=self.database)
+        self.assertEqual(response.data[0]['id'], str(created.id))
+        self.assertEqual(created.description, 'Sand')
+
+        self.work_item.refresh_from_db()
+        self.assertEqual(self.work_item.total_cost, Decimal('12.00'))
+
+    def test_bulk_upsert_query_count_is_constant(self):
+        items = [
+            {'code': f'LB{index:03d}', 'description': 'Mason', 'hourly_cost': '20.00'}
+            for index in range(50)
+        ]
+        data = {'database_id': str(self.database.id), 'items': items}
+        # Bumping the catalog version stamp in the database cache takes five of them
+        with self.assertNumQueries(14):
+            response = self.client.post(reverse('labor-bulk'), data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Labor.objects.filter(database=self.database).count(), 50)
+
+    def test_bulk_upsert_invalid_database(self):
+        data = {'database_id': 'not-a-uuid', 'items': []}
+        response = self.client.post(self.url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('database_id', response.data)
@@ -0,0 +1,117 @@
+from decimal import Decimal
+
+from django.urls import reverse
+from rest_framework import status
+
+from apps.budgets.models import Budget
+from apps.databases.models import Database, Material, Unit, WorkItem
+from utils.tests import BaseTestCase
+
+
+class ConditionalGetTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.database = Database.objects.create(
+            code='DB001',
+            name='Test Database',
+            description='Test Description',
+            user=self.user
+        )
+        self.unit = Unit.objects.create(name='Kilogramo', symbol='kg')
+        self.material = Material.objects.create(
+            code='MT001',
+            description='Cement',
+            unit=self.unit,
+            cost=Decimal('10.00'),
+            database=self.database
+        )
+        self.work_item = WorkItem.objects.create(
+            code='WI001',
+            description='Concrete',
+            unit='m3',
+            yield_rate=Decimal('1.00'),
+            database=self.database
+        )
+        self.work_item.material.add(self.material)
+        self.list_url = reverse('material-list')
+        self.detail_url = reverse('material-detail', kwargs={'pk': self.material.id})
+
+    def _etag(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response['ETag']
+
+    def test_list_not_modified_before_serialization(self):
+        response = self.client.get(self.list_url)
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        self.assertIn('Last-Modified', response)
+
+        # Authentication and the validators query only
+        with self.assertNumQueries(2):
+            response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+    def test_list_modified_by_writes(self):
+        etag = self._etag(self.list_url)
+
+        self.material.description = 'Cement II'
+        self.material.save()
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+        etag = response['ETag']
+        self.material.delete()
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [])
+
+    def test_nested_rows_change_the_validators(self):
+        etag = self._etag(self.list_url)
+        work_item_etag = self._etag(reverse('workitem-detail', kwargs={'pk': self.work_item.id}))
+
+        self.unit.name = 'Kilo'
+        self.unit.save()
+        self.assertNotEqual(self._etag(self.list_url), etag)
+
+        self.material.description = 'Cement II'
+        self.material.save()
+        self.assertNotEqual(self._etag(reverse('workitem-detail', kwargs={'pk': self.work_item.id})),
+                            work_item_etag)
+
+    def test_query_string_changes_the_etag(self):
+        etag = self._etag(self.list_url)
+        self.assertNotEqual(self._etag(f'{self.list_url}?page_size=1'), etag)
+        self.assertNotEqual(self._etag(f'{self.list_url}?as_of=2020-01-01'), etag)
+
+    def test_detail_not_modified(self):
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get(self.detail_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_missing_detail_has_no_validators(self):
+        url = reverse('material-detail', kwargs={'pk': '00000000-0000-0000-0000-000000000000'})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertNotIn('ETag', response)
+
+    def test_budget_links_change_the_validators(self):
+        budget = Budget.objects.create(
+            code='BG001',
+            contract='CT001',
+            budget_date='2025-01-01',
+            name='Test Budget',
+            owner='Owner',
+            calculated_by='Engineer',
+            user=self.user
+        )
+        url = reverse('budget-detail', kwargs={'pk': budget.id})
+        etag = self._etag(url)
+
+        self.work_item.budget_set.add(budget)
+        self.assertNotEqual(self._etag(url), etag)
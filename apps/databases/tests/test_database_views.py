@@ -1,8 +1,11 @@
+from decimal import Decimal
+
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.utils.timezone import now
 from rest_framework import status
 
-from apps.databases.models import Database
+from apps.databases.models import Database, Material, Unit, WorkItem
 from utils.tests import BaseTestCase
 
 User = get_user_model()
@@ -25,7 +28,7 @@ class DatabaseViewSetTests(BaseTestCase):
     def test_list_databases(self):
         response = self.client.get(self.url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
 
     def test_create_database(self):
         data = {
@@ -36,3 +39,46 @@ class DatabaseViewSetTests(BaseTestCase):
         response = self.client.post(self.url, data)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(Database.objects.count(), 2)
+
+    def test_clone_database(self):
+        unit = Unit.objects.create(name='Kilogramo', symbol='kg')
+        material = Material.objects.create(
+            code='MT001', description='Cement', unit=unit,
+            cost=Decimal('10.50'), database=self.database
+        )
+        work_item = WorkItem.objects.create(
+            code='WI001', description='Wall', unit='m2',
+            yield_rate=Decimal('1.00'), database=self.database
+        )
+        work_item.material.add(material)
+
+        url = reverse('database-clone', kwargs={'pk': self.database.id})
+        response = self.client.post(url, {'code': 'DB002', 'name': 'Copy', 'description': 'Copy'})
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['timings']['workitem_material']['rows'], 1)
+        clone = WorkItem.objects.get(database__code='DB002', code='WI001')
+        self.assertNotEqual(clone.id, work_item.id)
+        self.assertEqual(clone.total_cost, Decimal('10.50'))
+        self.assertEqual(clone.material.get().database.code, 'DB002')
+        self.assertEqual(Material.objects.filter(code='MT001').count(), 2)
+
+    def test_clone_skips_links_to_deleted_resources(self):
+        unit = Unit.objects.create(name='Kilogramo', symbol='kg')
+        live = Material.objects.create(
+            code='MT001', description='Cement', unit=unit, cost=Decimal('10.50'), database=self.database)
+        deleted = Material.objects.create(
+            code='MT002', description='Lime', unit=unit, cost=Decimal('5.00'), database=self.database)
+        work_item = WorkItem.objects.create(
+            code='WI001', description='Wall', unit='m2', yield_rate=Decimal('1.00'), database=self.database)
+        work_item.material.add(live, deleted)
+        # Model.delete() also soft-deletes the parent database, so mark the row directly
+        Material.objects.filter(pk=deleted.pk).update(deleted_at=now())
+
+        url = reverse('database-clone', kwargs={'pk': self.database.id})
+        response = self.client.post(url, {'code': 'DB002', 'name': 'Copy', 'description': 'Copy'})
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['timings']['workitem_material']['rows'], 1)
+        links = WorkItem.material.through.objects.filter(workitem__database__code='DB002')
+        self.assertEqual(list(links.values_list('material__database__code', flat=True)), ['DB002'])
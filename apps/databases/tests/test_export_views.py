@@ -0,0 +1,83 @@
+import gzip
+import io
+import json
+from decimal import Decimal
+
+from django.urls import reverse
+from rest_framework import status
+
+from apps.databases.importers import import_catalog
+from apps.databases.models import Database, Labor, Material, Unit, WorkItem
+from utils.tests import BaseTestCase
+
+
+class CatalogExportTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.database = Database.objects.create(
+            code='DB001',
+            name='Test Database',
+            description='Test Description',
+            user=self.user
+        )
+        unit = Unit.objects.create(name='Kilogramo', symbol='kg')
+        material = Material.objects.create(
+            code='MT001', description='Cement', unit=unit,
+            cost=Decimal('10.50'), database=self.database
+        )
+        labor = Labor.objects.create(
+            code='LB001', description='Mason',
+            hourly_cost=Decimal('20.00'), database=self.database
+        )
+        work_item = WorkItem.objects.create(
+            code='WI001', description='Wall', unit='m2',
+            yield_rate=Decimal('2.00'), database=self.database
+        )
+        work_item.material.add(material)
+        work_item.labor.add(labor)
+        self.url = reverse('database-export', kwargs={'pk': self.database.id})
+
+    def test_export_csv(self):
+        response = self.client.get(self.url, {'format': 'csv'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertIn('work_item,WI001,Wall,m2', lines[-1])
+        self.assertIn('MT001,LB001', lines[-1])
+
+    def test_export_ndjson_gzip(self):
+        response = self.client.get(
+            self.url, {'format': 'ndjson'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+        content = gzip.decompress(b''.join(response.streaming_content)).decode()
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([row['type'] for row in rows], ['material', 'labor', 'work_item'])
+        self.assertEqual(rows[-1]['material'], ['MT001'])
+
+    def test_export_honours_gzip_q_values(self):
+        for accept_encoding, compressed in [
+            ('gzip;q=0', False),
+            ('br, gzip; q=0.0', False),
+            ('*;q=0', False),
+            ('identity', False),
+            ('br;q=1.0, gzip;q=0.5', True),
+            ('*', True),
+        ]:
+            response = self.client.get(self.url, {'format': 'csv'}, HTTP_ACCEPT_ENCODING=accept_encoding)
+            self.assertEqual(response.has_header('Content-Encoding'), compressed, accept_encoding)
+            content = b''.join(response.streaming_content)
+            self.assertEqual(content.startswith(b'\x1f\x8b'), compressed, accept_encoding)
+
+    def test_export_round_trips_through_importer(self):
+        response = self.client.get(self.url, {'format': 'csv'})
+        copy = Database.objects.create(code='DB002', name='Copy', description='')
+
+        result = import_catalog(copy, io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(result.rejected, 0)
+        self.assertEqual(
+            WorkItem.objects.get(database=copy, code='WI001').total_cost,
+            Decimal('30.50')
+        )
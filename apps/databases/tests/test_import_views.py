@@ -0,0 +1,100 @@
+import json
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework import status
+
+from apps.databases.models import Database, Material, Unit, WorkItem
+from utils.tests import BaseTestCase
+
+CATALOG_CSV = """type,code,description,unit,cost,hourly_cost,depreciation,yield_rate,material,labor,equipment
+material,MT001,Cement,kg,10.50,,,,,,
+material,MT002,Sand,m3,25.00,,,,,,
+material,MT003,Gravel,ton,30.00,,,,,,
+labor,LB001,Mason,,,20.00,,,,,
+equipment,EQ001,Mixer,,50.00,,5.00,,,,
+work_item,WI001,Concrete,m3,,,,2.00,MT001|MT002,LB001,EQ001
+work_item,WI002,Bad item,m3,,,,1.00,MT404,,
+material,MT001,Duplicate,kg,1.00,,,,,,
+"""
+
+
+class CatalogImportTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.database = Database.objects.create(
+            code='DB001',
+            name='Test Database',
+            description='Test Description',
+            user=self.user
+        )
+        Unit.objects.create(name='Kilogramo', symbol='kg')
+        Unit.objects.create(name='Metro cubico', symbol='m3')
+        self.url = reverse('database-import-catalog', kwargs={'pk': self.database.id})
+
+    def test_import_csv_catalog(self):
+        upload = SimpleUploadedFile('catalog.csv', CATALOG_CSV.encode())
+        response = self.client.post(self.url, {'file': upload}, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created']['material'], 2)
+        self.assertEqual(response.data['created']['work_item'], 1)
+        self.assertEqual(response.data['links'], 4)
+        self.assertEqual(response.data['rejected'], 3)
+        self.assertEqual([error['line'] for error in response.data['errors']], [4, 8, 9])
+
+        work_item = WorkItem.objects.get(code='WI001', database=self.database)
+        self.assertEqual(work_item.material.count(), 2)
+        self.assertEqual(work_item.total_cost, Decimal('105.50'))
+
+    def test_import_ndjson_command(self):
+        rows = [
+            {'type': 'material', 'code': 'MT001', 'description': 'Cement', 'unit': 'Kilogramo', 'cost': '10.50'},
+            {'type': 'work_item', 'code': 'WI001', 'description': 'Mortar', 'unit': 'm3',
+             'yield_rate': '1', 'material': ['MT001']},
+        ]
+        path = self.tmp_catalog('\n'.join(json.dumps(row) for row in rows))
+        out = StringIO()
+        call_command('import_catalog', path, '--database', 'DB001', stdout=out)
+
+        self.assertIn('0 rows rejected', out.getvalue())
+        self.assertTrue(Material.objects.filter(code='MT001', database=self.database).exists())
+        self.assertEqual(WorkItem.objects.get(code='WI001').material_cost, Decimal('10.50'))
+
+    def test_ndjson_lines_must_be_objects(self):
+        content = '\n'.join([
+            json.dumps({'type': 'labor', 'code': 'LB001', 'description': 'Mason', 'hourly_cost': '20.00'}),
+            json.dumps(['labor', 'LB002']),
+            '42',
+            '"labor"',
+        ])
+        upload = SimpleUploadedFile('catalog.ndjson', content.encode())
+        response = self.client.post(self.url, {'file': upload}, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created']['labor'], 1)
+        self.assertEqual([error['line'] for error in response.data['errors']], [2, 3, 4])
+        self.assertEqual(response.data['errors'][0]['error'], 'Each line must be a JSON object.')
+
+    def test_lines_that_are_not_utf8_are_rejected(self):
+        content = (
+            'type,code,description,hourly_cost\n'
+            'labor,LB001,Mason,20.00\n'
+        ).encode() + 'labor,LB002,Albañil,20.00\n'.encode('latin-1') + b'labor,LB003,Helper,10.00\n'
+        upload = SimpleUploadedFile('catalog.csv', content)
+        response = self.client.post(self.url, {'file': upload}, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created']['labor'], 2)
+        self.assertEqual(response.data['errors'], [{'line': 3, 'error': 'Invalid UTF-8 text.'}])
+
+    def tmp_catalog(self, content):
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False) as handle:
+            handle.write(content)
+        self.addCleanup(os.remove, handle.name)
+        return handle.name
@@ -0,0 +1,85 @@
+import json
+from base64 import urlsafe_b64encode
+from unittest import mock
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+
+from apps.databases.models import Database, Labor
+from utils.pagination import CodePagination
+from utils.tests import BaseTestCase
+
+
+class KeysetPaginationTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        # Codes repeat across databases, so only (code, id) is unique
+        for database_code in ('DB001', 'DB002'):
+            database = Database.objects.create(
+                code=database_code,
+                name='Test Database',
+                description='Test Description',
+                user=self.user
+            )
+            for index in range(5):
+                Labor.objects.create(
+                    code=f'LB00{index}',
+                    description='Mason',
+                    hourly_cost=20.00,
+                    database=database
+                )
+        self.url = reverse('labor-list')
+        self.expected = list(Labor.objects.order_by('code', 'id').values_list('id', flat=True))
+
+    def _ids(self, response):
+        return [result['id'] for result in response.data['results']]
+
+    def test_walk_forward_and_back(self):
+        response = self.client.get(self.url, {'page_size': 3})
+        self.assertIsNone(response.data['previous'])
+        pages = [response]
+        while pages[-1].data['next']:
+            pages.append(self.client.get(pages[-1].data['next']))
+
+        seen = [row_id for page in pages for row_id in self._ids(page)]
+        self.assertEqual(seen, [str(row_id) for row_id in self.expected])
+        self.assertEqual(len(pages), 4)
+
+        previous = self.client.get(pages[-1].data['previous'])
+        self.assertEqual(self._ids(previous), self._ids(pages[-2]))
+        self.assertIsNotNone(previous.data['next'])
+
+    def test_deep_pages_cost_the_same_queries(self):
+        first = self.client.get(self.url, {'page_size': 2})
+        with CaptureQueriesContext(connection) as shallow:
+            second = self.client.get(first.data['next'])
+        response = second
+        while response.data['next']:
+            last_url = response.data['next']
+            response = self.client.get(last_url)
+        with CaptureQueriesContext(connection) as deep:
+            self.client.get(last_url)
+
+        self.assertEqual(len(shallow), len(deep))
+        self.assertNotIn('OFFSET', deep.captured_queries[-1]['sql'])
+
+    def test_page_size_is_capped(self):
+        with mock.patch.object(CodePagination, 'max_page_size', 4):
+            response = self.client.get(self.url, {'page_size': 1000})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 4)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        for position in (['LB001', 'zzz'], ['LB001', {'id': 1}], [['LB001'], 'zzz']):
+            cursor = urlsafe_b64encode(json.dumps({'p': position}).encode()).decode('ascii')
+            response = self.client.get(self.url, {'cursor': cursor})
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, position)
+
+        cursor = urlsafe_b64encode(json.dumps({'p': ['garbage', 'x']}).encode()).decode('ascii')
+        response = self.client.get(reverse('budget-list'), {'cursor': cursor})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,122 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import now
+from rest_framework import status
+
+from apps.databases.models import (
+    Database,
+    Labor,
+    Material,
+    MaterialPrice,
+    Unit,
+    WorkItem,
+)
+from utils.tests import BaseTestCase
+
+
+class PriceHistoryTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.database = Database.objects.create(
+            code='DB001',
+            name='Test Database',
+            description='Test Description',
+            user=self.user
+        )
+        self.unit = Unit.objects.create(name='Kilogramo', symbol='kg')
+        self.material = Material.objects.create(
+            code='MT001',
+            description='Cement',
+            unit=self.unit,
+            cost=Decimal('10.00'),
+            database=self.database
+        )
+        self.labor = Labor.objects.create(
+            code='LB001',
+            description='Mason',
+            hourly_cost=Decimal('20.00'),
+            database=self.database
+        )
+        self.work_item = WorkItem.objects.create(
+            code='WI001',
+            description='Concrete',
+            unit='m3',
+            yield_rate=Decimal('1.00'),
+            database=self.database
+        )
+        self.work_item.material.add(self.material)
+        self.work_item.labor.add(self.labor)
+
+        # Backdate the initial prices and raise them today
+        self.last_year = now() - timedelta(days=365)
+        self.material.price_history.update(valid_from=self.last_year)
+        self.labor.price_history.update(valid_from=self.last_year)
+        self.material.cost = Decimal('15.00')
+        self.material.save()
+        self.labor.hourly_cost = Decimal('25.00')
+        self.labor.save()
+        self.as_of = (self.last_year + timedelta(days=1)).date().isoformat()
+
+    def test_price_changes_are_recorded(self):
+        self.material.description = 'Grey cement'
+        self.material.save()
+
+        prices = list(self.material.price_history.values_list('price', flat=True))
+        self.assertEqual(prices, [Decimal('15.00'), Decimal('10.00')])
+
+    def test_bulk_upsert_records_changed_prices(self):
+        data = {
+            'database_id': str(self.database.id),
+            'items': [
+                {'code': 'MT001', 'description': 'Cement', 'unit': 'kg', 'cost': '15.00'},
+                {'code': 'MT002', 'description': 'Sand', 'unit': 'kg', 'cost': '5.00'},
+            ]
+        }
+        response = self.client.post(reverse('material-bulk'), data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.material.price_history.count(), 2)
+        self.assertEqual(MaterialPrice.objects.get(resource__code='MT002').price, Decimal('5.00'))
+
+    def test_list_materials_as_of(self):
+        url = reverse('material-list')
+        current = self.client.get(url)
+        past = self.client.get(url, {'as_of': self.as_of})
+
+        self.assertEqual(current.data['results'][0]['cost'], '15.00')
+        self.assertEqual(past.data['results'][0]['cost'], '10.00')
+
+    def test_as_of_resolves_prices_in_one_query(self):
+        for index in range(5):
+            Material.objects.create(
+                code=f'MT10{index}',
+                description='Extra Material',
+                unit=self.unit,
+                cost=Decimal('1.00'),
+                database=self.database
+            )
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('material-list'), {'as_of': self.as_of})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        history_queries = [q for q in queries.captured_queries if 'databases_materialprice' in q['sql']]
+        self.assertEqual(len(history_queries), 1)
+
+    def test_work_item_as_of(self):
+        url = reverse('workitem-detail', kwargs={'pk': self.work_item.id})
+        current = self.client.get(url)
+        past = self.client.get(url, {'as_of': self.as_of})
+
+        self.assertEqual(current.data['total_cost'], '40.00')
+        self.assertEqual(past.data['total_cost'], '30.00')
+        self.assertEqual(past.data['total_material_cost'], '10.00')
+        self.assertEqual(past.data['material'][0]['cost'], '10.00')
+        self.assertEqual(past.data['labor'][0]['hourly_cost'], '20.00')
+
+    def test_invalid_as_of(self):
+        response = self.client.get(reverse('material-list'), {'as_of': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
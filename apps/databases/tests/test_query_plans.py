@@ -0,0 +1,62 @@
+import json
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from apps.budgets.models import Budget
+from apps.databases.models import Material
+from utils.query_plans import audit_queryset
+
+
+class QueryPlanAuditTests(TestCase):
+    def _run(self, *args):
+        out = StringIO()
+        call_command('audit_query_plans', *args, stdout=out, stderr=StringIO())
+        return json.loads(out.getvalue())
+
+    def test_report_covers_every_registered_viewset(self):
+        report = self._run()
+
+        entries = {(entry['basename'], entry['action'], bool(entry['params'])): entry
+                   for entry in report['entries']}
+        for basename in ('budget', 'company', 'unit', 'material', 'equipment', 'labor', 'workitem', 'database'):
+            for action in ('list', 'list:next', 'retrieve'):
+                self.assertIn((basename, action, False), entries)
+        self.assertIn(('workitem', 'list', True), entries)
+        self.assertNotIn(('unit', 'list', True), entries)
+
+        budgets = entries[('budget', 'list', False)]
+        self.assertIn('"user_id" = 00000000000000000000000000000000', budgets['sql'])
+        self.assertIn('"deleted_at" IS NULL', budgets['sql'])
+        self.assertFalse([entry for entry in report['entries'] if 'error' in entry])
+
+    def test_report_is_stable_between_runs(self):
+        self.assertEqual(self._run(), self._run())
+
+    def test_api_querysets_have_no_findings(self):
+        call_command('audit_query_plans', '--strict', stdout=StringIO(), stderr=StringIO())
+
+    def test_flags_sort_and_suggests_index(self):
+        result = audit_queryset(Budget.objects.filter(owner='Owner').order_by('name'))
+
+        kinds = {finding['kind'] for finding in result['findings']}
+        self.assertIn('full_scan', kinds)
+        self.assertIn('temp_btree', kinds)
+        self.assertEqual(result['suggestion'], {
+            'model': 'budgets.Budget', 'table': 'budgets_budget', 'fields': ['owner', 'name'],
+        })
+
+    def test_no_suggestion_when_an_index_exists(self):
+        result = audit_queryset(Material.objects.filter(code='MT001').order_by('code', 'id'))
+        self.assertIsNone(result['suggestion'])
+
+    def test_strict_fails_on_findings(self):
+        finding = {'kind': 'full_scan', 'table': 'databases_unit', 'detail': 'SCAN databases_unit'}
+        result = {'sql': '', 'plan': [finding['detail']], 'findings': [finding], 'suggestion': None}
+        with mock.patch('apps.databases.management.commands.audit_query_plans.audit_queryset',
+                        return_value=result):
+            with self.assertRaises(CommandError):
+                self._run('--strict')
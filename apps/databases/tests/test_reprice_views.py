@@ -0,0 +1,83 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.urls import reverse
+from rest_framework import status
+
+from apps.databases.models import Database, Equipment, Labor, Material, Unit, WorkItem
+from apps.databases.repricing import reprice_database
+from utils.tests import BaseTestCase
+
+
+class RepriceTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.database = Database.objects.create(
+            code='DB001',
+            name='Test Database',
+            description='Test Description',
+            user=self.user
+        )
+        unit = Unit.objects.create(name='Kilogramo', symbol='kg')
+        self.cement = Material.objects.create(
+            code='CEM-01', description='Cement', unit=unit, cost=Decimal('10.05'), database=self.database)
+        self.sand = Material.objects.create(
+            code='SND-01', description='Sand', unit=unit, cost=Decimal('5.00'), database=self.database)
+        self.labor = Labor.objects.create(
+            code='LB001', description='Mason', hourly_cost=Decimal('20.00'), database=self.database)
+        self.equipment = Equipment.objects.create(
+            code='EQ001', description='Mixer', cost=Decimal('50.00'), depreciation=Decimal('5.00'),
+            database=self.database)
+        self.work_item = WorkItem.objects.create(
+            code='WI001', description='Concrete', unit='m3', yield_rate=Decimal('1.00'), database=self.database)
+        self.work_item.material.add(self.cement, self.sand)
+        self.work_item.labor.add(self.labor)
+        self.url = reverse('database-reprice', kwargs={'pk': self.database.id})
+
+    def test_reprice_all_resources(self):
+        response = self.client.post(self.url, {'percentage': '10'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated'], {'material': 2, 'labor': 1, 'equipment': 1})
+        self.assertEqual(response.data['work_items'], 1)
+        self.cement.refresh_from_db()
+        self.equipment.refresh_from_db()
+        # 10.05 * 1.1 = 11.055, rounded half up
+        self.assertEqual(self.cement.cost, Decimal('11.06'))
+        self.assertEqual(self.equipment.cost, Decimal('55.00'))
+        self.assertEqual(self.cement.price_history.first().price, Decimal('11.06'))
+
+        self.work_item.refresh_from_db()
+        self.assertEqual(self.work_item.total_cost, Decimal('38.56'))
+
+    def test_reprice_by_type_and_prefix(self):
+        data = {'percentage': '-50', 'resource_types': ['material'], 'code_prefix': 'SND'}
+        response = self.client.post(self.url, data, format='json')
+
+        self.assertEqual(response.data['updated'], {'material': 1})
+        self.sand.refresh_from_db()
+        self.cement.refresh_from_db()
+        self.assertEqual(self.sand.cost, Decimal('2.50'))
+        self.assertEqual(self.cement.cost, Decimal('10.05'))
+        self.work_item.refresh_from_db()
+        self.assertEqual(self.work_item.material_cost, Decimal('12.55'))
+
+    def test_rounding_matches_decimal_half_up(self):
+        # Half-cent products that binary floating point stores just below the half
+        prices = [Decimal(cents) / 100 for cents in range(1, 2001, 7)]
+        Labor.objects.bulk_create([
+            Labor(code=f'HC{index:04}', description='Helper', hourly_cost=price, database=self.database)
+            for index, price in enumerate(prices)
+        ])
+        for percentage in ('10', '12.5', '-35', '0.15'):
+            expected = {
+                code: (price * (1 + Decimal(percentage) / 100)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+                for code, price in Labor.objects.filter(code__startswith='HC').values_list('code', 'hourly_cost')
+            }
+            reprice_database(self.database, Decimal(percentage), resource_types=['labor'], code_prefix='HC')
+
+            repriced = dict(Labor.objects.filter(code__startswith='HC').values_list('code', 'hourly_cost'))
+            self.assertEqual(repriced, expected, percentage)
+
+    def test_reprice_rejects_invalid_percentage(self):
+        response = self.client.post(self.url, {'percentage': '-100'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
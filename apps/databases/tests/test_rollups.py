@@ -0,0 +1,87 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+
+from apps.databases.models import Database, Equipment, Labor, Material, Unit, WorkItem
+from utils.tests import BaseTestCase
+
+
+class WorkItemRollupTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.database = Database.objects.create(
+            code='DB001',
+            name='Test Database',
+            description='Test Description',
+            user=self.user
+        )
+        unit = Unit.objects.create(name='Metro', symbol='m')
+        self.material = Material.objects.create(
+            code='MT001', description='Cement', unit=unit,
+            cost=Decimal('100.00'), database=self.database
+        )
+        self.labor = Labor.objects.create(
+            code='LB001', description='Mason',
+            hourly_cost=Decimal('20.00'), database=self.database
+        )
+        self.equipment = Equipment.objects.create(
+            code='EQ001', description='Mixer', cost=Decimal('50.00'),
+            depreciation=Decimal('10.00'), database=self.database
+        )
+        self.work_item = WorkItem.objects.create(
+            code='WI001', description='Wall', unit='m2',
+            yield_rate=Decimal('1.00'), database=self.database
+        )
+        self.work_item.material.add(self.material)
+        self.work_item.labor.add(self.labor)
+        self.work_item.equipment.add(self.equipment)
+
+    def assertRollups(self, labor, equipment, material):
+        self.work_item.refresh_from_db()
+        self.assertEqual(self.work_item.labor_cost, Decimal(labor))
+        self.assertEqual(self.work_item.equipment_cost, Decimal(equipment))
+        self.assertEqual(self.work_item.material_cost, Decimal(material))
+        self.assertEqual(
+            self.work_item.total_cost,
+            Decimal(labor) + Decimal(equipment) + Decimal(material)
+        )
+
+    def test_composition_changes_update_rollups(self):
+        self.assertRollups('20.00', '50.00', '100.00')
+        self.work_item.labor.remove(self.labor)
+        self.assertRollups('0.00', '50.00', '100.00')
+        self.material.workitem_set.clear()
+        self.assertRollups('0.00', '50.00', '0.00')
+
+    def test_price_changes_update_rollups(self):
+        self.labor.hourly_cost = Decimal('25.00')
+        self.labor.save()
+        self.material.cost = Decimal('120.00')
+        self.material.save()
+        self.assertRollups('25.00', '50.00', '120.00')
+
+    def test_soft_deleted_resources_leave_rollups(self):
+        self.equipment.deleted_at = now()
+        self.equipment.save()
+        self.assertRollups('20.00', '0.00', '100.00')
+
+    def test_saves_without_price_change_skip_recompute(self):
+        self.material.description = 'Grey cement'
+        with CaptureQueriesContext(connection) as queries:
+            self.material.save()
+        self.assertFalse(
+            any('databases_workitem' in query['sql'] for query in queries.captured_queries))
+
+    def test_recompute_rollups_command_repairs_drift(self):
+        WorkItem.objects.update(total_cost=Decimal('0.00'))
+        with self.assertRaises(CommandError):
+            call_command('recompute_rollups', '--check', stderr=StringIO())
+
+        out = StringIO()
+        call_command('recompute_rollups', stdout=out)
+        self.assertIn('consistent', out.getvalue())
+        self.assertRollups('20.00', '50.00', '100.00')
@@ -0,0 +1,64 @@
+from decimal import Decimal
+
+from django.urls import reverse
+from django.utils.timezone import now
+from rest_framework import status
+
+from apps.databases.models import Database, Labor, Material, Unit, WorkItem
+from utils.tests import BaseTestCase
+
+
+class SearchViewTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.database = Database.objects.create(
+            code='DB001',
+            name='Test Database',
+            description='Test Description',
+            user=self.user
+        )
+        other = Database.objects.create(code='DB002', name='Other', description='')
+        unit = Unit.objects.create(name='Kilogramo', symbol='kg')
+        self.cement = Material.objects.create(
+            code='MT001', description='Cemento gris tipo I', unit=unit,
+            cost=Decimal('10.50'), database=self.database
+        )
+        Material.objects.create(
+            code='MT001', description='Cemento blanco', unit=unit,
+            cost=Decimal('12.00'), database=other
+        )
+        Labor.objects.create(
+            code='LB001', description='Albañil de primera',
+            hourly_cost=Decimal('20.00'), database=self.database
+        )
+        WorkItem.objects.create(
+            code='WI001', description='Friso de cemento', unit='m2',
+            yield_rate=Decimal('1.00'), database=self.database
+        )
+        self.url = reverse('database-search', kwargs={'pk': self.database.id})
+
+    def test_search_ranks_prefix_matches_across_types(self):
+        response = self.client.get(self.url, {'q': 'cem'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            sorted(result['code'] for result in response.data), ['MT001', 'WI001'])
+
+        response = self.client.get(self.url, {'q': 'cem gri', 'type': 'material'})
+        self.assertEqual([result['id'] for result in response.data], [str(self.cement.id)])
+
+    def test_search_ignores_accents(self):
+        response = self.client.get(self.url, {'q': 'albanil'})
+        self.assertEqual([result['type'] for result in response.data], ['labor'])
+
+    def test_search_follows_updates_and_soft_deletes(self):
+        self.cement.description = 'Arena lavada'
+        self.cement.save()
+        self.assertEqual(len(self.client.get(self.url, {'q': 'arena'}).data), 1)
+
+        self.cement.deleted_at = now()
+        self.cement.save()
+        self.assertEqual(self.client.get(self.url, {'q': 'arena'}).data, [])
+
+    def test_search_requires_query(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,105 @@
+from decimal import Decimal
+
+from django.test import override_settings
+from django.urls import reverse
+from django.utils.timezone import now
+from rest_framework import status
+
+from apps.databases.models import Database, Labor, Material, Unit, WorkItem
+from utils.tests import BaseTestCase
+
+
+@override_settings(SYNC_LAG_SECONDS=0)
+class DatabaseChangesTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.database = Database.objects.create(
+            code='DB001',
+            name='Test Database',
+            description='Test Description',
+            user=self.user
+        )
+        self.unit = Unit.objects.create(name='Kilogramo', symbol='kg')
+        self.material = Material.objects.create(
+            code='MT001',
+            description='Cement',
+            unit=self.unit,
+            cost=Decimal('10.00'),
+            database=self.database
+        )
+        self.labor = Labor.objects.create(
+            code='LB001',
+            description='Mason',
+            hourly_cost=Decimal('20.00'),
+            database=self.database
+        )
+        self.work_item = WorkItem.objects.create(
+            code='WI001',
+            description='Concrete',
+            unit='m3',
+            yield_rate=Decimal('1.00'),
+            database=self.database
+        )
+        self.work_item.material.add(self.material)
+        self.url = reverse('database-changes', kwargs={'pk': self.database.id})
+
+    def _sync(self, since=None, **params):
+        if since:
+            params['since'] = since
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_full_sync_without_cursor(self):
+        data = self._sync()
+
+        self.assertFalse(data['has_more'])
+        by_id = {change['id']: change for change in data['changes']}
+        self.assertEqual(set(by_id), {str(self.material.id), str(self.labor.id), str(self.work_item.id)})
+        self.assertEqual(by_id[str(self.material.id)]['type'], 'material')
+        self.assertEqual(by_id[str(self.material.id)]['data']['cost'], '10.00')
+        self.assertEqual(by_id[str(self.work_item.id)]['data']['material'], [self.material.id])
+
+    def test_incremental_sync_returns_changes_and_tombstones(self):
+        cursor = self._sync()['cursor']
+        self.assertEqual(self._sync(cursor)['changes'], [])
+
+        self.material.description = 'Cement II'
+        self.material.save()
+        # Model.delete() also soft-deletes the parent database, so mark the row directly
+        Labor.objects.filter(id=self.labor.id).update(deleted_at=now(), updated_at=now())
+        data = self._sync(cursor)
+
+        changes = {change['id']: change for change in data['changes']}
+        self.assertEqual(changes[str(self.material.id)]['data']['description'], 'Cement II')
+        self.assertTrue(changes[str(self.labor.id)]['deleted'])
+        self.assertIsNone(changes[str(self.labor.id)]['data'])
+        self.assertEqual(self._sync(data['cursor'])['changes'], [])
+
+    def test_pages_resume_from_the_cursor(self):
+        seen = []
+        cursor = None
+        while True:
+            data = self._sync(cursor, limit=1)
+            seen.extend(change['id'] for change in data['changes'])
+            cursor = data['cursor']
+            if not data['has_more']:
+                break
+        self.assertEqual(len(seen), 3)
+        self.assertEqual(len(set(seen)), 3)
+
+    def test_other_databases_are_not_included(self):
+        other = Database.objects.create(code='DB002', name='Other', description='', user=self.user)
+        Labor.objects.create(code='LB001', description='Mason', hourly_cost=Decimal('20.00'), database=other)
+        self.assertEqual(len(self._sync()['changes']), 3)
+
+    @override_settings(SYNC_LAG_SECONDS=3600)
+    def test_recent_rows_are_held_back(self):
+        data = self._sync()
+        self.assertEqual(data['changes'], [])
+        self.assertIsNone(data['cursor'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {'since': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('since', response.data)
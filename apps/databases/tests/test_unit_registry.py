@@ -0,0 +1,143 @@
+import threading
+from decimal import Decimal
+from unittest import mock
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+
+from apps.databases.models import Database, Material, Unit
+from apps.databases.units import UNITS_VERSION_KEY, UNITS_VERSION_NAMESPACE, get_version
+from apps.databases.units import registry as unit_registry
+from utils.tests import BaseTestCase
+from utils.versioning import bump_version
+
+
+class UnitRegistryTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.database = Database.objects.create(
+            code='DB001',
+            name='Test Database',
+            description='Test Description',
+            user=self.user
+        )
+        self.unit = Unit.objects.create(name='Kilogramo', symbol='kg')
+        for index in range(5):
+            Material.objects.create(
+                code=f'MT{index:03}',
+                description='Cement',
+                unit=self.unit,
+                cost=Decimal('10.00'),
+                database=self.database
+            )
+
+    def _unit_queries(self, queries):
+        # Conditional GET validators only read the newest updated_at of the table
+        return [query['sql'] for query in queries if '"databases_unit"."id"' in query['sql']]
+
+    def test_lookup_by_id_symbol_and_name(self):
+        self.assertEqual(unit_registry.get(self.unit.id), self.unit)
+        self.assertEqual(unit_registry.lookup('KG'), self.unit)
+        self.assertEqual(unit_registry.lookup('kilogramo'), self.unit)
+        self.assertEqual(unit_registry.lookup(str(self.unit.id)), self.unit)
+        self.assertIsNone(unit_registry.lookup('m3'))
+
+    def test_warm_registry_serves_material_list_without_unit_queries(self):
+        unit_registry.all()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('material-list'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['unit']['symbol'], 'kg')
+        self.assertEqual(self._unit_queries(queries), [])
+
+    def test_warm_registry_validates_material_without_unit_queries(self):
+        unit_registry.all()
+        data = {
+            'code': 'MT100',
+            'description': 'Sand',
+            'unit_id': str(self.unit.id),
+            'cost': '5.00',
+            'database_id': str(self.database.id),
+        }
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('material-list'), data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['unit']['name'], 'Kilogramo')
+        self.assertEqual(self._unit_queries(queries), [])
+
+    def test_saving_a_unit_refreshes_the_registry(self):
+        unit_registry.all()
+
+        response = self.client.post(reverse('unit-list'), {'name': 'Metro', 'symbol': 'm'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(unit_registry.lookup('m').name, 'Metro')
+
+        self.unit.name = 'Kilo'
+        self.unit.save()
+        self.assertEqual(unit_registry.get(self.unit.id).name, 'Kilo')
+
+    def test_requests_compare_the_version_stamp_once(self):
+        unit_registry.all()
+
+        with mock.patch('apps.databases.units.get_version', wraps=get_version) as version:
+            response = self.client.get(reverse('material-list'))
+
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertEqual(version.call_count, 1)
+
+    def test_pinned_registry_sees_other_processes_changes_once_unpinned(self):
+        with unit_registry.pinned():
+            unit_registry.all()
+            Unit.objects.filter(pk=self.unit.pk).update(name='Kilo')
+            # As another process saving the unit would
+            bump_version(UNITS_VERSION_NAMESPACE, UNITS_VERSION_KEY)
+            self.assertEqual(unit_registry.get(self.unit.id).name, 'Kilogramo')
+
+        self.assertEqual(unit_registry.get(self.unit.id).name, 'Kilo')
+
+    def test_pinned_threads_keep_their_table_while_another_thread_saves_a_unit(self):
+        stamps = [1]
+
+        def bump(*args):
+            stamps.append(len(stamps) + 1)
+        pinned, saved = threading.Event(), threading.Event()
+        found = []
+
+        def import_units():
+            with unit_registry.pinned():
+                found.append(unit_registry.lookup('kg'))
+                pinned.set()
+                saved.wait(timeout=5)
+                found.append(unit_registry.lookup('kg'))
+
+        # The stamps live in memory, so the other thread never waits on this test's transaction
+        with mock.patch('apps.databases.units.get_version', side_effect=lambda *args: stamps[-1]), \
+                mock.patch('apps.databases.units.bump_version', side_effect=bump):
+            unit_registry.all()
+            thread = threading.Thread(target=import_units)
+            thread.start()
+            pinned.wait(timeout=5)
+            Unit.objects.create(name='Metro', symbol='m')
+            saved.set()
+            thread.join()
+
+            self.assertEqual(found, [self.unit, self.unit])
+            self.assertEqual(unit_registry.lookup('m').name, 'Metro')
+
+    def test_unknown_unit_is_rejected(self):
+        data = {
+            'code': 'MT100',
+            'description': 'Sand',
+            'unit_id': '00000000-0000-0000-0000-000000000000',
+            'cost': '5.00',
+            'database_id': str(self.database.id),
+        }
+        response = self.client.post(reverse('material-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('unit_id', response.data)
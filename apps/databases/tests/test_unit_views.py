@@ -18,7 +18,7 @@ class UnitViewSetTests(BaseTestCase):
     def test_list_units(self):
         response = self.client.get(self.url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
 
     def test_create_unit(self):
         data = {
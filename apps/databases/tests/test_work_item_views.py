@@ -1,8 +1,15 @@
+from decimal import Decimal
+
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 
-from apps.databases.models import Database, Material, Unit, WorkItem
+from apps.budgets.models import Budget
+from apps.databases.autocomplete import catalog_version
+from apps.databases.models import Database, Equipment, Labor, Material, Unit, WorkItem
+from apps.databases.units import registry as unit_registry
 from utils.tests import BaseTestCase
 
 User = get_user_model()
@@ -35,6 +42,15 @@ class WorkItemViewSetTests(BaseTestCase):
             yield_rate=1.0,
             database=self.database
         )
+        self.budget = Budget.objects.create(
+            code='BG001',
+            contract='CT001',
+            budget_date='2025-01-01',
+            name='Test Budget',
+            owner='Owner',
+            calculated_by='Engineer',
+            user=self.user
+        )
         self.url = reverse('workitem-list')
         self.detail_url = reverse(
             'workitem-detail', kwargs={'pk': self.work_item.id})
@@ -46,12 +62,84 @@ class WorkItemViewSetTests(BaseTestCase):
             'unit': 'm',
             'yield_rate': 2.0,
             'database_id': str(self.database.id),
-            'material_ids': [str(self.material.id)]
+            'material_ids': [str(self.material.id)],
+            'budget_id': str(self.budget.id)
         }
         response = self.client.post(self.url, data)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(WorkItem.objects.count(), 2)
 
+    def _nested_payload(self, count):
+        """Work item with ``count`` resources per type, half of them new."""
+        materials = [{'id': str(self.material.id), 'code': 'MT001', 'description': 'Test Material',
+                      'unit_id': str(self.unit.id), 'cost': '100.00'}]
+        labor = []
+        equipment = []
+        for index in range(count):
+            if index % 2:
+                labor.append({'id': str(Labor.objects.create(
+                    code=f'LB{count}-{index}', description='Mason', hourly_cost=10, database=self.database
+                ).id), 'code': f'LB{count}-{index}', 'description': 'Mason', 'hourly_cost': '10.00'})
+                equipment.append({'id': str(Equipment.objects.create(
+                    code=f'EQ{count}-{index}', description='Mixer', cost=5, depreciation=1, database=self.database
+                ).id), 'code': f'EQ{count}-{index}', 'description': 'Mixer', 'cost': '5.00', 'depreciation': '1.00'})
+            else:
+                labor.append({'code': f'LB{count}-{index}', 'description': 'Mason', 'hourly_cost': '10.00'})
+                equipment.append({'code': f'EQ{count}-{index}', 'description': 'Mixer', 'cost': '5.00',
+                                  'depreciation': '1.00'})
+            materials.append({'code': f'MN{count}-{index}', 'description': 'Sand',
+                              'unit_id': str(self.unit.id), 'cost': '1.00'})
+        return {
+            'code': f'WI{count:03d}',
+            'description': 'Nested Work Item',
+            'unit': 'm3',
+            'yield_rate': '1.00',
+            'budget_id': str(self.budget.id),
+            'material': materials,
+            'labor': labor,
+            'equipment': equipment,
+        }
+
+    def test_create_work_item_with_nested_resources(self):
+        response = self.client.post(self.url, self._nested_payload(20), format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        work_item = WorkItem.objects.get(id=response.data['id'])
+        self.assertEqual(work_item.material.count(), 21)
+        self.assertEqual(work_item.labor.count(), 20)
+        self.assertEqual(work_item.equipment.count(), 20)
+        self.assertEqual(response.data['total_cost'], '420.00')
+        self.assertEqual(len(response.data['material']), 21)
+        self.assertTrue(self.budget.work_item.filter(id=work_item.id).exists())
+
+    def test_create_work_item_query_count_is_constant(self):
+        small = self._nested_payload(2)
+        large = self._nested_payload(20)
+        unit_registry.all()
+        with CaptureQueriesContext(connection) as small_queries:
+            self.client.post(self.url, small, format='json')
+        self.assertEqual(len(small_queries), 51)
+        with self.assertNumQueries(len(small_queries)):
+            response = self.client.post(self.url, large, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_create_work_item_unknown_resource(self):
+        payload = self._nested_payload(2)
+        payload['labor'][1]['id'] = str(self.work_item.id)
+        response = self.client.post(self.url, payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(WorkItem.objects.filter(code='WI002').count(), 0)
+
+    def test_create_work_item_repeated_nested_codes(self):
+        payload = self._nested_payload(4)
+        payload['material'][3]['code'] = payload['material'][1]['code']
+        response = self.client.post(self.url, payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('material', response.data)
+        self.assertFalse(WorkItem.objects.filter(code='WI004').exists())
+
     def test_create_work_item_invalid_yield_rate(self):
         data = {
             'code': 'WI002',
@@ -62,3 +150,110 @@ class WorkItemViewSetTests(BaseTestCase):
         }
         response = self.client.post(self.url, data)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_work_items_cost_totals(self):
+        self.work_item.material.add(self.material)
+        for index in range(3):
+            WorkItem.objects.create(
+                code=f'WI10{index}',
+                description='Extra Work Item',
+                unit='m',
+                yield_rate=1.0,
+                database=self.database
+            ).material.add(self.material)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        aggregates = [q for q in queries.captured_queries if 'SUM(' in q['sql']]
+        self.assertEqual(aggregates, [])
+        self.assertEqual(len(response.data['results']), 4)
+        for item in response.data['results']:
+            self.assertEqual(item['total_material_cost'], '100.00')
+            self.assertEqual(item['total_cost'], '100.00')
+
+    def test_with_cost_totals_matches_fallback(self):
+        self.work_item.material.add(self.material)
+        annotated = WorkItem.objects.with_cost_totals().get(id=self.work_item.id)
+        self.assertEqual(annotated.get_total_cost(),
+                         self.work_item.get_total_cost())
+        self.assertEqual(annotated.get_total_labor_cost(), 0)
+
+    def _linked_work_item(self, count):
+        """Work item linked to ``count`` labor resources and the test material."""
+        work_item = WorkItem.objects.create(
+            code=f'WU{count}', description='Updated Work Item', unit='m', yield_rate=1, database=self.database)
+        labor = Labor.objects.bulk_create([
+            Labor(code=f'LU{count}-{index}', description='Mason', hourly_cost=10, database=self.database)
+            for index in range(count)
+        ])
+        work_item.labor.add(*labor)
+        work_item.material.add(self.material)
+        return work_item, labor
+
+    def _update_payload(self, work_item, labor):
+        """Reprices the first labor, drops the last one and adds a new one."""
+        items = [
+            {'id': str(resource.id), 'code': resource.code, 'description': 'Mason', 'hourly_cost': '10.00'}
+            for resource in labor[:-1]
+        ]
+        items[0]['hourly_cost'] = '12.50'
+        items.append({'code': f'LN{len(labor)}', 'description': 'Helper', 'hourly_cost': '5.00'})
+        return {'code': work_item.code, 'labor': items}
+
+    def test_update_work_item_nested_resources(self):
+        work_item, labor = self._linked_work_item(4)
+        self.work_item.labor.add(labor[0])
+        url = reverse('workitem-detail', kwargs={'pk': work_item.id})
+
+        response = self.client.put(url, self._update_payload(work_item, labor), format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['changes'], {
+            'labor': {'created': 1, 'updated': 1, 'removed': 1, 'unchanged': 2},
+        })
+        self.assertEqual(work_item.labor.count(), 4)
+        self.assertFalse(work_item.labor.filter(id=labor[-1].id).exists())
+        self.assertEqual(work_item.material.count(), 1)
+        self.assertEqual(response.data['total_labor_cost'], '37.50')
+        self.assertEqual(labor[0].price_history.first().price, Decimal('12.50'))
+        # Other work items using the repriced resource are refreshed too
+        self.work_item.refresh_from_db()
+        self.assertEqual(self.work_item.labor_cost, Decimal('12.50'))
+
+    def test_update_work_item_query_count_is_constant(self):
+        small, small_labor = self._linked_work_item(4)
+        large, large_labor = self._linked_work_item(40)
+        unit_registry.all()
+
+        with CaptureQueriesContext(connection) as small_queries:
+            self.client.put(reverse('workitem-detail', kwargs={'pk': small.id}),
+                            self._update_payload(small, small_labor), format='json')
+        with self.assertNumQueries(len(small_queries)):
+            response = self.client.put(reverse('workitem-detail', kwargs={'pk': large.id}),
+                                       self._update_payload(large, large_labor), format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_price_and_link_changes_bump_the_catalog_version(self):
+        work_item, labor = self._linked_work_item(2)
+        url = reverse('workitem-detail', kwargs={'pk': work_item.id})
+        items = [{'id': str(resource.id), 'code': resource.code, 'description': 'Mason', 'hourly_cost': '10.00'}
+                 for resource in labor]
+
+        version = catalog_version(self.database.pk)
+        items[0]['hourly_cost'] = '11.00'
+        self.client.put(url, {'code': work_item.code, 'labor': items}, format='json')
+        self.assertNotEqual(catalog_version(self.database.pk), version)
+
+        version = catalog_version(self.database.pk)
+        self.client.put(url, {'code': work_item.code, 'labor': items[:1]}, format='json')
+        self.assertNotEqual(catalog_version(self.database.pk), version)
+
+    def test_update_work_item_rejects_taken_code(self):
+        work_item, labor = self._linked_work_item(2)
+        payload = self._update_payload(work_item, labor)
+        payload['labor'][-1]['code'] = labor[0].code
+        response = self.client.put(reverse('workitem-detail', kwargs={'pk': work_item.id}), payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(work_item.labor.count(), 2)
@@ -0,0 +1,101 @@
+"""
+Process-local registry of every active ``Unit``.
+
+Units are a handful of rows that almost never change, yet every material
+validated, created or serialized needs one. Each worker loads the whole
+table once and serves lookups by id, symbol or name from memory. The
+registry is tagged with a version stamp that saving or deleting a unit
+bumps, and reloads the table when the stamp changes. The stamp is bumped
+again on commit so no registry keeps a table read before the change was
+visible.
+
+The stamp is compared once per request, or once per ``pinned()`` block such
+as an import, and on every lookup elsewhere. A request therefore serves all
+its units from the table it started with: a reload swaps in new dicts and
+never empties the ones a pinned thread still holds.
+"""
+import threading
+from contextlib import contextmanager
+
+from utils.versioning import bump_version, get_version
+
+from .models import Unit
+
+UNITS_VERSION_NAMESPACE = 'databases.units'
+UNITS_VERSION_KEY = 'all'
+
+
+def bump_units_version():
+    """Marks the unit registries reading the version stamp as stale."""
+    bump_version(UNITS_VERSION_NAMESPACE, UNITS_VERSION_KEY)
+    registry.clear()
+
+
+class UnitRegistry:
+    """Units of the current version, shared by the threads of one worker process."""
+
+    def __init__(self):
+        self._version = None
+        # (by id, by label), replaced as a whole on every reload
+        self._table = ({}, {})
+        self._lock = threading.Lock()
+        # Pinning depth, whether the stamp was compared since and the table then read, per thread
+        self._local = threading.local()
+
+    def pin(self):
+        """Compares the version stamp on the next lookup only, until ``unpin``."""
+        self._local.depth = getattr(self._local, 'depth', 0) + 1
+        self._local.checked = False
+
+    def unpin(self):
+        self._local.depth = max(getattr(self._local, 'depth', 0) - 1, 0)
+
+    @contextmanager
+    def pinned(self):
+        self.pin()
+        try:
+            yield self
+        finally:
+            self.unpin()
+
+    def _load(self):
+        pinned = getattr(self._local, 'depth', 0)
+        if pinned and self._local.checked:
+            return self._local.table
+        version = get_version(UNITS_VERSION_NAMESPACE, UNITS_VERSION_KEY)
+        table = self._table
+        if version != self._version:
+            units = list(Unit.objects.all())
+            by_id = {unit.pk: unit for unit in units}
+            by_label = {}
+            for unit in units:
+                by_label.setdefault(unit.symbol.lower(), unit)
+                by_label.setdefault(unit.name.lower(), unit)
+                by_label[str(unit.pk)] = unit
+            table = (by_id, by_label)
+            with self._lock:
+                self._table, self._version = table, version
+        if pinned:
+            self._local.checked = True
+            self._local.table = table
+        return table
+
+    def get(self, unit_id):
+        """The unit with the UUID ``unit_id``, or ``None`` when it does not exist."""
+        return self._load()[0].get(unit_id)
+
+    def lookup(self, value):
+        """The unit whose id, symbol or name (case-insensitive) is ``value``."""
+        return self._load()[1].get(value.lower())
+
+    def all(self):
+        return list(self._load()[0].values())
+
+    def clear(self):
+        """Reloads the table on the next lookup of this thread, and of every thread not pinned."""
+        with self._lock:
+            self._version = None
+        self._local.checked = False
+
+
+registry = UnitRegistry()
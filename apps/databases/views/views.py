@@ -1,11 +1,36 @@
-from rest_framework import viewsets
+import uuid
+from datetime import datetime, time
 
+from django.core.exceptions import ValidationError
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.timezone import is_naive, make_aware
+from rest_framework import exceptions, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.parsers import FormParser, MultiPartParser
+from rest_framework.response import Response
+
+from apps.jobs.queue import enqueue
+from apps.jobs.responses import job_accepted, prefers_async
+from utils.conditional import ConditionalGetMixin
+from utils.pagination import CodePagination, NamePagination
+from utils.sync import SyncSource, collect_changes, sync_limit
+
+from .. import autocomplete, search
+from ..bulk import bulk_upsert
+from ..cloning import clone_database
+from ..exporters import accepts_gzip, stream_catalog
+from ..importers import FORMATS, detect_format, import_catalog
 from ..models import Database, Equipment, Labor, Material, Unit, WorkItem
+from ..renderers import CSVRenderer, NDJSONRenderer
+from ..repricing import reprice_database
 from ..serializers.serializers import (
     DatabaseSerializer,
     EquipmentSerializer,
     LaborSerializer,
     MaterialSerializer,
+    RepriceSerializer,
     UnitSerializer,
     WorkItemSerializer,
     WorkItemUpdateSerializer,
@@ -14,33 +39,219 @@ from ..serializers.serializers import (
 # pylint: disable=too-many-ancestors
 
 
-class UnitViewSet(viewsets.ModelViewSet):
+class BulkUpsertMixin:
+    """Adds a ``bulk`` action creating or updating many resources by code."""
+    bulk_row_type = None
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        database_id = request.data.get('database_id')
+        items = request.data.get('items')
+        if not isinstance(items, list):
+            return Response({'items': 'Debe enviar una lista de recursos.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            database = Database.objects.get(id=database_id)
+        except (Database.DoesNotExist, ValidationError, ValueError):
+            return Response({'database_id': 'La base de datos no existe.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        results = bulk_upsert(self.bulk_row_type, database, items)
+        return Response(results)
+
+
+class PriceAsOfMixin:
+    """
+    Prices GET responses at the ``as_of`` date or datetime of the query string.
+    A date covers the whole day, so it sees every price set on it.
+    """
+
+    def get_as_of(self):
+        value = self.request.query_params.get('as_of')
+        if not value or self.request.method != 'GET':
+            return None
+        try:
+            as_of = parse_datetime(value)
+            if as_of is None and (day := parse_date(value)):
+                as_of = datetime.combine(day, time.max)
+        except ValueError:
+            as_of = None
+        if as_of is None:
+            raise exceptions.ValidationError(
+                {'as_of': 'Fecha inválida, use AAAA-MM-DD o una fecha ISO 8601.'})
+        return make_aware(as_of) if is_naive(as_of) else as_of
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        as_of = self.get_as_of()
+        return queryset if as_of is None else self.price_queryset(queryset, as_of)
+
+    def price_queryset(self, queryset, as_of):
+        return queryset.with_price_as_of(as_of)
+
+
+class UnitViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Unit.objects.all()
+    pagination_class = NamePagination
     serializer_class = UnitSerializer
 
 
-class DatabaseViewSet(viewsets.ModelViewSet):
+class DatabaseViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Database.objects.all()
+    pagination_class = CodePagination
     serializer_class = DatabaseSerializer
 
+    @action(detail=True, methods=['post'], url_path='import',
+            parser_classes=[MultiPartParser, FormParser])
+    def import_catalog(self, request, pk=None):
+        """Imports a CSV or JSON-lines catalog file into this database."""
+        database = self.get_object()
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'file': 'Debe adjuntar un archivo.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        file_format = request.data.get('format') or detect_format(upload.name)
+        if file_format not in FORMATS:
+            return Response({'format': f'Formato no soportado: {file_format}.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        if prefers_async(request):
+            job = enqueue('databases.import_catalog', {'database_id': database.pk, 'file_format': file_format},
+                          user=request.user, attachment=upload)
+            return job_accepted(request, job)
+
+        result = import_catalog(database, upload.file, file_format)
+        return Response(result.as_dict(), status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get'])
+    def search(self, request, pk=None):
+        """Ranks materials, labor, equipment and work items matching ``q``."""
+        database = self.get_object()
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'q': 'Debe indicar un texto de búsqueda.'},
+                            status=status.HTTP_400_BAD_REQUEST)
 
-class MaterialViewSet(viewsets.ModelViewSet):
+        resource_types = request.query_params.getlist('type') or None
+        invalid_types = set(resource_types or []) - set(search.SEARCH_MODELS)
+        if invalid_types:
+            return Response({'type': f'Tipos no soportados: {sorted(invalid_types)}.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(int(request.query_params.get('limit', search.DEFAULT_LIMIT)), search.MAX_LIMIT)
+        except ValueError:
+            limit = search.DEFAULT_LIMIT
+
+        results = search.get_backend().search(database, query, resource_types, limit)
+        return Response(results)
+
+    @action(detail=True, methods=['get'])
+    def autocomplete(self, request, pk=None):
+        """Suggests resource codes starting with ``prefix`` from the in-memory index."""
+        # The index is keyed by the URL id so warm lookups never query the database
+        prefix = request.query_params.get('prefix', '').strip()
+        if not prefix:
+            return Response([])
+        try:
+            database_id = uuid.UUID(pk)
+            limit = min(int(request.query_params.get('limit', autocomplete.DEFAULT_LIMIT)),
+                        autocomplete.MAX_LIMIT)
+        except ValueError:
+            return Response({'detail': 'Parámetros inválidos.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        resource_types = set(request.query_params.getlist('type')) or None
+        index = autocomplete.registry.get(database_id)
+        return Response(index.lookup(prefix, resource_types, limit))
+
+    @action(detail=True, methods=['post'])
+    def clone(self, request, pk=None):
+        """Copies this database with all its resources and work items."""
+        source = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if prefers_async(request):
+            fields = {name: value for name, value in serializer.validated_data.items() if name != 'user'}
+            job = enqueue('databases.clone', {'database_id': source.pk, 'fields': fields}, user=request.user)
+            return job_accepted(request, job)
+
+        database, timings = clone_database(source, **serializer.validated_data)
+        data = self.get_serializer(database).data
+        return Response({**data, 'timings': timings}, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'])
+    def reprice(self, request, pk=None):
+        """Adjusts resource prices by a percentage, optionally filtered by code prefix."""
+        database = self.get_object()
+        serializer = RepriceSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        arguments = {
+            'percentage': serializer.validated_data['percentage'],
+            'resource_types': sorted(serializer.validated_data.get('resource_types', [])),
+            'code_prefix': serializer.validated_data.get('code_prefix'),
+        }
+        if prefers_async(request):
+            job = enqueue('databases.reprice', {'database_id': database.pk, **arguments}, user=request.user)
+            return job_accepted(request, job)
+
+        result = reprice_database(database, **arguments)
+        return Response(result)
+
+    @action(detail=True, methods=['get'])
+    def changes(self, request, pk=None):
+        """Resources and work items of this database changed after the ``since`` cursor."""
+        database = self.get_object()
+        sources = [
+            SyncSource('material', Material.all_objects.filter(database=database)),
+            SyncSource('labor', Labor.all_objects.filter(database=database)),
+            SyncSource('equipment', Equipment.all_objects.filter(database=database)),
+            SyncSource('work_item', WorkItem.all_objects.filter(database=database),
+                       many_to_many=('material', 'labor', 'equipment')),
+        ]
+        return Response(collect_changes(sources, request.query_params.get('since'), sync_limit(request)))
+
+    @action(detail=True, methods=['get'], renderer_classes=[CSVRenderer, NDJSONRenderer])
+    def export(self, request, pk=None):
+        """Streams every resource and work item of this database as CSV or JSON lines."""
+        database = self.get_object()
+        renderer = request.accepted_renderer
+        compress = accepts_gzip(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+
+        response = StreamingHttpResponse(
+            stream_catalog(database, renderer.format, compress=compress),
+            content_type=renderer.media_type,
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{database.code}.{renderer.format}"')
+        if compress:
+            response['Content-Encoding'] = 'gzip'
+        response['Vary'] = 'Accept-Encoding'
+        return response
+
+
+class MaterialViewSet(ConditionalGetMixin, PriceAsOfMixin, BulkUpsertMixin, viewsets.ModelViewSet):
+    bulk_row_type = 'material'
     queryset = Material.objects.all()
+    pagination_class = CodePagination
     serializer_class = MaterialSerializer
 
 
-class EquipmentViewSet(viewsets.ModelViewSet):
+class EquipmentViewSet(ConditionalGetMixin, PriceAsOfMixin, BulkUpsertMixin, viewsets.ModelViewSet):
+    bulk_row_type = 'equipment'
     queryset = Equipment.objects.all()
+    pagination_class = CodePagination
     serializer_class = EquipmentSerializer
 
 
-class LaborViewSet(viewsets.ModelViewSet):
+class LaborViewSet(ConditionalGetMixin, PriceAsOfMixin, BulkUpsertMixin, viewsets.ModelViewSet):
+    bulk_row_type = 'labor'
     queryset = Labor.objects.all()
+    pagination_class = CodePagination
     serializer_class = LaborSerializer
 
 
-class WorkItemViewSet(viewsets.ModelViewSet):
+class WorkItemViewSet(ConditionalGetMixin, PriceAsOfMixin, viewsets.ModelViewSet):
     queryset = WorkItem.objects.all()
+    pagination_class = CodePagination
     serializer_class = WorkItemSerializer
 
     def get_serializer_class(self):
@@ -48,10 +259,18 @@ class WorkItemViewSet(viewsets.ModelViewSet):
             return WorkItemUpdateSerializer
         return self.serializer_class
 
+    def price_queryset(self, queryset, as_of):
+        # Nested resources are priced by the same prefetch, one query per relation
+        return queryset.with_cost_totals(as_of).prefetch_related(
+            Prefetch('material', queryset=Material.objects.with_price_as_of(as_of)),
+            Prefetch('labor', queryset=Labor.objects.with_price_as_of(as_of)),
+            Prefetch('equipment', queryset=Equipment.objects.with_price_as_of(as_of)),
+        )
+
     def update(self, request, *args, **kwargs):
         print("Entrando al método UPDATE de WorkItemViewSet")
         return super().update(request, *args, **kwargs)
 
     def get_object(self):
         # Asegúrate de que obtienes la instancia de WorkItem correctamente
-        return self.queryset.get(id=self.kwargs['pk'])
+        return self.get_queryset().get(id=self.kwargs['pk'])
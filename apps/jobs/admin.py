@@ -0,0 +1,11 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('task', 'status', 'priority', 'attempts', 'progress', 'user', 'created_at')
+    list_filter = ('status', 'task')
+    search_fields = ('task', 'error')
+    ordering = ('-created_at',)
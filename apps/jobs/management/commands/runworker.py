@@ -0,0 +1,85 @@
+import os
+import signal
+import socket
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from apps.jobs.queue import claim_job, run_job
+
+
+class Command(BaseCommand):
+    help = 'Runs queued background jobs, claiming them from the jobs table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=settings.JOBS_CONCURRENCY,
+            help='Number of jobs run at the same time, each in its own thread.',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=settings.JOBS_POLL_SECONDS,
+            help='Seconds to wait before looking for jobs again when the queue is empty.',
+        )
+        parser.add_argument(
+            '--burst',
+            action='store_true',
+            help='Exit once no job is ready to run instead of waiting for more.',
+        )
+
+    def handle(self, *args, **options):
+        concurrency = options['concurrency']
+        if concurrency < 1:
+            raise CommandError('--concurrency must be at least 1.')
+        self.stopping = threading.Event()
+        worker_id = f'{socket.gethostname()}:{os.getpid()}'
+
+        if concurrency == 1:
+            # A single slot runs in this thread, so Ctrl+C interrupts the job itself
+            processed = self._work(f'{worker_id}:0', options)
+        else:
+            signal.signal(signal.SIGTERM, lambda *_: self.stopping.set())
+            results = [0] * concurrency
+            threads = [
+                threading.Thread(target=self._thread, args=(f'{worker_id}:{slot}', options, results, slot))
+                for slot in range(concurrency)
+            ]
+            for thread in threads:
+                thread.start()
+            try:
+                for thread in threads:
+                    while thread.is_alive():
+                        thread.join(timeout=1)
+            except KeyboardInterrupt:
+                self.stdout.write('Stopping once the running jobs finish...')
+                self.stopping.set()
+                for thread in threads:
+                    thread.join()
+            processed = sum(results)
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} jobs.'))
+
+    def _thread(self, slot_id, options, results, slot):
+        try:
+            results[slot] = self._work(slot_id, options)
+        finally:
+            # Each thread opened its own connection
+            connection.close()
+
+    def _work(self, slot_id, options):
+        processed = 0
+        while not self.stopping.is_set():
+            job = claim_job(slot_id)
+            if job is None:
+                if options['burst']:
+                    break
+                self.stopping.wait(options['poll_interval'])
+                continue
+            self.stdout.write(f'{slot_id} running {job.task} {job.pk} (attempt {job.attempts}/{job.max_attempts})')
+            run_job(job)
+            processed += 1
+        return processed
@@ -0,0 +1,139 @@
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.utils.timezone import now
+
+from apps.users.models import User
+from utils.models import BaseModel
+
+
+class JobFilesStorage(FileSystemStorage):
+    """Files under ``JOBS_FILES_ROOT``, read on every use rather than when models load."""
+
+    @property
+    def base_location(self):
+        return settings.JOBS_FILES_ROOT
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
+
+
+def job_files_storage():
+    """Storage of the files uploaded with jobs, which every worker must be able to read."""
+    return JobFilesStorage()
+
+
+class Job(BaseModel):
+    """
+    A unit of background work: the name of a registered task and the
+    arguments it is called with, claimed and run by ``runworker``.
+    """
+    class Status(models.TextChoices):
+        QUEUED = 'QUEUED', 'Queued'
+        RUNNING = 'RUNNING', 'Running'
+        SUCCEEDED = 'SUCCEEDED', 'Succeeded'
+        FAILED = 'FAILED', 'Failed'
+
+    task = models.CharField(
+        max_length=100
+    )
+    payload = models.JSONField(
+        default=dict,
+        encoder=DjangoJSONEncoder
+    )
+    attachment = models.FileField(
+        storage=job_files_storage,
+        upload_to='%Y/%m/%d',
+        null=True,
+        blank=True
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.QUEUED
+    )
+    # Higher priorities run first
+    priority = models.SmallIntegerField(
+        default=0
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0
+    )
+    max_attempts = models.PositiveSmallIntegerField(
+        default=3
+    )
+    run_after = models.DateTimeField(
+        default=now
+    )
+    locked_by = models.CharField(
+        max_length=100,
+        blank=True
+    )
+    locked_until = models.DateTimeField(
+        null=True,
+        blank=True
+    )
+    progress = models.PositiveSmallIntegerField(
+        default=0
+    )
+    progress_message = models.CharField(
+        max_length=255,
+        blank=True
+    )
+    result = models.JSONField(
+        null=True,
+        blank=True,
+        encoder=DjangoJSONEncoder
+    )
+    error = models.TextField(
+        blank=True
+    )
+    started_at = models.DateTimeField(
+        null=True,
+        blank=True
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='jobs'
+    )
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Claim order of runnable jobs
+            models.Index(fields=['status', '-priority', 'run_after']),
+            models.Index(fields=['user', '-created_at', '-id']),
+        ]
+
+    def __str__(self):
+        return f"{self.task} ({self.status})"
+
+    def report_progress(self, percent, message=''):
+        """Records how far the running task got, which also extends the worker's lease."""
+        self.progress = max(0, min(100, int(percent)))
+        self.progress_message = message[:255]
+        Job.objects.filter(pk=self.pk, locked_by=self.locked_by).update(
+            progress=self.progress,
+            progress_message=self.progress_message,
+            locked_until=now() + timedelta(seconds=settings.JOBS_LEASE_SECONDS),
+            updated_at=now(),
+        )
+
+    def extend_lease(self):
+        """Keeps the job claimed by its worker for another ``JOBS_LEASE_SECONDS``."""
+        return Job.objects.filter(pk=self.pk, locked_by=self.locked_by, status=Job.Status.RUNNING).update(
+            locked_until=now() + timedelta(seconds=settings.JOBS_LEASE_SECONDS),
+            updated_at=now(),
+        )
@@ -0,0 +1,158 @@
+"""
+Job queue stored in the application database.
+
+``enqueue`` inserts a job row. Workers claim the runnable job with the
+highest priority in a short transaction: where the backend supports it the
+candidate row is read with ``SELECT ... FOR UPDATE SKIP LOCKED``, so
+concurrent workers never wait on each other. The claim itself is a
+conditional UPDATE that only succeeds while the job is still runnable, which
+is all SQLite needs, as it serializes writers anyway.
+
+A claimed job holds a lease. While the task runs, a heartbeat thread with its
+own connection extends the lease every ``JOBS_HEARTBEAT_SECONDS``, however
+long a single step of the task takes; progress reports extend it too. A job
+whose lease expired, because its worker died, is claimed again until it runs
+out of attempts. Failed attempts are retried with an exponential backoff.
+"""
+import logging
+import threading
+import traceback
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F, Q
+from django.utils.timezone import now
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+LEASE_EXPIRED_MESSAGE = 'El trabajador dejó de responder.'
+UNKNOWN_TASK_MESSAGE = 'Tarea desconocida: {task}.'
+
+_tasks = {}
+
+
+def register(name):
+    """Registers the decorated function as the task ``name``, called with the job and its payload."""
+    def decorator(function):
+        _tasks[name] = function
+        return function
+    return decorator
+
+
+def get_task(name):
+    return _tasks.get(name)
+
+
+def enqueue(task, payload=None, *, user=None, priority=0, max_attempts=None, attachment=None):
+    """Queues a run of ``task`` with ``payload``, plus an uploaded ``attachment`` when given."""
+    if task not in _tasks:
+        raise ValueError(UNKNOWN_TASK_MESSAGE.format(task=task))
+    job = Job(
+        task=task,
+        payload=payload or {},
+        user=user,
+        priority=priority,
+        max_attempts=max_attempts or settings.JOBS_MAX_ATTEMPTS,
+    )
+    if attachment is not None:
+        job.attachment.save(attachment.name, attachment, save=False)
+    job.save()
+    return job
+
+
+def _runnable(moment):
+    return Q(status=Job.Status.QUEUED, run_after__lte=moment) | Q(status=Job.Status.RUNNING, locked_until__lt=moment)
+
+
+def _fail_expired(moment):
+    """Fails the jobs whose lease expired on their last attempt."""
+    Job.objects.filter(
+        status=Job.Status.RUNNING, locked_until__lt=moment, attempts__gte=F('max_attempts')
+    ).update(status=Job.Status.FAILED, error=LEASE_EXPIRED_MESSAGE, finished_at=moment, updated_at=moment)
+
+
+def claim_job(worker_id):
+    """Claims the next runnable job for ``worker_id``, or returns None when there is none."""
+    while True:
+        moment = now()
+        _fail_expired(moment)
+        with transaction.atomic():
+            candidates = Job.objects.filter(_runnable(moment)).order_by('-priority', 'run_after', 'created_at')
+            if connection.features.has_select_for_update_skip_locked:
+                candidates = candidates.select_for_update(skip_locked=True)
+            job_id = candidates.values_list('pk', flat=True).first()
+            if job_id is None:
+                return None
+            claimed = Job.objects.filter(_runnable(moment), pk=job_id).update(
+                status=Job.Status.RUNNING,
+                locked_by=worker_id,
+                locked_until=moment + timedelta(seconds=settings.JOBS_LEASE_SECONDS),
+                attempts=F('attempts') + 1,
+                started_at=moment,
+                updated_at=moment,
+            )
+        if claimed:
+            return Job.objects.get(pk=job_id)
+        # Another worker claimed it between the read and the update
+
+
+def _finish(job, **fields):
+    """Writes the outcome of a run, unless the job was claimed again after its lease expired."""
+    fields.setdefault('locked_until', None)
+    fields['updated_at'] = now()
+    return Job.objects.filter(pk=job.pk, locked_by=job.locked_by, status=Job.Status.RUNNING).update(**fields)
+
+
+@contextmanager
+def _heartbeat(job):
+    """Extends the lease of ``job`` from another thread until the block exits."""
+    stopped = threading.Event()
+
+    def beat():
+        try:
+            while not stopped.wait(settings.JOBS_HEARTBEAT_SECONDS):
+                try:
+                    job.extend_lease()
+                except DatabaseError:
+                    # On SQLite a long write by the task holds the lock; the next beat retries
+                    logger.warning('Could not extend the lease of job %s', job.pk, exc_info=True)
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=beat, name=f'heartbeat-{job.pk}', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def run_job(job):
+    """Runs a claimed job and records its result, or schedules a retry when it fails."""
+    task = get_task(job.task)
+    if task is None:
+        _finish(job, status=Job.Status.FAILED, error=UNKNOWN_TASK_MESSAGE.format(task=job.task), finished_at=now())
+        return
+
+    try:
+        with _heartbeat(job):
+            result = task(job, **job.payload)
+    except Exception:  # pylint: disable=broad-except
+        error = traceback.format_exc()
+        logger.exception('Job %s (%s) failed on attempt %s', job.pk, job.task, job.attempts)
+        if job.attempts < job.max_attempts:
+            delay = settings.JOBS_RETRY_DELAY_SECONDS * 2 ** (job.attempts - 1)
+            _finish(job, status=Job.Status.QUEUED, error=error, run_after=now() + timedelta(seconds=delay))
+            return
+        finished = _finish(job, status=Job.Status.FAILED, error=error, finished_at=now())
+    else:
+        finished = _finish(job, status=Job.Status.SUCCEEDED, result=result, error='', progress=100, finished_at=now())
+
+    if finished and job.attachment:
+        job.attachment.delete(save=False)
+        Job.objects.filter(pk=job.pk).update(attachment=None)
@@ -0,0 +1,26 @@
+"""
+Asynchronous variants of long-running API actions.
+
+A client sending ``Prefer: respond-async`` (RFC 7240) gets ``202 Accepted``
+with the queued job and its status URL in ``Location``, instead of waiting
+for the work to finish within the request.
+"""
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.response import Response
+
+from .serializers.serializers import JobSerializer
+
+
+def prefers_async(request):
+    preferences = request.headers.get('Prefer', '')
+    return any(preference.strip().lower() == 'respond-async' for preference in preferences.split(','))
+
+
+def job_accepted(request, job):
+    """``202 Accepted`` pointing at the status of ``job``."""
+    location = request.build_absolute_uri(reverse('job-detail', kwargs={'pk': job.pk}))
+    response = Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+    response['Location'] = location
+    response['Preference-Applied'] = 'respond-async'
+    return response
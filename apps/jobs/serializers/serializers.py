@@ -0,0 +1,26 @@
+from rest_framework import serializers
+
+from apps.jobs.models import Job
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """Serializer for the status of a Job"""
+
+    class Meta:
+        model = Job
+        fields = (
+            'id',
+            'task',
+            'status',
+            'priority',
+            'attempts',
+            'max_attempts',
+            'progress',
+            'progress_message',
+            'result',
+            'error',
+            'created_at',
+            'started_at',
+            'finished_at',
+        )
+        read_only_fields = fields
@@ -0,0 +1,231 @@
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from django.utils.timezone import now
+from rest_framework import status
+
+from apps.budgets.models import Budget
+from apps.databases.models import Database, Material, Unit
+from apps.jobs.models import Job
+from apps.jobs.queue import claim_job, enqueue, register, run_job
+from utils.tests import BaseTestCase
+
+calls = []
+
+
+@register('tests.echo')
+def echo(job, value):
+    job.report_progress(50, 'A medio camino')
+    calls.append(value)
+    return {'value': value}
+
+
+@register('tests.flaky')
+def flaky(job, failures):
+    if job.attempts <= failures:
+        raise RuntimeError(f'attempt {job.attempts} failed')
+    return {'attempts': job.attempts}
+
+
+heartbeats = threading.Event()
+
+
+@register('tests.slow')
+def slow(job):
+    # Never reports progress, so only the heartbeat keeps the lease
+    return {'beat': heartbeats.wait(timeout=5)}
+
+
+def run_worker(*args):
+    call_command('runworker', '--burst', *args, stdout=StringIO())
+
+
+class JobQueueTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        calls.clear()
+
+    def test_claims_by_priority_then_age(self):
+        low = enqueue('tests.echo', {'value': 'low'})
+        high = enqueue('tests.echo', {'value': 'high'}, priority=5)
+        later = enqueue('tests.echo', {'value': 'later'}, priority=5)
+
+        self.assertEqual([claim_job('worker').pk for _ in range(3)], [high.pk, later.pk, low.pk])
+        self.assertIsNone(claim_job('worker'))
+
+    def test_run_records_result_and_progress(self):
+        job = enqueue('tests.echo', {'value': 1})
+        run_job(claim_job('worker'))
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.SUCCEEDED)
+        self.assertEqual(job.result, {'value': 1})
+        self.assertEqual(job.progress, 100)
+        self.assertEqual(job.progress_message, 'A medio camino')
+        self.assertEqual(job.attempts, 1)
+
+    def test_failed_attempts_are_retried_later(self):
+        job = enqueue('tests.flaky', {'failures': 1})
+        with self.assertLogs('apps.jobs.queue', 'ERROR'):
+            run_job(claim_job('worker'))
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.QUEUED)
+        self.assertIn('attempt 1 failed', job.error)
+        self.assertGreater(job.run_after, now())
+        self.assertIsNone(claim_job('worker'))
+
+        Job.objects.filter(pk=job.pk).update(run_after=now())
+        run_job(claim_job('worker'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.SUCCEEDED)
+        self.assertEqual(job.result, {'attempts': 2})
+
+    def test_jobs_fail_after_their_last_attempt(self):
+        job = enqueue('tests.flaky', {'failures': 5}, max_attempts=1)
+        with self.assertLogs('apps.jobs.queue', 'ERROR'):
+            run_job(claim_job('worker'))
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_expired_leases_are_claimed_again(self):
+        job = enqueue('tests.echo', {'value': 1}, max_attempts=2)
+        claim_job('dead-worker')
+        Job.objects.filter(pk=job.pk).update(locked_until=now() - timedelta(seconds=1))
+
+        claimed = claim_job('worker')
+        self.assertEqual((claimed.pk, claimed.attempts), (job.pk, 2))
+
+        # The first worker can no longer record an outcome
+        Job.objects.filter(pk=job.pk).update(locked_until=now() - timedelta(seconds=1))
+        self.assertIsNone(claim_job('worker'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.FAILED)
+
+    def test_running_jobs_keep_their_lease_without_reporting_progress(self):
+        enqueue('tests.slow')
+        heartbeats.clear()
+
+        with override_settings(JOBS_HEARTBEAT_SECONDS=0.01), \
+                mock.patch.object(Job, 'extend_lease', autospec=True, side_effect=lambda job: heartbeats.set()):
+            run_job(claim_job('worker'))
+
+        self.assertEqual(Job.objects.get().result, {'beat': True})
+
+    def test_extend_lease_only_applies_to_the_claiming_worker(self):
+        job = enqueue('tests.echo', {'value': 1})
+        claimed = claim_job('worker')
+        Job.objects.filter(pk=job.pk).update(locked_until=now() + timedelta(seconds=1))
+
+        self.assertEqual(claimed.extend_lease(), 1)
+        job.refresh_from_db()
+        self.assertGreater(job.locked_until, now() + timedelta(seconds=60))
+
+        claimed.locked_by = 'other-worker'
+        self.assertEqual(claimed.extend_lease(), 0)
+
+    def test_unknown_tasks_are_rejected(self):
+        with self.assertRaises(ValueError):
+            enqueue('tests.missing')
+
+    def test_runworker_processes_the_queue(self):
+        for value in range(3):
+            enqueue('tests.echo', {'value': value})
+
+        run_worker('--concurrency', '1')
+
+        self.assertEqual(sorted(calls), [0, 1, 2])
+        self.assertFalse(Job.objects.exclude(status=Job.Status.SUCCEEDED).exists())
+
+    def test_status_endpoint_is_scoped_to_the_user(self):
+        job = enqueue('tests.echo', {'value': 1}, user=self.user)
+        other = enqueue('tests.echo', {'value': 2})
+
+        response = self.client.get(reverse('job-detail', kwargs={'pk': job.pk}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], Job.Status.QUEUED)
+        self.assertEqual(
+            self.client.get(reverse('job-detail', kwargs={'pk': other.pk})).status_code,
+            status.HTTP_404_NOT_FOUND)
+
+
+class AsyncActionTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        files_root = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(files_root.cleanup)
+        settings_override = override_settings(JOBS_FILES_ROOT=files_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.database = Database.objects.create(
+            code='DB001',
+            name='Test Database',
+            description='Test Description',
+            user=self.user
+        )
+        Unit.objects.create(name='Kilogramo', symbol='kg')
+
+    def _follow(self, response):
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], Job.Status.QUEUED)
+        run_worker()
+        return self.client.get(response['Location'])
+
+    def test_import_returns_202_and_runs_in_the_worker(self):
+        upload = SimpleUploadedFile('catalog.csv', b'type,code,description,unit,cost\nmaterial,MT001,Cement,kg,10.50\n')
+        response = self.client.post(
+            reverse('database-import-catalog', kwargs={'pk': self.database.id}),
+            {'file': upload}, format='multipart', HTTP_PREFER='respond-async')
+        self.assertFalse(Material.objects.exists())
+
+        status_response = self._follow(response)
+
+        self.assertEqual(status_response.data['status'], Job.Status.SUCCEEDED)
+        self.assertEqual(status_response.data['result']['created']['material'], 1)
+        self.assertTrue(Material.objects.filter(code='MT001', database=self.database).exists())
+        self.assertFalse(Job.objects.get().attachment)
+
+    def test_reprice_returns_202(self):
+        Material.objects.create(
+            code='MT001', description='Cement', unit=Unit.objects.get(), cost=Decimal('10.00'),
+            database=self.database)
+
+        response = self.client.post(
+            reverse('database-reprice', kwargs={'pk': self.database.id}),
+            {'percentage': '10'}, format='json', HTTP_PREFER='respond-async')
+
+        self.assertEqual(self._follow(response).data['result']['updated']['material'], 1)
+        self.assertEqual(Material.objects.get().cost, Decimal('11.00'))
+
+    def test_budget_calculation_returns_202(self):
+        budget = Budget.objects.create(
+            code='BG001',
+            contract='CT001',
+            budget_date='2025-01-01',
+            name='Test Budget',
+            owner='Owner',
+            calculated_by='Engineer',
+            user=self.user
+        )
+
+        response = self.client.get(
+            reverse('budget-calculate', kwargs={'pk': budget.id}), HTTP_PREFER='respond-async')
+
+        self.assertEqual(self._follow(response).data['result']['totals']['total'], '0.00')
+
+    def test_requests_without_the_preference_stay_synchronous(self):
+        response = self.client.post(
+            reverse('database-reprice', kwargs={'pk': self.database.id}), {'percentage': '10'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(Job.objects.exists())
@@ -48,6 +48,7 @@ MY_APPS = [
     "apps.budgets",
     "apps.companies",
     "apps.databases",
+    "apps.jobs",
 ]
 
 THIRD_APPS = [
@@ -83,6 +84,52 @@ REST_FRAMEWORK = {
     ),
 }
 
+# Cached values live in each process, but the version stamps invalidating them
+# (utils.versioning) are shared by every web and job worker: in Redis when
+# REDIS_URL is set, which needs the redis package, or else in the database
+# table created by ``manage.py createcachetable``
+REDIS_URL = os.getenv("REDIS_URL")
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "versions": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_URL,
+        "TIMEOUT": None,
+    } if REDIS_URL else {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "version_stamps",
+        "TIMEOUT": None,
+        "OPTIONS": {"MAX_ENTRIES": 1000000},
+    },
+}
+
+# Keyset pagination of list endpoints; clients may ask for up to MAX_PAGE_SIZE rows
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "500"))
+
+# Delta sync holds back rows this recent, so transactions still committing are not skipped
+SYNC_LAG_SECONDS = int(os.getenv("SYNC_LAG_SECONDS", "5"))
+
+# Maximum number of codes kept by the in-process autocomplete indexes
+AUTOCOMPLETE_MAX_ENTRIES = int(os.getenv("AUTOCOMPLETE_MAX_ENTRIES", "1000000"))
+
+# Background jobs run by ``manage.py runworker``. Workers extend the lease of
+# their running jobs every JOBS_HEARTBEAT_SECONDS; a job whose lease runs out
+# is considered abandoned and claimed again
+JOBS_CONCURRENCY = int(os.getenv("JOBS_CONCURRENCY", "1"))
+JOBS_POLL_SECONDS = float(os.getenv("JOBS_POLL_SECONDS", "1"))
+JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", "3"))
+JOBS_RETRY_DELAY_SECONDS = int(os.getenv("JOBS_RETRY_DELAY_SECONDS", "30"))
+JOBS_LEASE_SECONDS = int(os.getenv("JOBS_LEASE_SECONDS", "600"))
+JOBS_HEARTBEAT_SECONDS = float(os.getenv("JOBS_HEARTBEAT_SECONDS", "60"))
+# Uploads waiting for a job, on storage shared with every worker
+JOBS_FILES_ROOT = os.getenv("JOBS_FILES_ROOT", str(BASE_DIR / "var" / "jobs"))
+
+# Budgets with more work items than this get their reports from a background job
+BUDGET_REPORT_SYNC_LIMIT = int(os.getenv("BUDGET_REPORT_SYNC_LIMIT", "1000"))
+
 SWAGGER_SETTINGS = {
     'SECURITY_DEFINITIONS': {
         'Bearer': {
@@ -48,5 +48,6 @@ urlpatterns = [
     path("api/token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
     path("api/v1/companies/", include("apps.companies.urls")),
     path("api/v1/databases/", include("apps.databases.urls")),
+    path("api/v1/jobs/", include("apps.jobs.urls")),
     path("api/v1/", include("apps.budgets.urls")),
 ]
@@ -0,0 +1,120 @@
+"""
+Conditional GET (``ETag`` / ``Last-Modified``) for model viewsets.
+
+A response is fully determined by the rows it is built from: the scoped
+queryset and the rows of every model its serializer nests. Each of those
+rows moves its indexed ``updated_at`` when it is written or soft-deleted, so
+the validators come from a single aggregate query: the number of rows the
+list or detail matches plus the latest ``updated_at`` of every table
+involved, the deleted rows included. A request whose ``If-None-Match`` or
+``If-Modified-Since`` still matches is answered with ``304 Not Modified``
+before anything is fetched or serialized.
+"""
+import hashlib
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max, Subquery
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+from django.utils.timezone import now
+from rest_framework import serializers
+
+COUNT_KEY = 'count'
+
+
+def embedded_models(serializer, models=None):
+    """Models of ``serializer`` and of every serializer nested in it."""
+    models = {} if models is None else models
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    if not isinstance(serializer, serializers.ModelSerializer):
+        return models
+    model = serializer.Meta.model
+    if model._meta.label not in models:
+        models[model._meta.label] = model
+        for field in serializer.fields.values():
+            if not field.write_only:
+                embedded_models(field, models)
+        # Models read by method fields, such as computed totals
+        for related in getattr(serializer.Meta, 'derived_from', ()):
+            models.setdefault(related._meta.label, related)
+    return models
+
+
+def latest_update(model):
+    """Newest ``updated_at`` of ``model``, soft-deleted rows included."""
+    return Subquery(model._base_manager.order_by('-updated_at').values('updated_at')[:1])
+
+
+def touch_many_to_many_owners(model, field_name, instance, action, reverse, pk_set):
+    """
+    Moves ``updated_at`` of the ``model`` rows whose ``field_name`` set changed,
+    for ``m2m_changed`` receivers: links carry no timestamp of their own.
+    """
+    if reverse and action == 'pre_clear':
+        # Reverse clears do not report the affected rows afterwards
+        instance._touched_owner_ids = list(
+            model._base_manager.filter(**{field_name: instance}).values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        ids = [instance.pk]
+    elif action == 'post_clear':
+        ids = instance.__dict__.pop('_touched_owner_ids', [])
+    else:
+        ids = pk_set
+    model._base_manager.filter(pk__in=ids).update(updated_at=now())
+
+
+class ConditionalGetMixin:
+    """Answers ``list`` and ``retrieve`` with validators, or 304 when they still match."""
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.conditional_response(queryset, super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            queryset = self.filter_queryset(self.get_queryset()).filter(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (TypeError, ValueError, ValidationError):
+            # Malformed lookups are left to get_object, which answers 404
+            return super().retrieve(request, *args, **kwargs)
+        return self.conditional_response(queryset, super().retrieve, request, *args, **kwargs)
+
+    def get_validators(self, queryset):
+        """The weak ETag and the ``Last-Modified`` time of ``queryset``'s response."""
+        models = embedded_models(self.get_serializer())
+        models.setdefault(queryset.model._meta.label, queryset.model)
+        values = queryset.order_by().aggregate(**{COUNT_KEY: Count('pk')}, **{
+            label: Max(latest_update(model)) for label, model in models.items()
+        })
+
+        request = self.request
+        state = [
+            type(self).__qualname__,
+            self.action,
+            request.get_full_path(),
+            request.accepted_media_type,
+            str(request.user.pk),
+            *(f'{key}={value}' for key, value in sorted(values.items())),
+        ]
+        etag = 'W/' + quote_etag(hashlib.md5('\n'.join(state).encode(), usedforsecurity=False).hexdigest())
+        timestamps = [value for key, value in values.items() if key != COUNT_KEY and value]
+        return etag, max(timestamps) if timestamps else None
+
+    def conditional_response(self, queryset, view, request, *args, **kwargs):
+        etag, last_modified = self.get_validators(queryset)
+        last_modified = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = view(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
@@ -20,7 +20,7 @@ class BaseModel(models.Model):  # noqa: R0903
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     deleted_at = models.DateTimeField(null=True, blank=True)
 
     objects = SoftDeleteManager()  # Only shows active objects
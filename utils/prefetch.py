@@ -0,0 +1,33 @@
+"""
+Declared ``select_related`` and ``prefetch_related`` plans per viewset action.
+
+A plan names every relation the serializer of an action walks, so its
+response is built from a fixed number of queries however many rows it
+holds. Actions without a plan, such as those reading their own querysets,
+get the bare queryset.
+"""
+
+
+class PrefetchPlan:
+    """Relations joined with ``select_related`` and fetched with ``prefetch_related``."""
+
+    def __init__(self, select_related=(), prefetch_related=()):
+        self.select_related = tuple(select_related)
+        self.prefetch_related = tuple(prefetch_related)
+
+    def apply(self, queryset):
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+        return queryset
+
+
+class PrefetchPlanMixin:
+    """Applies the plan ``prefetch_plans`` declares for the current action."""
+    prefetch_plans = {}
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        plan = self.prefetch_plans.get(self.action)
+        return plan.apply(queryset) if plan else queryset
@@ -0,0 +1,129 @@
+"""
+EXPLAIN-based audit of querysets.
+
+``audit_queryset`` runs the backend's EXPLAIN on a queryset and flags the
+steps that grow with the table: full scans and temporary sort B-trees in
+SQLite's ``EXPLAIN QUERY PLAN``, sequential scans and sorts on PostgreSQL.
+When the queryset's own table is scanned or sorted it suggests an index made
+of the equality filters of the WHERE clause followed by the ordering, which
+is the shape a scoped lookup or a keyset page can seek on. Other backends
+only get their raw plan.
+"""
+import re
+
+from django.db import connections
+from django.db.models.expressions import Col
+from django.db.models.lookups import Lookup
+from django.db.models.sql.where import AND, WhereNode
+
+SQLITE_SCAN = re.compile(r'^SCAN (?P<table>\S+)(?P<index> USING (?:COVERING )?INDEX)?')
+SQLITE_TEMP_BTREE = re.compile(r'^USE TEMP B-TREE FOR (?P<purpose>.+)$')
+POSTGRES_SEQ_SCAN = re.compile(r'Seq Scan on (?P<table>\S+)')
+POSTGRES_SORT = re.compile(r'^\s*(?:->\s*)?Sort\b')
+
+EQUALITY_LOOKUPS = {'exact', 'in', 'isnull'}
+# Every soft-deleted table filters on it, and it is too unselective to lead an index
+IGNORED_COLUMNS = {'deleted_at'}
+
+
+def _sqlite_plan(lines):
+    # Rows are "id parent notused detail"
+    return [line.split(' ', 3)[-1] for line in lines]
+
+
+def _sqlite_findings(plan):
+    findings = []
+    for step in plan:
+        if (match := SQLITE_SCAN.match(step)) and not match.group('index'):
+            findings.append({'kind': 'full_scan', 'table': match.group('table'), 'detail': step})
+        elif match := SQLITE_TEMP_BTREE.match(step):
+            findings.append({'kind': 'temp_btree', 'table': None, 'detail': step})
+    return findings
+
+
+def _postgres_findings(plan):
+    findings = []
+    for step in plan:
+        if match := POSTGRES_SEQ_SCAN.search(step):
+            findings.append({'kind': 'full_scan', 'table': match.group('table'), 'detail': step.strip()})
+        elif POSTGRES_SORT.match(step):
+            findings.append({'kind': 'temp_btree', 'table': None, 'detail': step.strip()})
+    return findings
+
+
+def explain_queryset(queryset):
+    """The plan steps of ``queryset`` and the findings among them."""
+    vendor = connections[queryset.db].vendor
+    lines = queryset.explain().splitlines()
+    if vendor == 'sqlite':
+        plan = _sqlite_plan(lines)
+        return plan, _sqlite_findings(plan)
+    if vendor == 'postgresql':
+        return lines, _postgres_findings(lines)
+    return lines, []
+
+
+def _equality_fields(node, alias):
+    """Fields of the base table compared for equality in the AND-ed WHERE clause."""
+    if isinstance(node, WhereNode):
+        if node.connector != AND or node.negated:
+            return []
+        return [name for child in node.children for name in _equality_fields(child, alias)]
+    if isinstance(node, Lookup) and node.lookup_name in EQUALITY_LOOKUPS:
+        lhs = node.lhs
+        if isinstance(lhs, Col) and lhs.alias == alias and lhs.target.column not in IGNORED_COLUMNS:
+            return [lhs.target.name]
+    return []
+
+
+def _ordering_fields(query):
+    meta = query.get_meta()
+    ordering = query.order_by or (meta.ordering if query.default_ordering else ())
+    fields = []
+    for order in ordering:
+        if not isinstance(order, str) or '__' in order or order == '?':
+            continue
+        name = order.lstrip('-')
+        name = meta.pk.name if name == 'pk' else name
+        fields.append(f'-{name}' if order.startswith('-') else name)
+    return fields
+
+
+def _indexed_prefixes(meta):
+    prefixes = [[name.lstrip('-') for name in index.fields] for index in meta.indexes]
+    prefixes.extend(list(fields) for fields in meta.unique_together)
+    prefixes.extend([field.name] for field in meta.concrete_fields if field.db_index or field.unique)
+    return prefixes
+
+
+def suggest_index(queryset):
+    """
+    Index fields that would let ``queryset`` seek instead of scan, or ``None``
+    when an index of the model already starts with them.
+    """
+    query = queryset.query
+    meta = query.get_meta()
+    fields = list(dict.fromkeys([
+        *_equality_fields(query.where, query.base_table),
+        *_ordering_fields(query),
+    ]))
+    if not fields:
+        return None
+    names = [name.lstrip('-') for name in fields]
+    for prefix in _indexed_prefixes(meta):
+        if prefix[:len(names)] == names:
+            return None
+    return {'model': meta.label, 'table': meta.db_table, 'fields': fields}
+
+
+def audit_queryset(queryset):
+    """SQL, plan, findings and index suggestion of ``queryset``."""
+    plan, findings = explain_queryset(queryset)
+    table = queryset.model._meta.db_table
+    own = [finding for finding in findings if finding['table'] in (table, None)]
+    return {
+        'sql': str(queryset.query),
+        'plan': plan,
+        'findings': findings,
+        'suggestion': suggest_index(queryset) if own else None,
+    }
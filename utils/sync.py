@@ -0,0 +1,135 @@
+"""
+Delta sync for offline clients.
+
+A sync source is a queryset over ``all_objects``, so soft-deleted rows stay
+visible and are sent as tombstones. The rows of every source are merged in
+``(updated_at, id)`` order, and the cursor handed back is the position of
+the last row sent: the next call seeks past it on each table's
+``(scope, updated_at, id)`` index, so a sync only reads what changed.
+
+``updated_at`` is stamped before a transaction commits, so a row can become
+visible after newer ones were already synced. Rows younger than
+``SYNC_LAG_SECONDS`` are held back until the next call, which keeps the
+cursor monotonic as long as writes commit within that window.
+"""
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as DecodeError
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import now
+from rest_framework.exceptions import ValidationError
+
+INVALID_CURSOR_MESSAGE = 'Cursor de sincronización inválido.'
+
+
+class SyncSource:
+    """Rows of one model sent under ``type``, with the ids of their ``many_to_many`` sets."""
+
+    def __init__(self, type_name, queryset, many_to_many=()):
+        self.type = type_name
+        self.queryset = queryset
+        self.many_to_many = many_to_many
+        self.fields = [field.attname for field in queryset.model._meta.concrete_fields]
+
+    def changed(self, position, horizon, limit):
+        queryset = self.queryset.filter(updated_at__lte=horizon)
+        if position is not None:
+            updated_at, row_id = position
+            queryset = queryset.filter(
+                Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=row_id),
+                updated_at__gte=updated_at,
+            )
+        return list(queryset.order_by('updated_at', 'id').values(*self.fields)[:limit])
+
+    def add_many_to_many(self, rows):
+        ids = [row['id'] for row in rows if row['deleted_at'] is None]
+        if not ids:
+            return
+        by_id = {row['id']: row for row in rows}
+        for name in self.many_to_many:
+            field = self.queryset.model._meta.get_field(name)
+            source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+            for row in rows:
+                row[name] = []
+            links = field.remote_field.through.objects.filter(
+                **{f'{source}__in': ids}).values_list(f'{source}_id', f'{target}_id')
+            for owner_id, target_id in links:
+                by_id[owner_id][name].append(target_id)
+
+
+def encode_cursor(position):
+    updated_at, row_id = position
+    tokens = {'t': updated_at.isoformat(), 'id': str(row_id)}
+    return urlsafe_b64encode(json.dumps(tokens, separators=(',', ':')).encode()).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        tokens = json.loads(urlsafe_b64decode(cursor.encode('ascii')))
+        updated_at = parse_datetime(tokens['t'])
+        row_id = tokens['id']
+    except (TypeError, ValueError, KeyError, DecodeError) as exc:
+        raise ValidationError({'since': INVALID_CURSOR_MESSAGE}) from exc
+    if updated_at is None or not isinstance(row_id, str):
+        raise ValidationError({'since': INVALID_CURSOR_MESSAGE})
+    return updated_at, row_id
+
+
+def _data(row):
+    return {key: str(value) if isinstance(value, Decimal) else value for key, value in row.items()}
+
+
+def collect_changes(sources, cursor=None, limit=None):
+    """
+    Rows of ``sources`` changed after ``cursor``, oldest first, at most
+    ``limit`` of them, with the cursor to resume from.
+    """
+    limit = limit or settings.PAGE_SIZE
+    position = decode_cursor(cursor) if cursor else None
+    horizon = now() - timedelta(seconds=settings.SYNC_LAG_SECONDS)
+
+    candidates = []
+    for source in sources:
+        candidates.extend((row['updated_at'], str(row['id']), source, row)
+                          for row in source.changed(position, horizon, limit + 1))
+    candidates.sort(key=lambda candidate: candidate[:2])
+    page = candidates[:limit]
+
+    for source in sources:
+        rows = [row for _, _, row_source, row in page if row_source is source]
+        if rows:
+            source.add_many_to_many(rows)
+
+    changes = []
+    for updated_at, row_id, source, row in page:
+        deleted = row['deleted_at'] is not None
+        changes.append({
+            'type': source.type,
+            'id': row_id,
+            'updated_at': updated_at,
+            'deleted': deleted,
+            'data': None if deleted else _data(row),
+        })
+    if page:
+        updated_at, row_id = page[-1][:2]
+        cursor = encode_cursor((updated_at, row_id))
+    return {'changes': changes, 'cursor': cursor, 'has_more': len(candidates) > limit}
+
+
+def sync_limit(request):
+    """The ``limit`` query parameter, capped to ``MAX_PAGE_SIZE``."""
+    value = request.query_params.get('limit')
+    if value is None:
+        return settings.PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError as exc:
+        raise ValidationError({'limit': 'Debe ser un número entero.'}) from exc
+    if limit <= 0:
+        raise ValidationError({'limit': 'Debe ser mayor que cero.'})
+    return min(limit, settings.MAX_PAGE_SIZE)
@@ -0,0 +1,54 @@
+"""
+Version stamps of cached resources.
+
+Caches built from database rows are keyed or tagged with the version stamp
+of the rows they were built from, and writers bump the stamp to invalidate
+them. The built values may live in each process, but the stamps are kept in
+the ``versions`` cache, which every process shares: the web workers and
+``runworker`` alike.
+
+Stamps are nanosecond timestamps rather than counters. A stamp evicted from
+the cache is seeded again with a value it never had before, so values built
+under an older stamp never become valid again.
+"""
+import time
+
+from django.core.cache import caches
+
+VERSIONS_CACHE = 'versions'
+VERSION_TIMEOUT = None  # Version stamps never expire on their own
+
+
+def _key(namespace, identifier):
+    return f'version:{namespace}:{identifier}'
+
+
+def _stamps():
+    return caches[VERSIONS_CACHE]
+
+
+def _new_stamp():
+    return time.time_ns()
+
+
+def get_version(namespace, identifier):
+    """Returns the current version stamp of a cached resource."""
+    return _stamps().get_or_set(_key(namespace, identifier), _new_stamp, timeout=VERSION_TIMEOUT)
+
+
+def get_versions(namespace, identifiers):
+    """``get_version`` of every identifier, read with one cache lookup."""
+    keys = {_key(namespace, identifier): identifier for identifier in identifiers}
+    stamps = _stamps()
+    found = stamps.get_many(list(keys))
+    for key in keys.keys() - found.keys():
+        # get_or_set() never overwrites a version bumped since the lookup
+        found[key] = stamps.get_or_set(key, _new_stamp, timeout=VERSION_TIMEOUT)
+    return {identifier: found[key] for key, identifier in keys.items()}
+
+
+def bump_version(namespace, identifier):
+    """Invalidates everything built from the previous version stamp."""
+    stamp = _new_stamp()
+    _stamps().set(_key(namespace, identifier), stamp, timeout=VERSION_TIMEOUT)
+    return stamp